@@ -0,0 +1,269 @@
+"""Batched AI feedback for objective markings.
+
+Every submission is sent to the chat model together with its marking (score
+and wrong items), a fixed number of requests at a time, retrying rate-limit
+and connection errors with exponential backoff. Responses are stored in a
+:class:`cache_utils.FeedbackCache` keyed by submission hash, assignment and
+a version made of the prompt, the model and the marking (answer key and
+tolerant flag, see :func:`cache_utils.key_version`), so asking again for the
+same submissions costs nothing, only new or changed submissions reach the
+API, and feedback is written again once a key correction or the tolerant
+setting changes the marking it describes.
+
+For local runs without an API key start the stub server and point the
+client at it::
+
+    python ai_feedback_utils.py --port 8765
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=stub streamlit run app.py
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import random
+import threading
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import openai
+
+from cache_utils import FeedbackCache, key_version, text_hash
+from marking_utils import ClassGrade
+
+# Bump whenever SYSTEM_PROMPT or build_messages changes, so cached feedback
+# written for the old prompt is not reused.
+PROMPT_VERSION = 1
+DEFAULT_MODEL = "gpt-4o-mini"
+
+SYSTEM_PROMPT = (
+    "You are a German teacher giving feedback on a marked objective exercise. "
+    "Write one feedback block of about forty words in English. Name the exact "
+    "mistakes with the correct answers, be encouraging, and remind the student "
+    "to type umlauts (ä, ö, ü) and ß instead of ae, oe, ue and ss."
+)
+
+_RETRYABLE = (
+    openai.RateLimitError,
+    openai.APIConnectionError,
+    openai.APITimeoutError,
+    openai.InternalServerError,
+)
+
+
+@dataclass
+class FeedbackJob:
+    """One submission to write feedback for."""
+
+    text: str
+    assignment: str
+    level: str
+    correct: int
+    total: int
+    wrong: List[Tuple[int, str, str]] = field(default_factory=list)
+    marking: str = ""  # key_version() of the marking the job describes
+
+
+def jobs_from_grade(
+    grade: ClassGrade, texts: Sequence[str], assignment: str, levels: Sequence[str]
+) -> List[FeedbackJob]:
+    """Return a job per graded submission (``texts`` in grading order)."""
+    total = len(grade.key.questions)
+    marking = key_version(dict(zip(grade.key.questions.tolist(), grade.key.reference)), grade.tolerant)
+    return [
+        FeedbackJob(text, assignment, levels[i], int(grade.correct[i].sum()), total, grade.wrong_answers(i), marking)
+        for i, text in enumerate(texts)
+    ]
+
+
+def prompt_version(model: str, marking: str = "") -> str:
+    """Return the cache version for ``model``, the current prompt and ``marking``."""
+    return f"{PROMPT_VERSION}:{model}:{marking}"
+
+
+def build_messages(job: FeedbackJob) -> List[Dict[str, str]]:
+    """Return the chat messages for ``job``."""
+    if job.wrong:
+        mistakes = "\n".join(f"{n}. expected {ref!r}, student wrote {stu or '(blank)'!r}" for n, ref, stu in job.wrong)
+    else:
+        mistakes = "none"
+    user = (
+        f"Level: {job.level or 'unknown'}\n"
+        f"Assignment: {job.assignment}\n"
+        f"Score: {job.correct} of {job.total} correct\n"
+        f"Mistakes:\n{mistakes}\n\n"
+        f"Student submission:\n{job.text.strip()[:4000]}"
+    )
+    return [{"role": "system", "content": SYSTEM_PROMPT}, {"role": "user", "content": user}]
+
+
+async def _request(
+    client: openai.AsyncOpenAI, model: str, job: FeedbackJob, retries: int, backoff: float
+) -> str:
+    attempt = 0
+    while True:
+        try:
+            resp = await client.chat.completions.create(
+                model=model, messages=build_messages(job), temperature=0.3, max_tokens=200
+            )
+            return (resp.choices[0].message.content or "").strip()
+        except _RETRYABLE:
+            if attempt >= retries:
+                raise
+            await asyncio.sleep(backoff * 2 ** attempt * (0.5 + random.random()))
+            attempt += 1
+
+
+async def generate_feedback_async(
+    jobs: Sequence[FeedbackJob],
+    client: openai.AsyncOpenAI,
+    model: str = DEFAULT_MODEL,
+    cache: Optional[FeedbackCache] = None,
+    concurrency: int = 8,
+    retries: int = 4,
+    backoff: float = 1.0,
+) -> List[Optional[str]]:
+    """Return feedback per job (``None`` where the request finally failed).
+
+    Cached results are used first; identical submissions of the same
+    assignment are sent once. At most ``concurrency`` requests are in flight.
+    """
+    versions = [prompt_version(model, job.marking) for job in jobs]
+    hashes = [text_hash(job.text) for job in jobs]
+    results: List[Optional[str]] = [None] * len(jobs)
+
+    if cache is not None:
+        for assignment, version in {(job.assignment, versions[i]) for i, job in enumerate(jobs)}:
+            idxs = [i for i, job in enumerate(jobs) if job.assignment == assignment and versions[i] == version]
+            found = cache.get_many((hashes[i] for i in idxs), assignment, version)
+            for i in idxs:
+                results[i] = found.get(hashes[i])
+
+    pending: Dict[Tuple[str, str, str], List[int]] = {}
+    for i, job in enumerate(jobs):
+        if results[i] is None:
+            pending.setdefault((hashes[i], job.assignment, versions[i]), []).append(i)
+
+    limit = asyncio.Semaphore(max(1, concurrency))
+
+    async def run(key: Tuple[str, str, str], idxs: List[int]) -> None:
+        async with limit:
+            try:
+                feedback = await _request(client, model, jobs[idxs[0]], retries, backoff)
+            except Exception:
+                # Any failure (API error, timeout, malformed response) only
+                # loses this job's feedback, not the whole batch.
+                return
+        if not feedback:
+            return
+        if cache is not None:
+            cache.put(*key, feedback)
+        for i in idxs:
+            results[i] = feedback
+
+    await asyncio.gather(*(run(key, idxs) for key, idxs in pending.items()))
+    return results
+
+
+def generate_feedback(
+    jobs: Sequence[FeedbackJob],
+    api_key: Optional[str] = None,
+    base_url: Optional[str] = None,
+    model: str = DEFAULT_MODEL,
+    cache: Optional[FeedbackCache] = None,
+    concurrency: int = 8,
+) -> List[Optional[str]]:
+    """Run :func:`generate_feedback_async` to completion with a fresh client.
+
+    ``api_key`` and ``base_url`` default to the ``OPENAI_API_KEY`` and
+    ``OPENAI_BASE_URL`` environment variables. The client's own retries are
+    off; :func:`generate_feedback_async` does the retrying.
+    """
+
+    async def main() -> List[Optional[str]]:
+        async with openai.AsyncOpenAI(api_key=api_key, base_url=base_url, max_retries=0) as client:
+            return await generate_feedback_async(jobs, client, model, cache, concurrency)
+
+    return asyncio.run(main())
+
+
+# ---------------- stub server ----------------
+
+class _StubHandler(BaseHTTPRequestHandler):
+    """Answer chat completion requests with canned feedback."""
+
+    fail_every = 0
+    _count = 0
+    _count_lock = threading.Lock()
+
+    def do_POST(self) -> None:  # noqa: N802 - http.server naming
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+        with self._count_lock:
+            type(self)._count += 1  # per server: serve_stub makes a subclass each
+            count = type(self)._count
+        if self.fail_every and count % self.fail_every == 0:
+            self._send(429, {"error": {"message": "stub rate limit", "type": "rate_limit_error"}})
+            return
+        user = next((m["content"] for m in body.get("messages", []) if m.get("role") == "user"), "")
+        score = next((line for line in user.splitlines() if line.startswith("Score:")), "Score: ?")
+        self._send(
+            200,
+            {
+                "id": f"stub-{count}",
+                "object": "chat.completion",
+                "created": 0,
+                "model": body.get("model", DEFAULT_MODEL),
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": f"Stub feedback ({score})."},
+                        "finish_reason": "stop",
+                    }
+                ],
+                "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+            },
+        )
+
+    def _send(self, status: int, payload: Dict[str, Any]) -> None:
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+def serve_stub(host: str = "127.0.0.1", port: int = 0, fail_every: int = 0) -> ThreadingHTTPServer:
+    """Start the stub server on a background thread and return it.
+
+    Use ``f"http://{host}:{server.server_port}/v1"`` as the base URL. With
+    ``fail_every`` every n-th request gets a 429 to exercise retries.
+    """
+    handler = type("StubHandler", (_StubHandler,), {"fail_every": fail_every, "_count": 0})
+    server = ThreadingHTTPServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run a stub chat completion server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--fail-every", type=int, default=0, help="answer every n-th request with 429")
+    args = parser.parse_args(argv)
+    server = serve_stub(args.host, args.port, args.fail_every)
+    print(f"Stub server on http://{args.host}:{server.server_port}/v1")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,226 @@
+"""Item-level analysis of objective markings.
+
+Every marking is stored as one compact record per (submission, assignment)
+holding the question numbers of the key it was graded against, a bitset with
+one bit per question (set when the answer earned the point), the questions
+credited as near misses and the tokens written for the wrong questions.
+Aggregations unpack the bitsets of an assignment into boolean matrices in a
+few NumPy calls, so statistics over many thousands of markings never
+re-parse a submission.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from marking_utils import ClassGrade
+
+
+def pack_bits(flags: Iterable[bool]) -> bytes:
+    """Return ``flags`` as a little-endian bitset."""
+    return np.packbits(np.asarray(list(flags), dtype=bool), bitorder="little").tobytes()
+
+
+def record_questions(rec: Dict[str, Any]) -> List[int]:
+    """Return the question numbers a record was graded on.
+
+    Records written before question numbers were stored cover ``1..n``.
+    """
+    return [int(n) for n in rec.get("questions") or range(1, int(rec["n"]) + 1)]
+
+
+@dataclass
+class ItemMatrix:
+    """Markings of one assignment as (markings × questions) boolean matrices."""
+
+    questions: np.ndarray  # question number of every column
+    correct: np.ndarray  # earned the point (exact or near miss)
+    near: np.ndarray  # credited as a near miss
+    asked: np.ndarray  # the question was part of the key the marking used
+    records: List[Dict[str, Any]]
+
+
+class ItemAnalysisStore:
+    """Append-only JSONL store of per-question correctness.
+
+    Parameters
+    ----------
+    path:
+        JSONL file the records are appended to. Later records for the same
+        (submission, assignment) replace earlier ones when loading.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._records: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._matrices: Dict[str, ItemMatrix] = {}
+        self._lock = threading.RLock()
+        self.load()
+
+    def load(self) -> None:
+        """Read all records from ``path`` (a missing file means no records)."""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue
+                self._records[(rec["submission"], rec["assignment"])] = rec
+        self._matrices.clear()
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def record(
+        self,
+        submission_id: str,
+        assignment: str,
+        level: str,
+        graded: ClassGrade,
+        i: int = 0,
+        when: Optional[datetime] = None,
+        studentcode: str = "",
+        score: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """Store how submission ``i`` of ``graded`` was marked.
+
+        Correct answers, near misses and wrong answers are taken from the
+        grade as it was scored and keyed by question number. The student's
+        answer to every question, the saved ``score`` (default: the graded
+        one) and the tolerant flag are kept so the marking can be re-graded
+        (see ``regrade_utils.py``). ``graded`` should come from parsed
+        answers, not from cached wrong-answer lists, so that correct
+        answers are known too.
+        """
+        questions = graded.key.questions.tolist()
+        asked = set(questions)
+        wrong = set(graded.wrong_items(i))
+        rec = {
+            "submission": str(submission_id),
+            "assignment": str(assignment),
+            "level": str(level or "").strip().upper(),
+            "student": str(studentcode or "").strip(),
+            "n": len(questions),
+            "questions": questions,
+            "bits": pack_bits(graded.correct[i]).hex(),
+            "near": graded.near_items(i),
+            "wrong": {
+                str(n): str(stu or "").strip()
+                for n, stu in graded.raw[i].items()
+                if n in wrong and str(stu or "").strip()
+            },
+            "answers": {str(n): str(stu) for n, stu in graded.raw[i].items() if n in asked},
+            "score": int(graded.scores[i] if score is None else score),
+            "tolerant": bool(graded.tolerant),
+            "ts": (when or datetime.now()).isoformat(timespec="seconds"),
+        }
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+            self._records[(rec["submission"], rec["assignment"])] = rec
+            self._matrices.pop(rec["assignment"], None)
+        return rec
+
+    def records(self, assignment: str) -> List[Dict[str, Any]]:
+        """Return the latest record of every submission for ``assignment``."""
+        return self.matrix(assignment).records
+
+    def assignments(self) -> List[str]:
+        """Return the assignments that have at least one record."""
+        return sorted({a for _, a in self._records})
+
+    def matrix(self, assignment: str) -> ItemMatrix:
+        """Return the markings of ``assignment`` as an :class:`ItemMatrix`.
+
+        Columns are the question numbers of every key version seen. The
+        bitsets of records graded on the same questions are unpacked in one
+        call. The matrix is built once per assignment and reused until a new
+        record for that assignment arrives.
+        """
+        with self._lock:
+            cached = self._matrices.get(assignment)
+            if cached is not None:
+                return cached
+            recs = [r for (_, a), r in self._records.items() if a == assignment]
+            groups: Dict[Tuple[int, ...], List[int]] = {}
+            for row, rec in enumerate(recs):
+                groups.setdefault(tuple(record_questions(rec)), []).append(row)
+            questions = np.array(sorted({n for qs in groups for n in qs}), dtype=np.int32)
+            column = {int(n): j for j, n in enumerate(questions.tolist())}
+            shape = (len(recs), len(questions))
+            correct, near, asked = (np.zeros(shape, dtype=bool) for _ in range(3))
+            for qs, rows in groups.items():
+                if not qs:
+                    continue
+                cols = np.array([column[n] for n in qs])
+                nbytes = (len(qs) + 7) // 8
+                raw = b"".join(bytes.fromhex(recs[r]["bits"]).ljust(nbytes, b"\0")[:nbytes] for r in rows)
+                packed = np.frombuffer(raw, dtype=np.uint8).reshape(len(rows), nbytes)
+                bits = np.unpackbits(packed, axis=1, bitorder="little")[:, : len(qs)].astype(bool)
+                correct[np.ix_(rows, cols)] = bits
+                asked[np.ix_(rows, cols)] = True
+            for row, rec in enumerate(recs):
+                for n in rec.get("near", ()):
+                    if int(n) in column:
+                        near[row, column[int(n)]] = True
+            built = ItemMatrix(questions, correct, near, asked, recs)
+            self._matrices[assignment] = built
+            return built
+
+    def question_stats(self, assignment: str, top: int = 3) -> pd.DataFrame:
+        """Return percent correct, near misses and most-chosen wrong answers per question."""
+        m = self.matrix(assignment)
+        if not m.records:
+            return pd.DataFrame(columns=["question", "attempts", "pct_correct", "pct_near", "top_wrong"])
+        attempts = m.asked.sum(axis=0)
+        width = len(m.questions)
+
+        def pct(flags: np.ndarray) -> np.ndarray:
+            return np.divide(flags.sum(axis=0) * 100.0, attempts, out=np.zeros(width), where=attempts > 0).round(1)
+
+        stats = pd.DataFrame(
+            {
+                "question": m.questions,
+                "attempts": attempts,
+                "pct_correct": pct(m.correct),
+                "pct_near": pct(m.near),
+            }
+        )
+
+        pairs = [(int(q), tok) for r in m.records for q, tok in r["wrong"].items()]
+        top_wrong: Dict[int, str] = {}
+        if pairs:
+            wrong_df = pd.DataFrame(pairs, columns=["question", "answer"])
+            wrong_df["answer"] = wrong_df["answer"].str.strip().str.lower()
+            counts = wrong_df.value_counts(["question", "answer"]).reset_index(name="count")
+            for q, grp in counts.groupby("question", sort=False):
+                top_wrong[int(q)] = ", ".join(f"{a} ({c})" for a, c in grp.head(top)[["answer", "count"]].values)
+        stats["top_wrong"] = stats["question"].map(top_wrong).fillna("")
+        return stats
+
+    def level_trends(self, freq: str = "M") -> pd.DataFrame:
+        """Return mean percent correct per level and period (default: month)."""
+        if not self._records:
+            return pd.DataFrame(columns=["level", "period", "markings", "pct_correct"])
+        recs = list(self._records.values())
+        n = np.array([r["n"] for r in recs])
+        correct = np.array([int.from_bytes(bytes.fromhex(r["bits"]), "little").bit_count() for r in recs])
+        df = pd.DataFrame(
+            {
+                "level": [r["level"] for r in recs],
+                "period": pd.to_datetime([r["ts"] for r in recs]).to_period(freq).astype(str),
+                "pct": np.divide(correct * 100.0, n, out=np.zeros(len(n)), where=n > 0),
+            }
+        )
+        out = df.groupby(["level", "period"]).agg(markings=("pct", "size"), pct_correct=("pct", "mean"))
+        return out.round(1).reset_index()
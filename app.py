@@ -1,11 +1,13 @@
 # app.py
-import io
 import os
-import re
 import json
 import hashlib
+import logging
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
-from typing import Dict, Any, List, Tuple, Optional
+from typing import Callable, Dict, Any, List, Optional, Tuple
 
 import pandas as pd
 import requests
@@ -16,7 +18,31 @@ import streamlit.components.v1 as components
 st.set_page_config(page_title="📘 Marking Dashboard", page_icon="📘", layout="wide")
 
 # ---------------- Firebase ----------------
-from firebase_utils import get_firestore_client, save_row_to_firestore
+from ai_feedback_utils import DEFAULT_MODEL, generate_feedback, jobs_from_grade
+from analysis_utils import ItemAnalysisStore
+from archive_utils import SubmissionArchive
+from assignment_utils import AssignmentIndex, AssignmentMatch
+from firebase_utils import get_firestore_client, save_row_to_firestore, submission_counts
+from cache_utils import FeedbackCache, GradingCache, grade_with_cache
+from essay_utils import prescore_essays, required_phrases, word_target
+from lease_utils import DEFAULT_TTL, FirestoreLeaseStore, Holder, LeaseStore, LocalLeaseStore, lease_owner, owner_name
+from marking_utils import ClassGrade, build_reference_text_from_json, grade_class
+from prefetch_utils import Prefetcher, start_loads
+from progress_utils import ProgressBoard
+from queue_utils import WorkQueue
+from scores_utils import ScoresMirror
+from search_utils import SearchStore, TextIndex, crawl_flat, snippet
+from submission_utils import LISTING_FIELDS, Submission
+from sheets_utils import (
+    Filters,
+    UnquotableValue,
+    apply_query_locally,
+    compile_gviz_query,
+    fetch_gviz_csv,
+    fetch_sheet_header,
+    read_csv_normalized,
+)
+from text_utils import natural_key
 
 db = get_firestore_client()
 
@@ -26,6 +52,38 @@ STUDENTS_SHEET_ID = "12NXf5FeVHr7JJT47mRHh7Jp-TC1yhPS7ZG6nzZVTt1U"
 STUDENTS_SHEET_TAB = st.secrets.get("STUDENTS_SHEET_TAB", "Sheet1")
 SCORES_SHEET_ID = st.secrets.get("SCORES_SHEET_ID")
 SCORES_SHEET_TAB = st.secrets.get("SCORES_SHEET_TAB", "Scores")
+# Local mirror of the Scores tab, seeded from the manual snapshot on first run
+SCORES_MIRROR_CSV = st.secrets.get("SCORES_MIRROR_CSV", "scores_mirror.csv")
+SCORES_BACKUP_CSV = st.secrets.get("SCORES_BACKUP_CSV", "scores_backup.csv")
+# Per-question correctness of objective markings (JSONL, appended on save)
+ITEM_ANALYSIS_PATH = st.secrets.get("ITEM_ANALYSIS_PATH", "item_analysis.jsonl")
+# SQLite cache of objective grading results (UI and batch grading)
+GRADING_CACHE_PATH = st.secrets.get("GRADING_CACHE_PATH", "grading_cache.sqlite3")
+# Number of recent submissions joined against Scores for the ungraded worklist
+WORKLIST_FETCH_LIMIT = int(st.secrets.get("WORKLIST_FETCH_LIMIT", 200))
+# Students after the current one (roster order) whose submissions load in the background
+PREFETCH_AHEAD = int(st.secrets.get("PREFETCH_AHEAD", 3))
+SUBMISSION_PREFETCH_TTL = float(st.secrets.get("SUBMISSION_PREFETCH_TTL", 120))
+# "flat" once migrate_utils.py has rewritten every submission into submissions/{id}
+SUBMISSIONS_LAYOUT = st.secrets.get("SUBMISSIONS_LAYOUT", "mixed")
+# Texts of opened/graded submissions kept for full-text search
+SEARCH_INDEX_PATH = st.secrets.get("SEARCH_INDEX_PATH", "search_index.sqlite3")
+# Local shards of submissions moved out of Firestore by archive_utils.py
+ARCHIVE_DIR = st.secrets.get("ARCHIVE_DIR", "")
+# Submission count panel: statuses broken out per level, and how long counts are reused
+SUBMISSION_STATUSES = list(st.secrets.get("SUBMISSION_STATUSES", ["submitted", "marked"]))
+SUBMISSION_COUNTS_TTL = int(st.secrets.get("SUBMISSION_COUNTS_TTL", 60))
+# Submission leases between concurrent markers (Firestore when configured, else local SQLite)
+LEASES_PATH = st.secrets.get("LEASES_PATH", "marking_leases.sqlite3")
+LEASE_TTL_SECONDS = float(st.secrets.get("LEASE_TTL_SECONDS", DEFAULT_TTL))
+MARKER_TOKEN_PARAM = "marker"
+MARKER_NAME_PARAM = "marker_name"
+# AI feedback (OpenAI-compatible endpoint; OPENAI_BASE_URL may point at the local stub server)
+OPENAI_API_KEY = st.secrets.get("OPENAI_API_KEY", os.environ.get("OPENAI_API_KEY", ""))
+OPENAI_BASE_URL = st.secrets.get("OPENAI_BASE_URL", os.environ.get("OPENAI_BASE_URL")) or None
+OPENAI_MODEL = st.secrets.get("OPENAI_MODEL", DEFAULT_MODEL)
+# Roster columns requested from the sheet (code, name, level + email for account checks)
+ROSTER_COLUMNS = ["studentcode", "student_code", "code", "name", "fullname", "level", "email"]
 
 # Apps Script webhook (fallbacks included)
 WEBHOOK_URL = st.secrets.get(
@@ -223,43 +281,289 @@ render_logout_button()
 # Helpers
 # =========================================================
 
-def natural_key(s: str):
-    """Return a sortable key that safely mixes numeric and text fragments."""
-    parts = re.findall(r"\d+|\D+", str(s))
-    normalized = []
-    for part in parts:
-        if part.isdigit():
-            normalized.append((0, int(part)))
-        else:
-            normalized.append((1, part.lower()))
-    return tuple(normalized)
+@st.cache_data(show_spinner=False, ttl=3600)
+def load_sheet_header(sheet_id: str, tab: str) -> List[str]:
+    """Return the header row of a sheet tab; failures are not cached."""
+    return fetch_sheet_header(sheet_id, tab)
 
 
 @st.cache_data(show_spinner=False, ttl=300)
-def load_sheet_csv(sheet_id: str, tab: str) -> pd.DataFrame:
-    """Load a specific Google Sheet tab as CSV (no auth) with fallbacks."""
-    url = (
-        f"https://docs.google.com/spreadsheets/d/{sheet_id}/gviz/tq"
-        f"?tqx=out:csv&sheet={requests.utils.quote(tab)}"
-        "&tq=select%20*%20limit%20100000"
+def load_sheet_query(sheet_id: str, tab: str, tq: str) -> pd.DataFrame:
+    """Run a compiled gviz query; the cache is keyed by the query text."""
+    return fetch_gviz_csv(sheet_id, tab, tq)
+
+
+def read_sheet_csv(
+    sheet_id: str,
+    tab: str,
+    columns: Optional[List[str]] = None,
+    filters: Filters = None,
+) -> Tuple[pd.DataFrame, Optional[Tuple[str, str]]]:
+    """Load a Google Sheet tab as CSV (no auth) with fallbacks.
+
+    ``columns`` and ``filters`` are compiled into the gviz query so Google
+    only returns the projected columns of the matching rows. Returns the
+    frame and a ``(kind, message)`` notice about any fallback, which the
+    caller shows; nothing is rendered here, so it is safe off the script
+    thread.
+    """
+    try:
+        header = load_sheet_header(sheet_id, tab)
+        try:
+            tq = compile_gviz_query(header, columns=columns, filters=filters)
+        except UnquotableValue:
+            # gviz cannot express the filter; fetch the tab and filter it here.
+            everything = load_sheet_query(sheet_id, tab, compile_gviz_query(header))
+            return apply_query_locally(everything, columns, filters), None
+        return load_sheet_query(sheet_id, tab, tq), None
+    except Exception as e:
+        err = e
+
+    fallback_path = st.secrets.get("STUDENTS_FALLBACK_CSV", "students.csv")
+    if os.path.exists(fallback_path):
+        notice = ("warning", "Google Sheet unreachable, using local fallback CSV instead.")
+        return apply_query_locally(read_csv_normalized(fallback_path), columns, filters), notice
+
+    return pd.DataFrame(), ("error", f"Could not load Google Sheet and no fallback CSV found ({err}).")
+
+
+def show_notice(notice: Optional[Tuple[str, str]]) -> None:
+    """Render a ``(kind, message)`` notice returned by a loader."""
+    if notice:
+        kind, message = notice
+        (st.error if kind == "error" else st.warning)(message)
+
+
+def assignment_resolver() -> Callable[[str, str], str]:
+    """Return ``resolve(assignment, level) -> answers-dictionary key`` ("" if unknown)."""
+    index = get_assignment_index()
+    return lambda assignment, level: getattr(index.resolve(assignment, "", level), "key", "")
+
+
+@st.cache_resource(show_spinner=False)
+def get_scores_mirror() -> ScoresMirror:
+    """Return the process-wide Scores mirror (loaded once per server).
+
+    Attempts are keyed on the answers-dictionary key, so legacy Scores labels
+    count as attempts at the assignment they refer to.
+    """
+    return ScoresMirror(SCORES_MIRROR_CSV, seed_path=SCORES_BACKUP_CSV, resolve=assignment_resolver())
+
+
+def sync_scores_mirror(mirror: ScoresMirror, board: ProgressBoard, max_age: float = 60) -> ScoresMirror:
+    """Pull new Scores rows into the mirror at most every ``max_age`` seconds.
+
+    Runs on the page pool, so the cached mirror and board are passed in.
+    """
+    if SCORES_SHEET_ID:
+        try:
+            pulled = mirror.sync_sheet(SCORES_SHEET_ID, SCORES_SHEET_TAB, max_age=max_age)
+        except Exception:
+            pulled = 0  # keep serving the local mirror when the sheet is unreachable
+        if pulled:
+            board.update_many(mirror.rows[-pulled:])
+    return mirror
+
+
+@st.cache_resource(show_spinner=False)
+def get_progress_board() -> ProgressBoard:
+    """Return the process-wide progress board, built once from the mirror."""
+    board = ProgressBoard(load_answers_dictionary().keys(), resolve=assignment_resolver())
+    board.update_many(get_scores_mirror().rows)
+    return board
+
+
+@st.cache_data(ttl=SUBMISSION_COUNTS_TTL, show_spinner=False)
+def load_submission_counts(levels: Tuple[str, ...], statuses: Tuple[str, ...]) -> pd.DataFrame:
+    """Return per-level/status submission counts (aggregation queries, briefly cached)."""
+    if not db:
+        return pd.DataFrame()
+    return submission_counts(db, levels, statuses)
+
+
+@st.cache_resource(show_spinner=False)
+def get_item_analysis_store() -> ItemAnalysisStore:
+    """Return the process-wide item analysis store."""
+    return ItemAnalysisStore(ITEM_ANALYSIS_PATH)
+
+
+@st.cache_resource(show_spinner=False)
+def get_grading_cache() -> GradingCache:
+    """Return the process-wide grading result cache."""
+    return GradingCache(GRADING_CACHE_PATH)
+
+
+@st.cache_resource(show_spinner=False)
+def get_feedback_cache() -> FeedbackCache:
+    """Return the process-wide AI feedback cache (same file as the grading cache)."""
+    return FeedbackCache(GRADING_CACHE_PATH)
+
+
+def ai_feedback_for(graded: ClassGrade, texts: List[str], levels: List[str]) -> List[Optional[str]]:
+    """Return AI feedback per graded submission, served from the cache when possible."""
+    jobs = jobs_from_grade(graded, texts, st.session_state.ref_assignment, levels)
+    return generate_feedback(
+        jobs,
+        api_key=OPENAI_API_KEY,
+        base_url=OPENAI_BASE_URL,
+        model=OPENAI_MODEL,
+        cache=get_feedback_cache(),
+    )
+
+
+@st.cache_resource(show_spinner=False)
+def get_assignment_index() -> AssignmentIndex:
+    """Return the lookup index over answers-dictionary keys."""
+    return AssignmentIndex(load_answers_dictionary().keys())
+
+
+def match_reference(item: Submission) -> Optional[AssignmentMatch]:
+    """Return the dictionary key a normalized submission refers to."""
+    return get_assignment_index().resolve(
+        item.get("assignment", ""), item.get("chapter", ""), item.get("level", "")
+    )
+
+
+def use_reference(assignment: str) -> None:
+    """Make ``assignment`` from the answers dictionary the current reference."""
+    txt, ln, fmt, ans_map = build_reference_text_from_json(load_answers_dictionary().get(assignment, {}))
+    st.session_state.ref_assignment = assignment
+    st.session_state.ref_text = txt
+    st.session_state.ref_link = ln
+    st.session_state.ref_format = fmt
+    st.session_state.ref_answers = ans_map
+
+
+@st.cache_resource(show_spinner=False)
+def get_work_queue() -> WorkQueue:
+    """Return the process-wide queue of ungraded submissions."""
+    index = get_assignment_index()  # bound here: the queue is refreshed on the page pool
+    return WorkQueue(
+        get_scores_mirror(),
+        lambda item: getattr(index.resolve(item.assignment, item.chapter, item.level), "key", ""),
     )
 
+
+def refresh_work_queue(queue: WorkQueue, max_age: float = 120, force: bool = False) -> WorkQueue:
+    """Join the latest submissions against the Scores mirror (at most every ``max_age`` s)."""
+    if force or time.time() - queue.refreshed_at > max_age:
+        queue.add(fetch_recent_submissions(limit=WORKLIST_FETCH_LIMIT), full=True)
+        queue.prune()
+    return queue
+
+
+@st.cache_resource(show_spinner=False)
+def get_lease_store() -> LeaseStore:
+    """Return the lease backend shared by all marker sessions."""
+    return FirestoreLeaseStore(db) if db else LocalLeaseStore(LEASES_PATH)
+
+
+def init_marker_identity() -> None:
+    """Set up this browser's marker name and lease token.
+
+    Both live in the page's query parameters, like the login token, so a
+    reload keeps the marker's name and leases; another browser gets its own
+    token even when the same name is typed.
+    """
+    params = st.experimental_get_query_params()
+    token = params.get(MARKER_TOKEN_PARAM, [""])[0]
+    if not token:
+        token = uuid.uuid4().hex[:12]
+        params[MARKER_TOKEN_PARAM] = [token]
+        st.experimental_set_query_params(**params)
+    st.session_state.marker_token = token
+    if "marker_name" not in st.session_state:
+        st.session_state.marker_name = params.get(MARKER_NAME_PARAM, [""])[0]
+
+
+def remember_marker_name() -> None:
+    """Keep the typed marker name in the query parameters."""
+    params = st.experimental_get_query_params()
+    params[MARKER_NAME_PARAM] = [st.session_state.marker_name.strip()]
+    st.experimental_set_query_params(**params)
+
+
+def hold_submission(path: str) -> Optional[Holder]:
+    """Claim or renew this session's lease on ``path``.
+
+    Returns the other marker's lease when the submission is taken, else
+    ``None``. A lease held on a previously opened submission is released.
+    """
+    if not path:
+        return None
+    leases = get_lease_store()
+    marker = st.session_state.marker_id
     try:
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()
-        source = io.StringIO(response.text)
-    except Exception as err:
-        fallback_path = st.secrets.get("STUDENTS_FALLBACK_CSV", "students.csv")
-        if os.path.exists(fallback_path):
-            st.warning("Google Sheet unreachable, using local fallback CSV instead.")
-            source = fallback_path
-        else:
-            st.error(f"Could not load Google Sheet and no fallback CSV found ({err}).")
-            return pd.DataFrame()
+        renewed = st.session_state.get("leased_submission") == path and leases.renew(
+            path, marker, LEASE_TTL_SECONDS
+        )
+        if not renewed and not leases.claim(path, marker, LEASE_TTL_SECONDS):
+            return leases.holders([path]).get(path)
+        previous = st.session_state.get("leased_submission")
+        if previous and previous != path:
+            leases.release(previous, marker)
+    except Exception:
+        return None  # a lease backend error never blocks marking
+    st.session_state.leased_submission = path
+    return None
+
+
+@st.cache_resource(show_spinner=False)
+def get_page_pool() -> ThreadPoolExecutor:
+    """Return the thread pool that runs a page's independent loads."""
+    return ThreadPoolExecutor(max_workers=8, thread_name_prefix="page-load")
+
+
+def start_page_loads(loads: Dict[str, Any]) -> Dict[str, Future]:
+    """Run ``loads`` concurrently on the shared page pool.
 
-    df = pd.read_csv(source, dtype=str)
-    df.columns = df.columns.str.strip().str.lower()
-    return df
+    The pool threads serve every session, so loaders must not render
+    anything: they return errors and notices, and exceptions surface from
+    ``Future.result()`` on the script thread.
+    """
+    return start_loads(get_page_pool(), loads)
+
+
+@st.cache_resource(show_spinner=False)
+def get_submission_archive() -> Optional[SubmissionArchive]:
+    """Return the archive of old submissions (``None`` unless ``ARCHIVE_DIR`` exists)."""
+    if not ARCHIVE_DIR or not os.path.isdir(ARCHIVE_DIR):
+        return None
+    return SubmissionArchive(ARCHIVE_DIR)
+
+
+@st.cache_resource(show_spinner=False)
+def get_submission_prefetcher() -> Prefetcher:
+    """Return the background loader of per-student submissions."""
+    return Prefetcher(fetch_submissions, ttl=SUBMISSION_PREFETCH_TTL)
+
+
+def preload_submission(item: Submission) -> None:
+    """Load ``item``'s student and grade it against its matched key so opening it is instant."""
+    get_submission_prefetcher().prefetch(
+        [(str(item.level).strip(), str(item.student_code).strip())]
+    )
+    match = match_reference(item)
+    if not match:
+        return
+    _, _, fmt, answers = build_reference_text_from_json(load_answers_dictionary().get(match.key, {}))
+    if fmt == "objective" and answers:
+        load_submission_bodies([item])
+        grade_with_cache(
+            [item.text],
+            answers,
+            match.key,
+            get_grading_cache(),
+            tolerant=st.session_state.get("tolerant_marking", False),
+        )
+
+
+def prescore_current_essays(texts: List[str], levels: List[str]) -> pd.DataFrame:
+    """Pre-score essays against the chosen reference (phrases and word target)."""
+    entry = load_answers_dictionary().get(st.session_state.ref_assignment) or {}
+    target = word_target("", entry) if "word_target" in entry else None
+    phrases = required_phrases(entry, st.session_state.ref_answers)
+    return prescore_essays(texts, levels, phrases, target=target)
 
 
 @st.cache_data(show_spinner=False)
@@ -287,54 +591,6 @@ def list_json_assignments(ans_dict: Dict[str, Any]) -> List[str]:
     return sorted(list(ans_dict.keys()), key=natural_key)
 
 
-def build_reference_text_from_json(
-    row_obj: Dict[str, Any]
-) -> Tuple[str, str, str, Dict[int, str]]:
-    """Return reference text, link, format and raw answers from JSON row."""
-    answers: Dict[str, Any] = row_obj.get("answers") or {
-        k: v for k, v in row_obj.items() if k.lower().startswith("answer")
-    }
-
-    def n_from(k: str) -> int:
-        m = re.search(r"(\d+)", k)
-        return int(m.group(1)) if m else 0
-
-    chunks: List[str] = []
-    answers_map: Dict[int, str] = {}
-
-    if isinstance(answers, dict):
-        part_keys = [k for k in answers if k.lower().startswith("teil")]
-        if part_keys:
-            idx = 1
-            for part_key in sorted(part_keys, key=natural_key):
-                part = answers.get(part_key) or {}
-                if part:
-                    chunks.append(part_key.replace("teil", "Teil "))
-                    ordered = sorted(part.items(), key=lambda kv: n_from(kv[0]))
-                    for k, v in ordered:
-                        v = str(v).strip()
-                        if v and v.lower() not in ("nan", "none"):
-                            chunks.append(f"{idx}. {v}")
-                            answers_map[idx] = v
-                            idx += 1
-        else:
-            ordered = sorted(answers.items(), key=lambda kv: n_from(kv[0]))
-            for k, v in ordered:
-                v = str(v).strip()
-                if v and v.lower() not in ("nan", "none"):
-                    idx = n_from(k)
-                    chunks.append(f"{idx}. {v}")
-                    answers_map[idx] = v
-
-    fmt = str(row_obj.get("format", "essay")).strip().lower() or "essay"
-    return (
-        "\n".join(chunks) if chunks else "No reference answers found.",
-        str(row_obj.get("answer_url", "")).strip(),
-        fmt,
-        answers_map,
-    )
-
-
 def filter_any(df: pd.DataFrame, q: str) -> pd.DataFrame:
     if not q:
         return df
@@ -342,128 +598,90 @@ def filter_any(df: pd.DataFrame, q: str) -> pd.DataFrame:
     return df[mask.any(axis=1)]
 
 
-def extract_text_from_doc(doc: Dict[str, Any]) -> str:
-    preferred = [
-        "content",
-        "text",
-        "answer",
-        "body",
-        "draft",
-        "message",
-        "submissionText",  # ✅ NEW: matches your Firestore screenshot
-    ]
-    for k in preferred:
-        v = doc.get(k)
-        if isinstance(v, str) and v.strip():
-            return v.strip()
-        if isinstance(v, list):
-            parts = []
-            for item in v:
-                if isinstance(item, str):
-                    parts.append(item)
-                elif isinstance(item, dict):
-                    for kk in ["text", "content", "value"]:
-                        if kk in item and isinstance(item[kk], str):
-                            parts.append(item[kk])
-            if parts:
-                return "\n".join(parts).strip()
-        if isinstance(v, dict):
-            for kk in ["text", "content", "value"]:
-                vv = v.get(kk)
-                if isinstance(vv, str) and vv.strip():
-                    return vv.strip()
-
-    strings = [str(v).strip() for v in doc.values() if isinstance(v, str) and str(v).strip()]
-    return "\n".join(strings).strip()
-
-
 # =========================================================
 # Firestore submissions fetch (UPDATED for your schema)
 # =========================================================
 
-def _ts_ms_from_doc(doc: Dict[str, Any]) -> int:
-    """Best-effort extraction of timestamp in milliseconds."""
-    ts: Optional[Any] = (
-        doc.get("timestamp")
-        or doc.get("createdAt")
-        or doc.get("created_at")
-        or doc.get("submittedAt")
-        or doc.get("updatedAt")
+def _listed_submission(snap: Any, level: str, path: str = "") -> Submission:
+    """Wrap a listing snapshot (a ``LISTING_FIELDS`` projection without the body)."""
+    return Submission(
+        snap.to_dict() or {}, snap.id, fallback_level=level, path=path, ref=snap.reference, complete=False
     )
 
-    try:
-        if isinstance(ts, (int, float)):
-            return int(ts if ts > 10_000_000_000 else ts * 1000)
-        if isinstance(ts, datetime):
-            return int(ts.timestamp() * 1000)
-        if hasattr(ts, "to_datetime") and callable(ts.to_datetime):
-            return int(ts.to_datetime().timestamp() * 1000)
-        if hasattr(ts, "seconds") and hasattr(ts, "nanoseconds"):
-            return int(int(ts.seconds) * 1000 + int(ts.nanoseconds) / 1_000_000)
-        if hasattr(ts, "timestamp") and callable(ts.timestamp):
-            return int(ts.timestamp() * 1000)
-        if isinstance(ts, dict):
-            if "_seconds" in ts:
-                seconds = int(ts.get("_seconds", 0))
-                nanos = int(ts.get("_nanoseconds", 0))
-                return int(seconds * 1000 + nanos / 1_000_000)
-            for key in ("iso", "time", "date", "datetime"):
-                if key in ts and isinstance(ts[key], str):
-                    try:
-                        return int(datetime.fromisoformat(ts[key]).timestamp() * 1000)
-                    except Exception:
-                        pass
-        if isinstance(ts, str):
-            try:
-                return int(datetime.fromisoformat(ts.replace("Z", "+00:00")).timestamp() * 1000)
-            except Exception:
-                pass
-    except Exception:
-        pass
-    return 0
 
+def load_submission_bodies(items: List[Submission]) -> List[Submission]:
+    """Fetch the full documents of listed submissions in one batched read."""
+    todo = {item.ref.path: item for item in items if not item.complete and item.ref is not None}
+    if db and todo:
+        try:
+            for snap in db.get_all([item.ref for item in todo.values()]):
+                todo[snap.reference.path].fill(snap.to_dict() or {})
+        except Exception:
+            pass  # unloaded bodies read as empty text
+        get_search_store().put(item for item in todo.values() if item.complete)
+    return items
 
-def _normalize_submission(d: Dict[str, Any], doc_id: str, fallback_level: str = "") -> Dict[str, Any]:
-    """Attach common metadata like path, level, timestamp and details."""
-    d = dict(d)
 
-    def pick(keys: List[str], default: str = "") -> Any:
-        for k in keys:
-            if k in d and d[k] not in (None, ""):
-                return d[k]
-        return default
+def load_missing_previews(items: List[Submission]) -> List[Submission]:
+    """Load the bodies of listed submissions that have no ``preview`` field (not migrated yet)."""
+    load_submission_bodies([item for item in items if item.needs_body])
+    return items
 
-    d["id"] = doc_id
 
-    # ✅ UPDATED: support camelCase keys from your Firestore docs
-    d["student_name"] = pick(["student_name", "name", "student", "studentName"])
-    d["student_code"] = pick(["student_code", "studentCode", "code", "studentcode"])
-    d["chapter"] = pick(["chapter", "chapter_name", "unit"])
-    d["assignment"] = pick(["assignment", "assignmentTitle", "assignment_name", "task", "topic"])
-    d["level"] = pick(["level", "student_level", "level_key"], fallback_level)
+@st.cache_resource(show_spinner=False)
+def get_search_store() -> SearchStore:
+    """Return the on-disk store of submission texts for search."""
+    return SearchStore(SEARCH_INDEX_PATH)
 
-    d["_ts_ms"] = _ts_ms_from_doc(d)
 
-    path_from_doc = d.get("_path") or d.get("path")
-    if isinstance(path_from_doc, str) and path_from_doc.strip():
-        d["_path"] = path_from_doc.strip()
-    else:
-        d["_path"] = d.get("_path") or d.get("path") or f"submissions/{doc_id}"
+@st.cache_resource(show_spinner="Building the search index…")
+def get_search_index() -> TextIndex:
+    """Return the process-wide full-text index, loaded from the search store."""
+    index = TextIndex()
+    get_search_store().load(index)
+    return index
+
 
-    return d
+def index_new_submissions() -> int:
+    """Store the texts of submissions not searchable yet; return how many.
+
+    With the flat layout the next page of the collection is crawled from the
+    store's cursor (see :func:`search_utils.crawl_flat`); otherwise the
+    recent submissions are loaded.
+    """
+    if SUBMISSIONS_LAYOUT == "flat" and db:
+        return crawl_flat(db.collection("submissions"), get_search_store(), limit=WORKLIST_FETCH_LIMIT)
+    listed = [item for item in fetch_recent_submissions(limit=WORKLIST_FETCH_LIMIT) if not item.complete]
+    load_submission_bodies(listed)
+    return sum(item.complete for item in listed)
 
 
-def fetch_submissions(level: str, student_code: str) -> List[Dict[str, Any]]:
+def fetch_submissions(level: str, student_code: str) -> List[Submission]:
     if not db or not level or not student_code:
         return []
-    items: List[Dict[str, Any]] = []
+    items: List[Submission] = []
+
+    if SUBMISSIONS_LAYOUT == "flat":
+        # Migrated: one indexed query on (studentCode, level, _ts_ms)
+        from firebase_admin import firestore as fb_firestore  # type: ignore  # noqa: WPS433
+
+        query = (
+            db.collection("submissions")
+            .where("studentCode", "==", student_code)
+            .where("level", "==", str(level).strip())
+            .order_by("_ts_ms", direction=fb_firestore.Query.DESCENDING)
+        )
+        try:
+            return [_listed_submission(snap, level) for snap in query.select(LISTING_FIELDS).stream()]
+        except Exception as e:
+            # Usually the composite index is missing; fall back to the layout chain.
+            logging.getLogger(__name__).warning("Flat submissions query failed, trying every layout: %s", e)
 
     # 1) Try your OLD nested layout (keep for backwards compatibility)
     try:
         lessons_ref = db.collection("submissions").document(level).collection(student_code)
-        for snap in lessons_ref.stream():
-            d = snap.to_dict() or {}
-            items.append(_normalize_submission(d, snap.id, fallback_level=level))
+        for snap in lessons_ref.select(LISTING_FIELDS).stream():
+            items.append(_listed_submission(snap, level))
     except Exception:
         pass
 
@@ -473,11 +691,8 @@ def fetch_submissions(level: str, student_code: str) -> List[Dict[str, Any]]:
         try:
             root_query = db.collection("submissions").where("studentCode", "==", student_code)
             root_query = root_query.where("level", "==", str(level).strip())
-            for snap in root_query.stream():
-                d = snap.to_dict() or {}
-                normalized = _normalize_submission(d, snap.id, fallback_level=level)
-                normalized["_path"] = d.get("_path") or d.get("path") or f"submissions/{snap.id}"
-                items.append(normalized)
+            for snap in root_query.select(LISTING_FIELDS).stream():
+                items.append(_listed_submission(snap, level))
         except Exception:
             pass
 
@@ -486,11 +701,8 @@ def fetch_submissions(level: str, student_code: str) -> List[Dict[str, Any]]:
         try:
             root_query = db.collection("submissions").where("student_code", "==", student_code)
             root_query = root_query.where("level", "==", str(level).strip())
-            for snap in root_query.stream():
-                d = snap.to_dict() or {}
-                normalized = _normalize_submission(d, snap.id, fallback_level=level)
-                normalized["_path"] = d.get("_path") or d.get("path") or f"submissions/{snap.id}"
-                items.append(normalized)
+            for snap in root_query.select(LISTING_FIELDS).stream():
+                items.append(_listed_submission(snap, level))
         except Exception:
             pass
 
@@ -499,19 +711,17 @@ def fetch_submissions(level: str, student_code: str) -> List[Dict[str, Any]]:
         try:
             legacy_ref = db.collection("submissions").document(level).collection("posts")
             legacy_ref = legacy_ref.where("studentCode", "==", student_code)
-            for snap in legacy_ref.stream():
-                d = snap.to_dict() or {}
-                normalized = _normalize_submission(d, snap.id, fallback_level=level)
-                normalized["_path"] = f"submissions/{level}/posts/{snap.id}"
-                items.append(normalized)
+            for snap in legacy_ref.select(LISTING_FIELDS).stream():
+                path = f"submissions/{level}/posts/{snap.id}"
+                items.append(_listed_submission(snap, level, path=path))
         except Exception:
             pass
 
-    items.sort(key=lambda d: d.get("_ts_ms", 0), reverse=True)
+    items.sort(key=lambda d: d.ts_ms, reverse=True)
     return items
 
 
-def fetch_recent_submissions(limit: int = 50, level: str = "", assignment_query: str = "") -> List[Dict[str, Any]]:
+def fetch_recent_submissions(limit: int = 50, level: str = "", assignment_query: str = "") -> List[Submission]:
     """Return the most recent submissions across all students."""
 
     if not db:
@@ -522,15 +732,15 @@ def fetch_recent_submissions(limit: int = 50, level: str = "", assignment_query:
     except Exception:
         fb_firestore = None  # type: ignore
 
-    items: List[Dict[str, Any]] = []
-    base_query = db.collection("submissions")
+    base_query = db.collection("submissions").select(LISTING_FIELDS)
     if level:
         base_query = base_query.where("level", "==", str(level).strip())
 
     snapshots: List[Any] = []
 
     if fb_firestore:
-        for order_field in ["createdAt", "timestamp", "submittedAt", "updatedAt"]:
+        order_fields = ["_ts_ms"] if SUBMISSIONS_LAYOUT == "flat" else ["createdAt", "timestamp", "submittedAt", "updatedAt"]
+        for order_field in order_fields:
             try:
                 snapshots = list(
                     base_query.order_by(order_field, direction=fb_firestore.Query.DESCENDING)
@@ -547,253 +757,16 @@ def fetch_recent_submissions(limit: int = 50, level: str = "", assignment_query:
         except Exception:
             return []
 
-    for snap in snapshots:
-        d = snap.to_dict() or {}
-        normalized = _normalize_submission(d, snap.id, fallback_level=level)
-        items.append(normalized)
+    items = [_listed_submission(snap, level) for snap in snapshots]
 
     if assignment_query:
         term = assignment_query.lower().strip()
-        items = [i for i in items if term in str(i.get("assignment", "")).lower()]
+        items = [i for i in items if term in str(i.assignment).lower()]
 
-    items.sort(key=lambda d: d.get("_ts_ms", 0), reverse=True)
+    items.sort(key=lambda d: d.ts_ms, reverse=True)
     return items[:limit]
 
 
-# ---------- PRE-NORMALIZER: turn "Teil 3/4" local numbers into global 1..N ----------
-
-def globalize_objective_numbers(student_text: str) -> str:
-    """
-    Reads a student's mixed submission (may contain 'Teil 3', 'Teil 4', essays, etc.),
-    extracts objective answers, and rewrites them to GLOBAL numbering (1..N).
-    Output is one-per-line: '1. B', '2. A', ...
-    """
-    if not student_text:
-        return ""
-
-    def parse_pairs_freeform_with_teil_offsets(text: str) -> Dict[int, str]:
-        res: Dict[int, str] = {}
-        offset = 0
-
-        for raw_line in text.splitlines():
-            line = raw_line.strip()
-
-            if re.search(r"^\s*teil\s*\d+\s*$", line, flags=re.I):
-                offset = max(res.keys() or [0])
-                continue
-
-            m = re.match(r"\s*(?:q\s*)?(\d+)\s*[\\.\):=\-]?\s*(.+?)\s*$", line, flags=re.I)
-            if m:
-                local_n = int(m.group(1))
-                token = m.group(2).strip().strip("()[]{}.:=,;")
-                gnum = local_n + offset if offset else local_n
-                res.setdefault(gnum, token)
-                continue
-
-            anchors = list(re.finditer(r"(?i)(?:q\s*)?(\d+)\s*[\\.\):=\-]*\s*", line))
-            for i, am in enumerate(anchors):
-                local_n = int(am.group(1))
-                start = am.end()
-                end = anchors[i + 1].start() if i + 1 < len(anchors) else len(line)
-                chunk = line[start:end].strip()
-                if not chunk:
-                    continue
-                token = re.split(r"[,\|\n;/\t ]+", chunk, maxsplit=1)[0].strip("()[]{}.:=")
-                if token:
-                    gnum = local_n + offset if offset else local_n
-                    res.setdefault(gnum, token)
-
-        return res
-
-    pairs = parse_pairs_freeform_with_teil_offsets(student_text)
-    if not pairs:
-        return ""
-
-    lines = [f"{k}. {v}" for k, v in sorted(pairs.items())]
-    return "\n".join(lines)
-
-
-# ===================== AI MARKING (OBJECTIVES ONLY, WITH GLOBALIZATION) =====================
-
-def _count_words(s: str) -> int:
-    return len(re.findall(r"\b[\wÄÖÜäöüß]+(?:'[A-Za-z]+)?\b", s or ""))
-
-
-def _canonical_token(s: str) -> str:
-    s = (s or "").strip()
-    if not s:
-        return ""
-    if re.fullmatch(r"[a-dA-D]", s):
-        return s.upper()
-    s = (
-        s.lower()
-        .replace("ä", "ae")
-        .replace("ö", "oe")
-        .replace("ü", "ue")
-        .replace("ß", "ss")
-    )
-    if s in {"t", "true", "ja", "j", "y", "yes"}:
-        return "true"
-    if s in {"f", "false", "nein", "n", "no"}:
-        return "false"
-    return re.sub(r"[^\w]+", "", s)
-
-
-def _parse_ref_map(ref_text: str) -> Dict[int, str]:
-    m: Dict[int, str] = {}
-    for line in (ref_text or "").splitlines():
-        hit = re.match(r"\s*(\d+)\s*[\.\)-]?\s*(.+)$", line)
-        if hit:
-            n = int(hit.group(1))
-            tok = hit.group(2).strip()
-            m[n] = tok
-    return m
-
-
-def _parse_student_global_map(student_text: str) -> Dict[int, str]:
-    g = globalize_objective_numbers(student_text or "")
-    out: Dict[int, str] = {}
-    for line in g.splitlines():
-        hit = re.match(r"\s*(\d+)\s*[\.\)-]?\s*(.+)$", line)
-        if hit:
-            out[int(hit.group(1))] = hit.group(2).strip()
-    return out
-
-
-def _compute_objective_diffs(student_text: str, ref_text: str) -> Tuple[int, int, List[Tuple[int, str, str]]]:
-    ref_map = _parse_ref_map(ref_text)
-    stu_map = _parse_student_global_map(student_text)
-    total = len(ref_map) or 1
-    wrong: List[Tuple[int, str, str]] = []
-    correct = 0
-    for n in sorted(ref_map.keys()):
-        ref_tok = ref_map[n]
-        stu_tok_raw = stu_map.get(n, "")
-        if _canonical_token(stu_tok_raw) == _canonical_token(ref_tok):
-            correct += 1
-        else:
-            wrong.append((n, ref_tok, stu_tok_raw))
-    return correct, total, wrong
-
-
-def _build_feedback_40_60(correct: int, total: int, wrong: List[Tuple[int, str, str]]) -> str:
-    pieces = [f"Good effort for A1 objectives—you answered {correct} of {total} correctly."]
-    if wrong:
-        shown = ", ".join(f"{n}→{corr} (you wrote {stu or '—'})" for n, corr, stu in wrong[:6])
-        pieces.append(f"Check these items: {shown}.")
-    tips = [
-        "Slow down, read each stem fully, and match letters carefully.",
-        "Use umlauts (ä/ö/ü) and verify meaning before choosing.",
-        "Underline keywords, compare similar options, and double-check B/C confusions.",
-    ]
-    for t in tips:
-        pieces.append(t)
-        if _count_words(" ".join(pieces)) >= 40:
-            break
-    text = " ".join(pieces)
-    i = 0
-    while _count_words(text) < 40 and i < len(tips):
-        text = text + " " + tips[i]
-        i += 1
-    while _count_words(text) > 60:
-        text = re.sub(r"\s*[^.?!]*[.?!]\s*$", "", text).strip()
-        if not re.search(r"[.?!]$", text):
-            break
-    return text
-
-
-# ===================== LOCAL MARKING (OBJECTIVES ONLY) =====================
-
-def objective_mark(student_answer: str, ref_answers: Dict[int, str]) -> Tuple[int, str]:
-    """
-    Robust objective marking without AI.
-    - Parses messy "Qn -> answer" formats with Teil section offsets.
-    - Normalizes umlauts/ß to ASCII equivalents for comparison.
-    - Accepts synonyms for True/False and Ja/Nein.
-    """
-
-    def canonical_word(s: str) -> str:
-        s = (s or "").strip()
-        if not s:
-            return ""
-        if re.fullmatch(r"[a-dA-D]", s):
-            return s.upper()
-
-        s = s.lower()
-        s = (
-            s.replace("ä", "ae")
-            .replace("ö", "oe")
-            .replace("ü", "ue")
-            .replace("ß", "ss")
-        )
-        if s in {"t", "true", "ja", "j", "y", "yes"}:
-            return "true"
-        if s in {"f", "false", "nein", "n", "no"}:
-            return "false"
-
-        s = re.sub(r"[^\w]+", "", s)
-        return s
-
-    def parse_pairs_freeform_with_teil_offsets(text: str) -> Dict[int, str]:
-        res: Dict[int, str] = {}
-        offset = 0
-        lines = text.splitlines()
-
-        for line in lines:
-            if re.search(r"^\s*teil\s*\d+\s*$", line, flags=re.I):
-                offset = max(res.keys() or [0])
-                continue
-
-            m = re.match(r"\s*(?:q\s*)?(\d+)\s*[\\.\):=\-]?\s*(.+?)\s*$", line, flags=re.I)
-            if m:
-                local_n = int(m.group(1))
-                token = m.group(2).strip().strip("()[]{}.:=,;")
-                gnum = local_n + offset if offset else local_n
-                res.setdefault(gnum, token)
-                continue
-
-            for m in re.finditer(r"(?i)(?:q\s*)?(\d+)\s*[\\.\):=\-]*\s*", line):
-                local_n = int(m.group(1))
-                tail = line[m.end():].strip()
-                token = re.split(r"[,\|\n;/\t ]+", tail, maxsplit=1)[0].strip("()[]{}.:=")
-                if token:
-                    gnum = local_n + offset if offset else local_n
-                    res.setdefault(gnum, token)
-                    break
-        return res
-
-    ref_canon: Dict[int, str] = {int(idx): canonical_word(str(ans)) for idx, ans in (ref_answers or {}).items()}
-
-    stu_raw = parse_pairs_freeform_with_teil_offsets(student_answer or "")
-    stu_canon: Dict[int, str] = {qn: canonical_word(tok) for qn, tok in stu_raw.items()}
-
-    total = len(ref_canon) or 1
-    correct = 0
-    wrong_bits: List[str] = []
-
-    for idx in sorted(ref_canon.keys()):
-        ref_tok = ref_canon[idx]
-        stu_tok = stu_canon.get(idx, "")
-        ok = (stu_tok == ref_tok)
-        if ok:
-            correct += 1
-        else:
-            stu_disp = stu_raw.get(idx, "") or "—"
-            wrong_bits.append(f"{idx}→{ref_answers.get(idx, '')} (you wrote {stu_disp})")
-
-    score = int(round(100 * correct / total))
-    feedback = (
-        "Great job — all correct!"
-        if not wrong_bits
-        else (
-            "Keep going. Check these: "
-            + ", ".join(wrong_bits)
-            + ". Tip: match section numbering (Teil), read each stem carefully, and watch umlauts (ä/ö/ü)."
-        )
-    )
-    return score, feedback
-
-
 def save_row_to_scores(row: dict) -> dict:
     try:
         r = requests.post(
@@ -863,10 +836,43 @@ def save_row(row: dict, to_sheet: bool = True, to_firestore: bool = False) -> di
         result.update(fs_res)
         messages.append(fs_res.get("message", "Firestore").replace("Saved to ", ""))
 
+    mirror = get_scores_mirror()
+    fresh = mirror.record(row)
+    get_progress_board().update(row)
+    get_work_queue().mark_graded(row.get("studentcode", ""), row.get("assignment", ""), row.get("level", ""))
+    try:
+        mirror.append(fresh)
+    except OSError:
+        pass  # the next sheet sync persists the mirror again
+
     result["message"] = "Saved to " + " and ".join(messages) if messages else "Saved"
     return result
 
 
+def render_score_history(studentcode: str, assignment: str) -> None:
+    """Show earlier attempts at ``assignment`` and the student's latest scores."""
+    mirror = get_scores_mirror()
+    attempts = mirror.history(studentcode, assignment)
+    st.markdown("**Previous attempts**")
+    if attempts:
+        st.dataframe(
+            pd.DataFrame(attempts, columns=["date", "score", "comments"]).iloc[::-1],
+            use_container_width=True,
+            hide_index=True,
+        )
+    else:
+        st.caption("No earlier attempts at this assignment.")
+
+    recent = mirror.history(studentcode)[-5:]
+    if recent:
+        st.markdown("**Latest scores**")
+        st.dataframe(
+            pd.DataFrame(recent, columns=["date", "assignment", "score"]).iloc[::-1],
+            use_container_width=True,
+            hide_index=True,
+        )
+
+
 # =========================================================
 # UI
 # =========================================================
@@ -879,10 +885,35 @@ st.title("📘 Marking Dashboard")
 
 if st.button("🔄 Refresh caches"):
     st.cache_data.clear()
+    get_submission_prefetcher().invalidate()
     st.rerun()
 
-# --- Load students
-students_df = load_sheet_csv(STUDENTS_SHEET_ID, STUDENTS_SHEET_TAB)
+# --- Start the independent page loads together; each section waits for its own.
+# Cached resources are resolved here, on the script thread, and handed to the
+# pool loaders; the roster is needed first, so it loads here meanwhile.
+recent_params = (
+    int(st.session_state.get("recent_limit", 30)),
+    "" if st.session_state.get("recent_level", "All") == "All" else st.session_state.get("recent_level", ""),
+    st.session_state.get("recent_assignment", ""),
+)
+work_queue = get_work_queue()
+scores_mirror = get_scores_mirror()
+progress_board = get_progress_board()
+page_loads = start_page_loads(
+    {
+        "recent": lambda: fetch_recent_submissions(
+            limit=recent_params[0], level=recent_params[1], assignment_query=recent_params[2]
+        ),
+        "worklist": lambda: refresh_work_queue(work_queue),
+        "scores": lambda: sync_scores_mirror(scores_mirror, progress_board),
+    }
+)
+if st.session_state.get("last_student"):
+    get_submission_prefetcher().prefetch([st.session_state.last_student])
+
+# --- Load students (only the columns the dashboard uses)
+students_df, roster_notice = read_sheet_csv(STUDENTS_SHEET_ID, STUDENTS_SHEET_TAB, columns=ROSTER_COLUMNS)
+show_notice(roster_notice)
 if students_df.empty:
     st.error("Unable to load student roster. Please try again later.")
     st.stop()
@@ -891,20 +922,69 @@ code_col = find_col(students_df, ["studentcode", "student_code", "code"], defaul
 name_col = find_col(students_df, ["name", "fullname"], default="name")
 level_col = find_col(students_df, ["level"], default="level")
 
+# Ungraded worklist
+init_marker_identity()
+work_queue = page_loads["worklist"].result()
+wq1, wq2, wq3 = st.columns([2, 1, 1])
+with wq1:
+    st.text_input("Marker name (shown to other markers)", key="marker_name", on_change=remember_marker_name)
+    st.session_state.marker_id = lease_owner(st.session_state.marker_name, st.session_state.marker_token)
+    st.caption(f"🗂️ {len(work_queue)} ungraded submissions in the worklist.")
+with wq2:
+    if st.button("🔃 Refresh worklist"):
+        refresh_work_queue(work_queue, force=True)
+        st.rerun()
+with wq3:
+    if st.button("⏭️ Next ungraded", disabled=not len(work_queue), type="primary"):
+        upcoming = work_queue.next(after=st.session_state.get("current_submission", ""), count=25)
+        try:
+            claimed = get_lease_store().claim_next(
+                [d.get("_path", "") for d in upcoming], st.session_state.marker_id, LEASE_TTL_SECONDS
+            )
+        except Exception:
+            claimed = upcoming[0].get("_path", "") if upcoming else None
+        upcoming = [d for d in upcoming if d.get("_path") == claimed] + [
+            d for d in upcoming if d.get("_path") != claimed
+        ][:1]
+        if claimed is None:
+            st.info("Every upcoming submission is being marked by someone else.")
+        elif upcoming:
+            nxt = upcoming[0]
+            code = str(nxt.get("student_code", "")).strip()
+            roster_row = students_df[students_df[code_col].astype(str).str.strip() == code]
+            if roster_row.empty:
+                st.warning(f"Student {code} is not on the roster.")
+            else:
+                r = roster_row.iloc[0]
+                st.session_state.student_search = code
+                st.session_state.student_choice = f"{r.get(code_col,'')} — {r.get(name_col,'')} ({r.get(level_col,'')})"
+                st.session_state.pending_submission = nxt.get("_path", "")
+                if len(upcoming) > 1:
+                    preload_submission(upcoming[1])
+                st.rerun()
+
 # Pick student
 st.subheader("1) Pick Student")
-q = st.text_input("Search student (code / name / any field)")
+q = st.text_input("Search student (code / name / any field)", key="student_search")
 df_filtered = filter_any(students_df, q)
 if df_filtered.empty:
     st.warning("No students match your search.")
     st.stop()
 
 labels = [f"{r.get(code_col,'')} — {r.get(name_col,'')} ({r.get(level_col,'')})" for _, r in df_filtered.iterrows()]
-choice = st.selectbox("Select student", labels)
+choice = st.selectbox("Select student", labels, key="student_choice")
 srow = df_filtered.iloc[labels.index(choice)]
 studentcode = str(srow.get(code_col, "")).strip()
 student_name = str(srow.get(name_col, "")).strip()
 student_level = str(srow.get(level_col, "")).strip()
+st.session_state.last_student = (student_level, studentcode)
+
+# Load the next students' submissions while this one is being marked
+pos = labels.index(choice)
+get_submission_prefetcher().prefetch(
+    (str(r.get(level_col, "")).strip(), str(r.get(code_col, "")).strip())
+    for _, r in df_filtered.iloc[pos + 1:pos + 1 + PREFETCH_AHEAD].iterrows()
+)
 
 c1, c2 = st.columns(2)
 with c1:
@@ -912,6 +992,9 @@ with c1:
 with c2:
     st.text_input("Level (auto)", value=student_level, disabled=True)
 
+scores_mirror = page_loads["scores"].result()
+st.caption(f"{len(scores_mirror.history(studentcode))} saved scores on record for this student.")
+
 # ---------------- Reference chooser (Tabs) ----------------
 st.subheader("2) Reference source")
 
@@ -926,7 +1009,16 @@ if "ref_format" not in st.session_state:
 if "ref_answers" not in st.session_state:
     st.session_state.ref_answers = {}
 
-(tab_json, tab_recent) = st.tabs(["📦 JSON dictionary", "🆕 New submissions"])
+(tab_json, tab_recent, tab_items, tab_progress, tab_counts, tab_search) = st.tabs(
+    [
+        "📦 JSON dictionary",
+        "🆕 New submissions",
+        "📊 Item analysis",
+        "📈 Progress",
+        "🔢 Submission counts",
+        "🔎 Search texts",
+    ]
+)
 
 with tab_json:
     ans_dict = load_answers_dictionary()
@@ -945,11 +1037,7 @@ with tab_json:
         if link_json:
             st.caption(f"Reference link: {link_json}")
         if st.button("✅ Use this JSON reference"):
-            st.session_state.ref_assignment = pick_json
-            st.session_state.ref_text = ref_text_json
-            st.session_state.ref_link = link_json
-            st.session_state.ref_format = fmt_json
-            st.session_state.ref_answers = ans_map_json
+            use_reference(pick_json)
             st.success("Using JSON reference")
 
 with tab_recent:
@@ -963,44 +1051,239 @@ with tab_recent:
     limit_recent = st.slider("How many submissions to show", 10, 100, 30, step=5, key="recent_limit")
 
     level_filter = "" if level_choice == "All" else level_choice
-    recent_items = fetch_recent_submissions(
-        limit=limit_recent, level=level_filter, assignment_query=assignment_filter
-    )
+    if (int(limit_recent), level_filter, assignment_filter) == recent_params:
+        recent_items = page_loads["recent"].result()
+    else:
+        page_loads["recent"].cancel()  # filters changed since the load started
+        recent_items = fetch_recent_submissions(
+            limit=limit_recent, level=level_filter, assignment_query=assignment_filter
+        )
 
     if not recent_items:
         st.info("No recent submissions found with these filters.")
     else:
         records = []
-        for item in recent_items:
-            ts = item.get("_ts_ms", 0)
+        for item in load_missing_previews(recent_items):
+            ts = item.ts_ms
             when = datetime.fromtimestamp(ts / 1000).strftime("%Y-%m-%d %H:%M") if ts else "—"
-            preview = extract_text_from_doc(item)
-            if len(preview) > 160:
-                preview = preview[:160] + "…"
             records.append(
                 {
                     "When": when,
-                    "Student": item.get("student_name", ""),
-                    "Code": item.get("student_code", ""),
-                    "Level": item.get("level", ""),
-                    "Assignment": item.get("assignment", ""),
-                    "Path": item.get("_path", ""),
-                    "Preview": preview,
+                    "Student": item.student_name,
+                    "Code": item.student_code,
+                    "Level": item.level,
+                    "Assignment": item.assignment,
+                    "Matched key": getattr(match_reference(item), "key", ""),
+                    "Path": item.path,
+                    "Preview": item.preview,
                 }
             )
 
         st.dataframe(pd.DataFrame.from_records(records), use_container_width=True)
 
+        if st.button("⚡ Grade listed submissions against their matched keys"):
+            answers_by_key = load_answers_dictionary()
+            groups: Dict[str, List[int]] = {}
+            for i, item in enumerate(recent_items):
+                match = match_reference(item)
+                if match:
+                    groups.setdefault(match.key, []).append(i)
+            load_submission_bodies([recent_items[i] for idxs in groups.values() for i in idxs])
+            matched_rows: List[Dict[str, Any]] = []
+            for key, idxs in groups.items():
+                _, _, key_fmt, key_answers = build_reference_text_from_json(answers_by_key.get(key, {}))
+                if key_fmt != "objective" or not key_answers:
+                    continue
+                graded, _ = grade_with_cache(
+                    [recent_items[i].text for i in idxs],
+                    key_answers,
+                    key,
+                    get_grading_cache(),
+                    tolerant=st.session_state.get("tolerant_marking", False),
+                )
+                for k, i in enumerate(idxs):
+                    matched_rows.append(
+                        {
+                            "Student": recent_items[i].get("student_name", ""),
+                            "Code": recent_items[i].get("student_code", ""),
+                            "Assignment": recent_items[i].get("assignment", ""),
+                            "Matched key": key,
+                            "Score": int(graded.scores[k]),
+                            "Wrong items": ", ".join(map(str, graded.wrong_items(k))),
+                        }
+                    )
+            unmatched = len(recent_items) - sum(len(v) for v in groups.values())
+            st.caption(
+                f"{len(matched_rows)} graded against {len(groups)} keys; {unmatched} without a matching key "
+                "(essay keys are skipped)."
+            )
+            st.dataframe(pd.DataFrame(matched_rows), use_container_width=True, hide_index=True)
+
+        if st.session_state.ref_format != "objective" and st.session_state.ref_assignment:
+            if st.button("📝 Pre-score listed essays against the current reference"):
+                load_submission_bodies(recent_items)
+                essay_scores = prescore_current_essays(
+                    [item.text for item in recent_items],
+                    [item.level for item in recent_items],
+                )
+                essay_scores.insert(0, "Student", [item.student_name for item in recent_items])
+                essay_scores.insert(1, "Assignment", [item.assignment for item in recent_items])
+                st.caption(
+                    f"{int((essay_scores['triage'] == 'incomplete').sum())} of {len(essay_scores)} essays look incomplete."
+                )
+                st.dataframe(essay_scores, use_container_width=True, hide_index=True)
+
+        if st.session_state.ref_format == "objective" and st.session_state.ref_answers:
+            grade_col, ai_col = st.columns(2)
+            with grade_col:
+                grade_clicked = st.button("⚡ Grade listed submissions against the current reference")
+            with ai_col:
+                ai_clicked = st.button("🤖 AI feedback for listed submissions", disabled=not OPENAI_API_KEY)
+            if grade_clicked or ai_clicked:
+                recent_texts = [item.text for item in load_submission_bodies(recent_items)]
+                graded, hits = grade_with_cache(
+                    recent_texts,
+                    st.session_state.ref_answers,
+                    st.session_state.ref_assignment,
+                    get_grading_cache(),
+                    tolerant=st.session_state.get("tolerant_marking", False),
+                )
+                st.caption(f"{sum(hits)} of {len(hits)} results served from the grading cache.")
+                recent_levels = [item.level for item in recent_items]
+                recent_feedback = [
+                    graded.summary_feedback(i, recent_levels[i], st.session_state.ref_format)
+                    for i in range(len(recent_items))
+                ]
+                if ai_clicked:
+                    with st.spinner("Requesting AI feedback…"):
+                        ai_feedback = ai_feedback_for(graded, recent_texts, recent_levels)
+                    failed = sum(fb is None for fb in ai_feedback)
+                    if failed:
+                        st.warning(f"{failed} AI requests failed; template feedback is shown for them.")
+                    recent_feedback = [ai or fb for ai, fb in zip(ai_feedback, recent_feedback)]
+                st.dataframe(
+                    pd.DataFrame(
+                        {
+                            "Student": [item.student_name for item in recent_items],
+                            "Code": [item.student_code for item in recent_items],
+                            "Assignment": [item.assignment for item in recent_items],
+                            "Score": graded.scores,
+                            "Wrong items": [
+                                ", ".join(map(str, graded.wrong_items(i))) for i in range(len(recent_items))
+                            ],
+                            "Near misses": [
+                                ", ".join(map(str, graded.near_items(i))) for i in range(len(recent_items))
+                            ],
+                            "Feedback": recent_feedback,
+                        }
+                    ),
+                    use_container_width=True,
+                    hide_index=True,
+                )
+                st.markdown(f"**Per-question results ({st.session_state.ref_assignment})**")
+                st.dataframe(graded.question_stats(), use_container_width=True, hide_index=True)
+
+with tab_items:
+    item_store = get_item_analysis_store()
+    st.caption(f"{len(item_store)} objective markings recorded.")
+    item_assignments = item_store.assignments()
+    if not item_assignments:
+        st.info("Item statistics appear once objective submissions are saved.")
+    else:
+        pick_items = st.selectbox(
+            "Assignment", sorted(item_assignments, key=natural_key), key="items_assignment"
+        )
+        st.dataframe(item_store.question_stats(pick_items), use_container_width=True, hide_index=True)
+        st.markdown("**Percent correct per level and month**")
+        st.dataframe(item_store.level_trends(), use_container_width=True, hide_index=True)
+
+with tab_progress:
+    board = get_progress_board()
+    progress_levels = sorted(set(board.levels) | {lvl.upper() for lvl in level_choices[1:]})
+    default_level = student_level.upper() if student_level.upper() in progress_levels else None
+    progress_level = st.selectbox(
+        "Level",
+        progress_levels,
+        index=progress_levels.index(default_level) if default_level else 0,
+        key="progress_level",
+    )
+    matrix = board.matrix(progress_level)
+    pc1, pc2 = st.columns(2)
+    with pc1:
+        page_size = st.selectbox("Students per page", [25, 50, 100], key="progress_page_size")
+    pages = max(1, -(-len(matrix.students) // page_size))
+    with pc2:
+        page_no = st.number_input("Page", 1, pages, 1, key="progress_page")
+    st.caption(
+        f"{len(matrix.students)} students × {len(matrix.assignments)} assignments • "
+        f"{matrix.completion():.0%} complete"
+    )
+    st.dataframe(matrix.page(int(page_no) - 1, page_size), use_container_width=True, hide_index=True)
+
+with tab_counts:
+    if not db:
+        st.info("Submission counts need Firestore credentials.")
+    else:
+        st.caption(
+            f"Counted on the server (no documents downloaded); refreshed at most every {SUBMISSION_COUNTS_TTL}s."
+        )
+        if st.button("🔄 Recount now"):
+            load_submission_counts.clear()
+        try:
+            counts = load_submission_counts(tuple(level_choices[1:]), tuple(SUBMISSION_STATUSES))
+        except Exception as e:
+            st.error(f"Counting submissions failed: {e}")
+        else:
+            st.dataframe(counts, use_container_width=True, hide_index=True)
+    submission_archive = get_submission_archive()
+    archive_summary = submission_archive.summary() if submission_archive else pd.DataFrame()
+    if not archive_summary.empty:
+        st.markdown(f"**Archived locally** ({int(archive_summary['submissions'].sum())} submissions)")
+        st.dataframe(archive_summary, use_container_width=True, hide_index=True)
+
+with tab_search:
+    st.caption(
+        'Search inside submitted texts. Words match with or without umlauts (für = fuer); '
+        'put phrases in "quotes". Submissions become searchable once opened, graded or indexed here.'
+    )
+    sc1, sc2 = st.columns([3, 1])
+    with sc1:
+        search_query = st.text_input("Search", key="search_query")
+    with sc2:
+        search_level = st.selectbox("Level", level_choices, key="search_level")
+    if st.button("📥 Index new submissions"):
+        st.caption(f"{index_new_submissions()} submissions added to the search store.")
+    if search_query.strip():
+        search_index = get_search_index()
+        get_search_store().load(search_index)
+        started = time.perf_counter()
+        found = search_index.search(search_query, level="" if search_level == "All" else search_level, limit=100)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        st.caption(f"{len(found)} matches in {len(search_index)} indexed submissions ({elapsed_ms:.1f} ms).")
+        if found:
+            stored = get_search_store().records([hit.path for hit in found])
+            rows = []
+            for hit in found:
+                rec = stored.get(hit.path, {})
+                ts = int(rec.get("ts_ms") or 0)
+                rows.append(
+                    {
+                        "When": datetime.fromtimestamp(ts / 1000).strftime("%Y-%m-%d %H:%M") if ts else "—",
+                        "Student": rec.get("student_name", ""),
+                        "Code": rec.get("student_code", ""),
+                        "Level": hit.level,
+                        "Assignment": rec.get("assignment", ""),
+                        "Matches": hit.matches,
+                        "Text": snippet(str(rec.get("text", "")), search_query),
+                        "Path": rec.get("path", ""),
+                    }
+                )
+            st.dataframe(pd.DataFrame(rows), use_container_width=True, hide_index=True)
+
 if not st.session_state.ref_assignment:
     ans = load_answers_dictionary()
     if ans:
-        first = list_json_assignments(ans)[0]
-        txt, ln, fmt, ans_map = build_reference_text_from_json(ans[first])
-        st.session_state.ref_assignment = first
-        st.session_state.ref_text = txt
-        st.session_state.ref_link = ln
-        st.session_state.ref_format = fmt
-        st.session_state.ref_answers = ans_map
+        use_reference(list_json_assignments(ans)[0])
 
 st.info(
     f"Currently selected reference → **{st.session_state.ref_assignment or '—'}** (format: {st.session_state.ref_format})"
@@ -1010,7 +1293,15 @@ st.info(
 st.subheader("3) Student submission (local storage)")
 student_text = ""
 student_note = ""
-subs = fetch_submissions(student_level, studentcode)
+chosen: Optional[Submission] = None
+taken_by: Optional[Holder] = None
+subs = get_submission_prefetcher().get(student_level, studentcode)
+submission_archive = get_submission_archive()
+archived_count = submission_archive.count(studentcode, student_level) if submission_archive else 0
+if archived_count and st.checkbox(f"Include {archived_count} archived submissions", key="include_archived"):
+    archived_subs = submission_archive.find(studentcode, student_level)
+    get_search_store().put(archived_subs)
+    subs = sorted(subs + archived_subs, key=lambda d: d.ts_ms, reverse=True)
 
 if not subs:
     st.warning(
@@ -1019,28 +1310,46 @@ if not subs:
         f"- submissions collection where studentCode={studentcode} and level={student_level} (current layout)"
     )
 else:
-    def label_for(d: Dict[str, Any]) -> str:
-        txt = extract_text_from_doc(d)
-        preview = (txt[:80] + "…") if len(txt) > 80 else txt
-        ts = datetime.fromtimestamp(d.get("_ts_ms", 0) / 1000).strftime("%Y-%m-%d %H:%M")
-        return (
-            f"{ts} • {d.get('student_name','')} • {d.get('student_code','')} "
-            f"• {d.get('level','')} • {d.get('chapter','')} "
-            f"• {d.get('assignment','')} • {preview}"
+    # Options are paths: labels of two submissions can be identical.
+    by_path = {d.path: d for d in load_missing_previews(subs)}
+    pending_path = st.session_state.pop("pending_submission", "")
+    if pending_path in by_path:
+        st.session_state.submission_choice = pending_path
+    pick = st.selectbox(
+        "Pick submission", list(by_path), format_func=lambda p: by_path[p].label, key="submission_choice"
+    )
+    chosen = by_path[pick]
+    st.session_state.current_submission = chosen.path
+    taken_by = hold_submission(chosen.path)
+    if taken_by:
+        until = datetime.fromtimestamp(taken_by[1]).strftime("%H:%M")
+        st.warning(
+            f"{owner_name(taken_by[0])} is marking this submission (lease until {until}). "
+            "Pick another one; saving is disabled while their lease lasts."
         )
-
-    labels_sub = [label_for(d) for d in subs]
-    pick = st.selectbox("Pick submission", labels_sub)
-    chosen = subs[labels_sub.index(pick)]
-    student_text = extract_text_from_doc(chosen)
-    st.markdown(f"**Student:** {chosen.get('student_name','')}")
-    st.markdown(f"**Level:** {chosen.get('level','')}")
-    st.markdown(f"**Chapter:** {chosen.get('chapter','')}")
-    st.markdown(f"**Assignment:** {chosen.get('assignment','')}")
+    student_text = load_submission_bodies([chosen])[0].text
+    st.markdown(f"**Student:** {chosen.student_name}")
+    st.markdown(f"**Level:** {chosen.level}")
+    st.markdown(f"**Chapter:** {chosen.chapter}")
+    st.markdown(f"**Assignment:** {chosen.assignment}")
+
+    matched = match_reference(chosen)
+    if matched is None:
+        st.caption("No answers-dictionary key matches this submission; pick the reference by hand.")
+    else:
+        st.caption(f"Matched reference: {matched.key} ({matched.method}, {matched.score:.0%})")
+        if (
+            st.checkbox("Switch to the matched reference automatically", value=True, key="auto_match_ref")
+            and st.session_state.get("matched_submission") != chosen.id
+        ):
+            st.session_state.matched_submission = chosen.id
+            if matched.key != st.session_state.ref_assignment:
+                use_reference(matched.key)
+                st.rerun()
 
     note_keys = ["student_note", "studentnote", "student_notes", "note", "notes"]
     for key in note_keys:
-        raw_note = chosen.get(key)
+        raw_note = chosen.doc.get(key)
         if isinstance(raw_note, str):
             candidate = raw_note.strip()
         elif raw_note is not None:
@@ -1062,6 +1371,13 @@ st.code(st.session_state.ref_text or "(not set)", language="markdown")
 st.caption(f"Format: {st.session_state.ref_format}")
 if st.session_state.ref_link:
     st.caption(f"Reference link: {st.session_state.ref_link}")
+if student_text and st.session_state.ref_format != "objective":
+    essay_row = prescore_current_essays([student_text], [student_level]).iloc[0]
+    pre_c1, pre_c2, pre_c3, pre_c4 = st.columns(4)
+    pre_c1.metric("Words", f"{essay_row['words']}", help=f"Target {essay_row['target_min']}–{essay_row['target_max']}")
+    pre_c2.metric("Phrase coverage", f"{essay_row['phrase_coverage']:.0f}%")
+    pre_c3.metric("Umlauts used / missed", f"{essay_row['umlauts']} / {essay_row['umlaut_misses']}")
+    pre_c4.metric("Pre-score", f"{essay_row['prescore']}", help=f"Triage: {essay_row['triage']}")
 
 # Combined copy block
 st.subheader("4) Combined (copyable)")
@@ -1078,20 +1394,80 @@ if "ai_score" not in st.session_state:
 if "feedback" not in st.session_state:
     st.session_state.feedback = ""
 
-if st.button("Reset"):
-    st.session_state.ai_score = 0
-    st.session_state.feedback = ""
+def auto_mark_current() -> Optional[Tuple[int, str, bool]]:
+    """Grade the chosen submission against the objective reference (cached)."""
+    if not student_text or st.session_state.ref_format != "objective" or not st.session_state.ref_answers:
+        return None
+    graded, hits = grade_with_cache(
+        [student_text],
+        st.session_state.ref_answers,
+        st.session_state.ref_assignment,
+        get_grading_cache(),
+        tolerant=st.session_state.get("tolerant_marking", False),
+    )
+    feedback = graded.summary_feedback(0, student_level, st.session_state.ref_format)
+    return int(graded.scores[0]), feedback, hits[0]
+
+
+st.checkbox(
+    "Accept small spelling slips (listed separately in the feedback)",
+    key="tolerant_marking",
+    disabled=st.session_state.ref_format != "objective",
+)
+mark_c1, mark_c2, mark_c3 = st.columns(3)
+with mark_c1:
+    if st.button("Reset"):
+        st.session_state.ai_score = 0
+        st.session_state.feedback = ""
+with mark_c2:
+    if st.button("⚡ Auto-mark objectives", disabled=st.session_state.ref_format != "objective"):
+        marked = auto_mark_current()
+        if marked is None:
+            st.warning("Pick a submission and an objective reference first.")
+        else:
+            st.session_state.ai_score, st.session_state.feedback, from_cache = marked
+            if from_cache:
+                st.caption("Loaded from the grading cache.")
+with mark_c3:
+    if st.button(
+        "🤖 AI feedback",
+        disabled=st.session_state.ref_format != "objective" or not OPENAI_API_KEY,
+    ):
+        if not student_text or not st.session_state.ref_answers:
+            st.warning("Pick a submission and an objective reference first.")
+        else:
+            graded, _ = grade_with_cache(
+                [student_text],
+                st.session_state.ref_answers,
+                st.session_state.ref_assignment,
+                get_grading_cache(),
+                tolerant=st.session_state.get("tolerant_marking", False),
+            )
+            with st.spinner("Requesting AI feedback…"):
+                ai_text = ai_feedback_for(graded, [student_text], [student_level])[0]
+            if ai_text is None:
+                st.warning("The AI request failed; try again in a moment.")
+            else:
+                st.session_state.ai_score = int(graded.scores[0])
+                st.session_state.feedback = ai_text
 
-score = st.number_input("Score", 0, 100, value=int(st.session_state.ai_score))
-st.session_state.ai_score = score
+col_mark, col_history = st.columns([3, 2])
+with col_mark:
+    score = st.number_input("Score", 0, 100, value=int(st.session_state.ai_score))
+    st.session_state.ai_score = score
 
-feedback = st.text_area("Feedback", key="feedback", height=80)
+    feedback = st.text_area("Feedback", key="feedback", height=80)
+with col_history:
+    render_score_history(studentcode, st.session_state.ref_assignment)
 
 # Save to Scores
 st.subheader("5) Save to Scores sheet")
 save_to_firestore = st.checkbox("also save to Firestore")
-if st.button("💾 Save", type="primary", use_container_width=True):
-    if not studentcode:
+if st.button("💾 Save", type="primary", use_container_width=True, disabled=bool(taken_by)):
+    taken_by = hold_submission(chosen.path) if chosen else None  # the lease may have changed hands since
+    if taken_by:
+        st.error(f"{owner_name(taken_by[0])} holds this submission now; your score was not saved.")
+    elif not studentcode:
         st.error("Pick a student first.")
     elif not st.session_state.ref_assignment:
         st.error("Pick a JSON reference and click its 'Use this JSON reference' button.")
@@ -1119,10 +1495,29 @@ if st.button("💾 Save", type="primary", use_container_width=True):
 
         result = save_row(row, to_firestore=save_to_firestore)
         if result.get("ok"):
+            if st.session_state.get("leased_submission"):
+                try:
+                    get_lease_store().release(st.session_state.leased_submission, st.session_state.marker_id)
+                except Exception:
+                    pass  # the lease expires on its own
+                st.session_state.leased_submission = ""
+            if chosen and student_text and st.session_state.ref_format == "objective" and st.session_state.ref_answers:
+                get_item_analysis_store().record(
+                    chosen.path,
+                    st.session_state.ref_assignment,
+                    student_level,
+                    grade_class(
+                        [student_text],
+                        st.session_state.ref_answers,
+                        tolerant=st.session_state.get("tolerant_marking", False),
+                    ),
+                    studentcode=studentcode,
+                    score=score_int,
+                )
             message = result.get("message", "Saved")
             st.session_state["last_save_success"] = message
             st.success("✅ " + message)
-            load_sheet_csv.clear()
+            load_sheet_query.clear()
             st.rerun()
         elif result.get("why") == "validation":
             field = result.get("field")
@@ -0,0 +1,280 @@
+"""Move old submissions out of Firestore into compressed local shards.
+
+Submissions whose ``_ts_ms`` is older than the cut-off are appended to
+gzip-compressed JSONL shards partitioned by level and month
+(``archive/A1/2024-03.jsonl.gz``) and then deleted from the collection, so
+listings and unfiltered queries only pay for recent data. Every page of a
+run is appended to a shard as its own gzip member; the SQLite index
+(``archive/index.sqlite3``) records for each document its student code and
+the shard offset of that member, so looking up a student decompresses only
+the members holding their submissions.
+
+Shards and index are written and read back before anything is deleted, and
+documents are keyed by id, so a run that stops half-way can simply be
+started again. The archive directory has to exist already: it is the only
+copy of the deleted documents, so it must not be created by accident in a
+temporary or ephemeral working directory. Archiving relies on ``_ts_ms``
+(see ``migrate_utils.py``).
+
+Usage::
+
+    python archive_utils.py --dir /srv/markmyletter/archive --older-than-days 365 --dry-run
+    python archive_utils.py --dir /srv/markmyletter/archive --older-than-days 365
+"""
+
+from __future__ import annotations
+
+import argparse
+import gzip
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import pandas as pd
+
+from submission_utils import Submission
+
+_READ_CHUNK = 64 * 1024
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, bytes):
+        return value.decode("utf-8", "replace")
+    return str(value)
+
+
+def shard_month(ts_ms: int) -> str:
+    """Return the ``YYYY-MM`` partition of a timestamp (UTC)."""
+    if not ts_ms:
+        return "undated"
+    return datetime.fromtimestamp(ts_ms / 1000, tz=timezone.utc).strftime("%Y-%m")
+
+
+class SubmissionArchive:
+    """Level/month shards of archived submissions plus a student index.
+
+    Parameters
+    ----------
+    root:
+        Existing directory holding the shards and ``index.sqlite3``.
+    """
+
+    def __init__(self, root: str) -> None:
+        if not root or not os.path.isdir(root):
+            raise FileNotFoundError(f"Archive directory does not exist: {root!r}")
+        self.root = root
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(root, "index.sqlite3"), check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=FULL")  # the index must survive a crash before deletes
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS archived (
+                    doc_id TEXT PRIMARY KEY,
+                    path TEXT NOT NULL,
+                    student_code TEXT NOT NULL,
+                    level TEXT NOT NULL,
+                    ts_ms INTEGER NOT NULL,
+                    shard TEXT NOT NULL,
+                    member_offset INTEGER NOT NULL
+                )
+                """
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS archived_student ON archived (student_code, level)")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return int(self._conn.execute("SELECT COUNT(*) FROM archived").fetchone()[0])
+
+    def write(self, subs: Iterable[Submission]) -> int:
+        """Append ``subs`` to their shards and index them; return how many."""
+        groups: Dict[str, List[Submission]] = {}
+        for sub in subs:
+            level = str(sub.level or "").strip().upper() or "unknown"
+            groups.setdefault(os.path.join(level, f"{shard_month(sub.ts_ms)}.jsonl.gz"), []).append(sub)
+
+        rows: List[Tuple] = []
+        for shard, members in groups.items():
+            lines = "".join(
+                json.dumps({"id": s.id, "path": s.path, "doc": s.doc}, ensure_ascii=False, default=_json_default) + "\n"
+                for s in members
+            )
+            full = os.path.join(self.root, shard)
+            os.makedirs(os.path.dirname(full), exist_ok=True)
+            with open(full, "ab") as f:
+                offset = f.tell()
+                f.write(gzip.compress(lines.encode("utf-8")))
+                f.flush()
+                os.fsync(f.fileno())
+            rows.extend(
+                (s.id, s.path, str(s.student_code or "").strip(), str(s.level or "").strip().upper(), s.ts_ms, shard, offset)
+                for s in members
+            )
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO archived VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+        return len(rows)
+
+    def _read_member(self, shard: str, offset: int) -> List[Dict[str, Any]]:
+        inflate = zlib.decompressobj(wbits=31)  # one gzip member
+        data = bytearray()
+        with open(os.path.join(self.root, shard), "rb") as f:
+            f.seek(offset)
+            while not inflate.eof:
+                chunk = f.read(_READ_CHUNK)
+                if not chunk:
+                    break
+                data += inflate.decompress(chunk)
+        return [json.loads(line) for line in data.decode("utf-8").splitlines() if line]
+
+    def verify(self, subs: Iterable[Submission]) -> List[str]:
+        """Return the ids of ``subs`` that do not read back unchanged from the archive."""
+        subs = list(subs)
+        ids = [s.id for s in subs]
+        located: Dict[str, Tuple[str, int]] = {}
+        with self._lock:
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                marks = ",".join("?" * len(chunk))
+                query = f"SELECT doc_id, shard, member_offset FROM archived WHERE doc_id IN ({marks})"
+                located.update((doc_id, (shard, offset)) for doc_id, shard, offset in self._conn.execute(query, chunk))
+
+        stored: Dict[str, Dict[str, Any]] = {}
+        for member in set(located.values()):
+            try:
+                stored.update((rec["id"], rec) for rec in self._read_member(*member))
+            except (OSError, EOFError, ValueError, zlib.error):
+                continue  # unreadable member: its submissions fail below
+        bad = []
+        for sub in subs:
+            rec = stored.get(sub.id)
+            expected = json.loads(json.dumps(sub.doc, ensure_ascii=False, default=_json_default))
+            if rec is None or rec["path"] != sub.path or rec["doc"] != expected:
+                bad.append(sub.id)
+        return bad
+
+    def find(self, student_code: str, level: str = "") -> List[Submission]:
+        """Return a student's archived submissions, newest first."""
+        query = "SELECT doc_id, shard, member_offset FROM archived WHERE student_code = ?"
+        params: List[Any] = [str(student_code or "").strip()]
+        if level:
+            query += " AND level = ?"
+            params.append(str(level).strip().upper())
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+
+        wanted: Dict[Tuple[str, int], set] = {}
+        for doc_id, shard, offset in rows:
+            wanted.setdefault((shard, offset), set()).add(doc_id)
+        subs: List[Submission] = []
+        for (shard, offset), ids in wanted.items():
+            for rec in self._read_member(shard, offset):
+                if rec["id"] in ids:
+                    subs.append(Submission(rec["doc"], rec["id"], fallback_level=level, path=rec["path"]))
+        subs.sort(key=lambda s: s.ts_ms, reverse=True)
+        return subs
+
+    def count(self, student_code: str, level: str = "") -> int:
+        """Return how many submissions of a student are archived."""
+        query = "SELECT COUNT(*) FROM archived WHERE student_code = ?"
+        params: List[Any] = [str(student_code or "").strip()]
+        if level:
+            query += " AND level = ?"
+            params.append(str(level).strip().upper())
+        with self._lock:
+            return int(self._conn.execute(query, params).fetchone()[0])
+
+    def summary(self) -> pd.DataFrame:
+        """Return archived submissions per shard (level and month)."""
+        with self._lock:
+            rows = self._conn.execute("SELECT shard, COUNT(*) FROM archived GROUP BY shard ORDER BY shard").fetchall()
+        return pd.DataFrame(
+            [(os.path.dirname(s), os.path.basename(s).split(".")[0], n) for s, n in rows],
+            columns=["level", "month", "submissions"],
+        )
+
+
+def archive_old_submissions(
+    db,
+    archive: SubmissionArchive,
+    older_than_days: float = 365,
+    batch_size: int = 200,
+    dry_run: bool = False,
+    collection: str = "submissions",
+    now: Optional[float] = None,
+) -> Counter:
+    """Move submissions older than ``older_than_days`` into ``archive``.
+
+    Returns the number of (would-be) archived submissions per level. Each
+    page is written to the archive and read back before its documents are
+    deleted in one batch; if any document does not read back unchanged, the
+    run stops with a ``RuntimeError`` and nothing of that page is deleted.
+    """
+    cutoff = int(((now if now is not None else time.time()) - older_than_days * 86400) * 1000)
+    batch_size = max(1, min(batch_size, 500))
+    query = db.collection(collection).where("_ts_ms", ">", 0).where("_ts_ms", "<", cutoff).order_by("_ts_ms")
+    moved: Counter = Counter()
+
+    if dry_run:
+        for snap in query.select(["level", "_ts_ms"]).stream():
+            moved[str((snap.to_dict() or {}).get("level") or "unknown").strip().upper()] += 1
+        return moved
+
+    while True:
+        page = list(query.limit(batch_size).stream())
+        if not page:
+            return moved
+        subs = [Submission(snap.to_dict() or {}, snap.id) for snap in page]
+        archive.write(subs)
+        unverified = archive.verify(subs)
+        if unverified:
+            raise RuntimeError(
+                f"{len(unverified)} submissions did not read back from {archive.root} "
+                f"(e.g. {unverified[0]}); nothing of this page was deleted"
+            )
+        batch = db.batch()
+        for snap in page:
+            batch.delete(snap.reference)
+        batch.commit()
+        moved.update(str(s.level or "unknown").strip().upper() for s in subs)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--older-than-days", type=float, default=365, help="archive submissions older than this")
+    parser.add_argument("--dir", required=True, help="existing archive directory on durable storage")
+    parser.add_argument("--collection", default="submissions", help="flat submissions collection")
+    parser.add_argument("--batch-size", type=int, default=200, help="documents archived per delete batch")
+    parser.add_argument("--dry-run", action="store_true", help="count what would be archived")
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.dir):
+        print(f"Archive directory {args.dir} does not exist; create it on durable storage first.")
+        return 1
+
+    from firebase_utils import get_firestore_client
+
+    db = get_firestore_client()
+    if db is None:
+        print("Firestore is not configured (add the firebase key to .streamlit/secrets.toml).")
+        return 1
+    archive = SubmissionArchive(args.dir)
+    moved = archive_old_submissions(
+        db, archive, args.older_than_days, args.batch_size, dry_run=args.dry_run, collection=args.collection
+    )
+    for level, n in sorted(moved.items()):
+        print(f"{level}: {n}")
+    print(f"{sum(moved.values())} submissions {'would be ' if args.dry_run else ''}archived to {args.dir}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
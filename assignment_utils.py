@@ -0,0 +1,163 @@
+"""Match submission assignment labels to answers-dictionary keys.
+
+Submissions carry free-form ``assignment``/``chapter`` values such as
+``"1.1 small talk"`` while the dictionary key is ``"A2 1.1 Small Talk"``.
+:class:`AssignmentIndex` normalises every key once into lookup tables:
+
+* the folded label itself (exact match),
+* ``(level, chapter number)`` and the chapter number alone,
+* title tokens, as an inverted index for the fuzzy fallback.
+
+Resolving a submission is a few dictionary lookups; only labels without a
+usable chapter number fall back to token overlap and, last, ``difflib``.
+"""
+
+from __future__ import annotations
+
+import difflib
+import re
+import threading
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+_LEVEL = re.compile(r"^[abc][12]$")
+_TOKEN = re.compile(r"\b[abc][12]\b|\d+(?:\.\d+)*|[^\W\d_]+")
+_FOLD = str.maketrans({"ä": "ae", "ö": "oe", "ü": "ue", "ß": "ss"})
+
+# Title words that say nothing about which assignment is meant.
+_NOISE = frozenset({"teil", "lesen", "horen", "hoeren", "schreiben", "chapter", "kapitel", "lesson", "assignment"})
+
+
+def label_tokens(label: str) -> List[str]:
+    """Return the folded tokens of an assignment label."""
+    return _TOKEN.findall(str(label or "").lower().translate(_FOLD))
+
+
+@dataclass(frozen=True)
+class AssignmentMatch:
+    """Result of :meth:`AssignmentIndex.resolve`."""
+
+    key: str
+    method: str  # "exact", "chapter", "tokens" or "fuzzy"
+    score: float
+
+
+class AssignmentIndex:
+    """Lookup index over answers-dictionary keys.
+
+    Parameters
+    ----------
+    keys:
+        Dictionary keys such as ``"A2 1.1 Small Talk"`` or
+        ``"A1 Personal Pronouns 1.1"``.
+    max_memo:
+        Resolved labels remembered; the oldest are dropped first.
+    """
+
+    def __init__(self, keys: Iterable[str], max_memo: int = 4096) -> None:
+        self.keys: List[str] = []
+        self.max_memo = max_memo
+        self._exact: Dict[str, str] = {}
+        self._by_chapter: Dict[Tuple[str, str], List[str]] = {}
+        self._by_token: Dict[str, Set[str]] = {}
+        self._titles: Dict[str, Set[str]] = {}
+        self._levels: Dict[str, str] = {}
+        self._folded: Dict[str, str] = {}
+        self._memo: Dict[Tuple[str, str, str], Optional[AssignmentMatch]] = {}
+        self._lock = threading.Lock()
+        for key in keys:
+            self.add(key)
+
+    def add(self, key: str) -> None:
+        """Index one dictionary key."""
+        tokens = label_tokens(key)
+        level = next((t.upper() for t in tokens if _LEVEL.match(t)), "")
+        numbers = [t for t in tokens if t[0].isdigit()]
+        # The chapter is the dotted number ("A2 1.1 Small Talk") or else the
+        # last one ("A1 12 Hour Clock 7").
+        chapter = next((t for t in numbers if "." in t), numbers[-1] if numbers else "")
+        title = {t for t in tokens if t != chapter and not _LEVEL.match(t) and t not in _NOISE}
+        folded = " ".join(tokens)
+
+        self.keys.append(key)
+        self._exact.setdefault(folded, key)
+        self._exact.setdefault(" ".join(t for t in tokens if not _LEVEL.match(t)), key)
+        if chapter:
+            self._by_chapter.setdefault((level, chapter), []).append(key)
+            if level:
+                self._by_chapter.setdefault(("", chapter), []).append(key)
+        for token in title:
+            self._by_token.setdefault(token, set()).add(key)
+        self._titles[key] = title
+        self._levels[key] = level
+        self._folded[key] = folded
+        self._memo.clear()
+
+    def resolve(self, assignment: str, chapter: str = "", level: str = "") -> Optional[AssignmentMatch]:
+        """Return the dictionary key a submission refers to, or ``None``.
+
+        ``level`` (e.g. the submission's ``level`` field) restricts the
+        candidates when the label itself carries no level.
+        """
+        memo_key = (str(assignment or ""), str(chapter or ""), str(level or "").strip().upper())
+        with self._lock:
+            if memo_key in self._memo:
+                return self._memo[memo_key]
+        match = self._resolve(*memo_key)
+        with self._lock:
+            self._memo[memo_key] = match
+            if len(self._memo) > self.max_memo:
+                self._memo.pop(next(iter(self._memo)))
+        return match
+
+    def _resolve(self, assignment: str, chapter: str, level: str) -> Optional[AssignmentMatch]:
+        tokens = label_tokens(assignment)
+        level = next((t.upper() for t in tokens if _LEVEL.match(t)), level)
+        if not tokens and not chapter:
+            return None
+
+        folded = " ".join(tokens)
+        for probe in (folded, f"{level.lower()} {folded}".strip()):
+            key = self._exact.get(probe)
+            if key and (not level or self._levels[key] in ("", level)):
+                return AssignmentMatch(key, "exact", 1.0)
+
+        title = {t for t in tokens if "." not in t and not _LEVEL.match(t) and t not in _NOISE}
+        numbers = [t for t in tokens + label_tokens(chapter) if t[0].isdigit()]
+        numbers.sort(key=lambda t: -t.count("."))  # "1.1" says more than "1"
+        for number in numbers:
+            candidates = self._by_chapter.get((level, number), [])
+            if level and not candidates:
+                candidates = [k for k in self._by_chapter.get(("", number), []) if not self._levels[k]]
+            if len(candidates) == 1:
+                return AssignmentMatch(candidates[0], "chapter", 1.0)
+            if candidates and title:
+                best, score = self._best_by_title(candidates, title)
+                if score > 0:
+                    return AssignmentMatch(best, "chapter", score)
+
+        if title:
+            pool = set().union(*(self._by_token.get(t, set()) for t in title))
+            if level:
+                pool = {k for k in pool if self._levels[k] in ("", level)}
+            if pool:
+                best, score = self._best_by_title(sorted(pool), title)
+                if score >= 0.5:
+                    return AssignmentMatch(best, "tokens", score)
+
+        pool_keys = [k for k in self.keys if not level or self._levels[k] in ("", level)]
+        folded_pool = {self._folded[k]: k for k in pool_keys}
+        close = difflib.get_close_matches(folded, list(folded_pool), n=1, cutoff=0.75)
+        if close:
+            ratio = difflib.SequenceMatcher(None, folded, close[0]).ratio()
+            return AssignmentMatch(folded_pool[close[0]], "fuzzy", round(ratio, 3))
+        return None
+
+    def _best_by_title(self, candidates: List[str], title: Set[str]) -> Tuple[str, float]:
+        def jaccard(key: str) -> float:
+            other = self._titles[key]
+            union = len(title | other)
+            return len(title & other) / union if union else 0.0
+
+        best = max(candidates, key=jaccard)
+        return best, round(jaccard(best), 3)
@@ -0,0 +1,169 @@
+"""Persistent cache of objective grading results.
+
+Results are stored in SQLite keyed by the hash of the submission text, the
+assignment and the answer-key version, so re-opening a submission or
+re-running a batch only grades what has not been graded before.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from marking_utils import MARKING_VERSION, ClassGrade, grade_class, grade_from_wrong_answers
+
+WrongList = List[Tuple[int, str, str]]
+
+
+def text_hash(text: str) -> str:
+    """Return the content hash of a submission's extracted text."""
+    return hashlib.sha256((text or "").strip().encode("utf-8")).hexdigest()
+
+
+def key_version(ref_answers: Dict[int, str], tolerant: bool = False) -> str:
+    """Return a short version id of an answer key and the marking logic."""
+    parts: List = [MARKING_VERSION, sorted((int(n), str(a)) for n, a in (ref_answers or {}).items())]
+    if tolerant:
+        parts.append("tolerant")
+    payload = json.dumps(parts, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+class GradingCache:
+    """SQLite-backed map of (text hash, assignment, key version) to a result.
+
+    Only the wrong-answer list is kept: scores, feedback and statistics are
+    rebuilt from it with :func:`marking_utils.grade_from_wrong_answers`. A
+    single connection is shared between threads and guarded by a lock, as
+    Streamlit serves sessions from several threads.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS wrong_answers (
+                    text_hash TEXT NOT NULL,
+                    assignment TEXT NOT NULL,
+                    key_version TEXT NOT NULL,
+                    wrong TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (text_hash, assignment, key_version)
+                )
+                """
+            )
+
+    def get_many(self, hashes: Iterable[str], assignment: str, version: str) -> Dict[str, WrongList]:
+        """Return cached wrong-answer lists by text hash."""
+        wanted = list(dict.fromkeys(hashes))
+        found: Dict[str, WrongList] = {}
+        with self._lock:
+            for start in range(0, len(wanted), 500):
+                chunk = wanted[start:start + 500]
+                marks = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, wrong FROM wrong_answers "
+                    f"WHERE assignment = ? AND key_version = ? AND text_hash IN ({marks})",
+                    [assignment, version, *chunk],
+                ).fetchall()
+                for h, wrong in rows:
+                    found[h] = [tuple(w) for w in json.loads(wrong)]
+        return found
+
+    def put_many(self, assignment: str, version: str, results: Iterable[Tuple[str, WrongList]]) -> None:
+        """Store ``(text hash, wrong)`` results."""
+        now = time.time()
+        rows = [(h, assignment, version, json.dumps(wrong, ensure_ascii=False), now) for h, wrong in results]
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO wrong_answers VALUES (?, ?, ?, ?, ?)", rows)
+
+
+class FeedbackCache:
+    """SQLite-backed map of (text hash, assignment, prompt version) to AI feedback.
+
+    Shares the database file of :class:`GradingCache` but keeps its own
+    table and connection.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS ai_feedback (
+                    text_hash TEXT NOT NULL,
+                    assignment TEXT NOT NULL,
+                    prompt_version TEXT NOT NULL,
+                    feedback TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (text_hash, assignment, prompt_version)
+                )
+                """
+            )
+
+    def get_many(self, hashes: Iterable[str], assignment: str, version: str) -> Dict[str, str]:
+        """Return cached feedback by text hash."""
+        wanted = list(dict.fromkeys(hashes))
+        found: Dict[str, str] = {}
+        with self._lock:
+            for start in range(0, len(wanted), 500):
+                chunk = wanted[start:start + 500]
+                marks = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, feedback FROM ai_feedback "
+                    f"WHERE assignment = ? AND prompt_version = ? AND text_hash IN ({marks})",
+                    [assignment, version, *chunk],
+                ).fetchall()
+                found.update(rows)
+        return found
+
+    def put(self, text_hash_: str, assignment: str, version: str, feedback: str) -> None:
+        """Store one feedback text (called as each response arrives)."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO ai_feedback VALUES (?, ?, ?, ?, ?)",
+                (text_hash_, assignment, version, feedback, time.time()),
+            )
+
+
+def grade_with_cache(
+    texts: List[str],
+    ref_answers: Dict[int, str],
+    assignment: str,
+    cache: Optional[GradingCache] = None,
+    tolerant: bool = False,
+) -> Tuple[ClassGrade, List[bool]]:
+    """Grade ``texts`` like :func:`grade_class`, reusing cached results.
+
+    Only submissions missing from the cache are parsed and graded; their
+    results are stored before returning. The second value flags which
+    submissions were served from the cache.
+    """
+    if cache is None:
+        return grade_class(texts, ref_answers, tolerant), [False] * len(texts)
+
+    version = key_version(ref_answers, tolerant)
+    hashes = [text_hash(t) for t in texts]
+    found = cache.get_many(hashes, assignment, version)
+
+    misses = [i for i, h in enumerate(hashes) if h not in found]
+    if misses:
+        fresh = grade_class([texts[i] for i in misses], ref_answers, tolerant)
+        new_rows = [(hashes[i], fresh.wrong_answers(k)) for k, i in enumerate(misses)]
+        found.update(new_rows)
+        cache.put_many(assignment, version, new_rows)
+
+    missed = set(misses)
+    hits = [i not in missed for i in range(len(texts))]
+    return grade_from_wrong_answers(ref_answers, [found[h] for h in hashes], tolerant), hits
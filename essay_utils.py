@@ -0,0 +1,165 @@
+"""Fast local pre-scoring of essay-format submissions.
+
+Each essay is tokenised once; everything else is computed for the whole
+class with NumPy: word counts against the level's target range, umlaut/ß
+usage versus spelled-out substitutes (``fuer``, ``schoen``), coverage of
+the required phrases and sentence-length statistics. The result is a triage
+table that flags obviously incomplete essays before any human or AI pass.
+"""
+
+from __future__ import annotations
+
+import re
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from rules_utils import ALTERNATIVE_SEP
+from text_utils import canonical_token
+
+# (minimum, maximum) words per level; an answers-dictionary entry may
+# override them with "word_target": [min, max].
+LEVEL_WORD_TARGETS: Dict[str, Tuple[int, int]] = {
+    "A1": (30, 80),
+    "A2": (50, 120),
+    "B1": (80, 180),
+    "B2": (150, 300),
+}
+DEFAULT_WORD_TARGET = (50, 150)
+
+# Common words students type without umlauts; reference words add to these.
+COMMON_UMLAUT_WORDS = (
+    "für", "über", "schön", "möchte", "möchten", "grüße", "hören", "können", "müssen",
+    "würde", "wäre", "hätte", "tschüss", "heiße", "straße", "größe", "später", "gemütlich",
+    "natürlich", "früh", "müde", "mädchen", "gefällt", "fährt", "läuft", "ähnlich", "öffnen",
+)
+
+_WORD = re.compile(r"[^\W\d_]+")
+_SENTENCE_END = re.compile(r"[.!?]+(?:\s|$)")
+_UMLAUT_CHARS = re.compile(r"[äöüÄÖÜß]")
+_SPELLED_OUT = str.maketrans({"ä": "ae", "ö": "oe", "ü": "ue", "ß": "ss"})
+
+
+def word_target(level: str, entry: Optional[Dict[str, Any]] = None) -> Tuple[int, int]:
+    """Return the (min, max) word target for ``level`` or the entry's override."""
+    target = (entry or {}).get("word_target")
+    if isinstance(target, (list, tuple)) and len(target) == 2:
+        return int(target[0]), int(target[1])
+    level = (str(level or "").split() or [""])[0].upper()
+    return LEVEL_WORD_TARGETS.get(level, DEFAULT_WORD_TARGET)
+
+
+def required_phrases(entry: Optional[Dict[str, Any]], answers: Optional[Dict[int, str]] = None) -> List[str]:
+    """Return the phrases an essay should contain.
+
+    Uses the entry's ``"required_phrases"`` list when present, otherwise the
+    reference answers (each alternative counts as its own phrase).
+    """
+    listed = (entry or {}).get("required_phrases")
+    if isinstance(listed, (list, tuple)):
+        return [str(p).strip() for p in listed if str(p).strip()]
+    phrases: List[str] = []
+    for ans in (answers or {}).values():
+        for alt in str(ans).replace(" / ", ALTERNATIVE_SEP).split(ALTERNATIVE_SEP):
+            if alt.strip():
+                phrases.append(alt.strip())
+    return phrases
+
+
+def _content_words(text: str) -> List[str]:
+    return [canonical_token(w) for w in _WORD.findall(text or "") if len(w) > 2]
+
+
+def _umlaut_substitutes(phrases: Iterable[str]) -> frozenset:
+    # Only spelled-out forms count: dropping the dots often gives another
+    # real word (schön/schon, hätte/hatte, würde/wurde).
+    words = {w.lower() for p in phrases for w in _WORD.findall(p)} | set(COMMON_UMLAUT_WORDS)
+    return frozenset(w.translate(_SPELLED_OUT) for w in words if _UMLAUT_CHARS.search(w))
+
+
+def prescore_essays(
+    texts: Sequence[str],
+    levels: Sequence[str],
+    phrases: Sequence[str] = (),
+    target: Optional[Tuple[int, int]] = None,
+) -> pd.DataFrame:
+    """Return one triage row per essay.
+
+    ``target`` overrides the per-level word targets. Columns: word counts and
+    target status, sentence statistics, umlaut usage, phrase coverage, a
+    0–100 ``prescore`` and a ``triage`` label (``incomplete``, ``short``,
+    ``long`` or ``review``).
+    """
+    n = len(texts)
+    substitutes = _umlaut_substitutes(phrases)
+    phrase_words = [sorted(set(_content_words(p))) for p in phrases]
+    phrase_words = [w for w in phrase_words if w]
+    vocab: Dict[str, int] = {}
+    for words in phrase_words:
+        for w in words:
+            vocab.setdefault(w, len(vocab))
+
+    word_counts = np.zeros(n, dtype=np.int32)
+    sentences = np.zeros(n, dtype=np.int32)
+    longest = np.zeros(n, dtype=np.int32)
+    umlauts = np.zeros(n, dtype=np.int32)
+    misses = np.zeros(n, dtype=np.int32)
+    present = np.zeros((n, max(len(vocab), 1)), dtype=bool)
+    for i, text in enumerate(texts):
+        text = text or ""
+        words = _WORD.findall(text)
+        word_counts[i] = len(words)
+        lengths = [len(_WORD.findall(s)) for s in _SENTENCE_END.split(text)]
+        lengths = [k for k in lengths if k]
+        sentences[i] = len(lengths)
+        longest[i] = max(lengths, default=0)
+        umlauts[i] = len(_UMLAUT_CHARS.findall(text))
+        misses[i] = sum(1 for w in words if w.lower() in substitutes)
+        if vocab:
+            hits = [vocab[c] for c in {canonical_token(w) for w in words if len(w) > 2} if c in vocab]
+            present[i, hits] = True
+
+    if phrase_words:
+        incidence = np.zeros((len(phrase_words), present.shape[1]), dtype=np.int32)
+        for j, words in enumerate(phrase_words):
+            incidence[j, [vocab[w] for w in words]] = 1
+        covered = present.astype(np.int32) @ incidence.T == incidence.sum(axis=1)
+        coverage = covered.mean(axis=1)
+    else:
+        coverage = np.ones(n)
+
+    if target is not None:
+        mins = np.full(n, target[0])
+        maxs = np.full(n, target[1])
+    else:
+        bounds = np.array([word_target(level) for level in levels], dtype=np.int32).reshape(n, 2)
+        mins, maxs = bounds[:, 0], bounds[:, 1]
+
+    fill = np.minimum(word_counts / np.maximum(mins, 1), 1.0)
+    umlaut_ok = np.divide(umlauts, umlauts + misses, out=np.ones(n), where=(umlauts + misses) > 0)
+    prescore = np.rint(100 * (0.5 * fill + 0.3 * coverage + 0.2 * umlaut_ok)).astype(int)
+    prescore[word_counts == 0] = 0
+
+    triage = np.select(
+        [word_counts < mins * 0.5, word_counts < mins, word_counts > maxs],
+        ["incomplete", "short", "long"],
+        default="review",
+    )
+    return pd.DataFrame(
+        {
+            "words": word_counts,
+            "target_min": mins,
+            "target_max": maxs,
+            "sentences": sentences,
+            "mean_sentence_len": np.divide(
+                word_counts, sentences, out=np.zeros(n), where=sentences > 0
+            ).round(1),
+            "max_sentence_len": longest,
+            "umlauts": umlauts,
+            "umlaut_misses": misses,
+            "phrase_coverage": (100 * coverage).round(1),
+            "prescore": prescore,
+            "triage": triage,
+        }
+    )
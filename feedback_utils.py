@@ -0,0 +1,212 @@
+"""Template-based feedback text for objective markings.
+
+A template holds pre-tokenised tip fragments whose word counts are
+computed once. Feedback is assembled by appending fragments while
+keeping a running word count, so the 40–60 word target never needs the
+text to be re-scanned or trimmed. Templates are chosen by level and
+reference format, and rendered text is cached by wrong-item set, which
+makes batch feedback for a class mostly cache hits.
+"""
+
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Sequence, Tuple
+
+_WORD = re.compile(r"\b[\wÄÖÜäöüß]+(?:'[A-Za-z]+)?\b")
+
+
+def count_words(s: str) -> int:
+    """Return the number of words in ``s``."""
+    return len(_WORD.findall(s or ""))
+
+
+class Fragment(NamedTuple):
+    """A piece of feedback text with its word count."""
+
+    text: str
+    words: int
+
+
+def _fragment(text: str) -> Fragment:
+    return Fragment(text, count_words(text))
+
+
+@dataclass(frozen=True)
+class FeedbackTemplate:
+    """Wording and length limits for one (level, format) combination.
+
+    ``opening`` and ``perfect`` may use ``{level}``, ``{correct}`` and
+    ``{total}``.
+    """
+
+    opening: str
+    tips: Tuple[str, ...]
+    items_lead: str = "Check these items: "
+    near_lead: str = "Mind the spelling of: "
+    perfect: str = "Every item is correct, so keep this routine."
+    min_words: int = 40
+    max_words: int = 60
+    max_items: int = 6
+    tip_fragments: Tuple[Fragment, ...] = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        object.__setattr__(self, "tip_fragments", tuple(_fragment(t) for t in self.tips))
+
+
+_OBJECTIVE_TIPS = (
+    "Slow down, read each stem fully, and match letters carefully.",
+    "Use umlauts (ä/ö/ü) and verify meaning before choosing.",
+    "Underline keywords, compare similar options, and double-check B/C confusions.",
+)
+
+TEMPLATES: Dict[Tuple[str, str], FeedbackTemplate] = {
+    ("", "objective"): FeedbackTemplate(
+        opening="Good effort for {level} objectives—you answered {correct} of {total} correctly.",
+        tips=_OBJECTIVE_TIPS,
+    ),
+    ("A2", "objective"): FeedbackTemplate(
+        opening="Solid A2 work—you answered {correct} of {total} correctly.",
+        tips=(
+            "Read the whole text once before answering, then look for the exact detail asked.",
+            "Watch word order after weil and dass, and check articles and umlauts (ä/ö/ü).",
+            "Compare similar options closely; times, numbers and negations are common traps.",
+        ),
+    ),
+    ("B1", "objective"): FeedbackTemplate(
+        opening="Good B1 work—you answered {correct} of {total} correctly.",
+        tips=(
+            "Separate what the text states from what it only suggests before choosing.",
+            "Look for paraphrases: the right option rarely repeats the words of the text.",
+            "Check connectors such as trotzdem, deshalb and obwohl, since they often decide the answer.",
+        ),
+    ),
+    ("", "essay"): FeedbackTemplate(
+        opening="Thank you for your {level} writing—this task scored {correct} of {total}.",
+        items_lead="Review these points: ",
+        perfect="Your text covers the task well.",
+        tips=(
+            "Answer every point of the task in its own short paragraph.",
+            "Check verb position, articles and umlauts (ä/ö/ü) before submitting.",
+            "Use connectors like und, aber, weil and dann to link your sentences.",
+        ),
+    ),
+}
+
+
+def select_template(level: str, fmt: str) -> FeedbackTemplate:
+    """Return the template for ``level`` and ``fmt``, falling back to the format default."""
+    level = (str(level or "").split() or [""])[0].upper()
+    fmt = str(fmt or "objective").strip().lower()
+    return (
+        TEMPLATES.get((level, fmt))
+        or TEMPLATES.get(("", fmt))
+        or TEMPLATES[("", "objective")]
+    )
+
+
+def _clip(text: str, limit: int) -> str:
+    """Return the first ``limit`` words of ``text`` (at least one), marked with "…" when cut."""
+    words = list(_WORD.finditer(text))
+    if len(words) <= limit:
+        return text
+    return text[: words[max(limit, 1) - 1].end()] + "…"
+
+
+def _entry(n: int, corr: str, stu: str, budget: int) -> Fragment:
+    """Return the item entry, shortening long answers to fit ``budget`` words."""
+    entry = _fragment(f"{n}→{corr} (you wrote {stu or '—'})")
+    if entry.words > budget:
+        stu = _clip(stu, budget - 3 - count_words(corr))
+        entry = _fragment(f"{n}→{corr} (you wrote {stu or '—'})")
+    if entry.words > budget:
+        entry = _fragment(f"{n}→{_clip(corr, budget - 4)} (you wrote {_clip(stu, 1) or '—'})")
+    return entry
+
+
+def _item_list(lead: str, items: Sequence[Tuple[int, str, str]], budget: int, clip: bool) -> Tuple[str, int]:
+    """Return ``lead`` plus the item entries that fit ``budget``, and the words used.
+
+    With ``clip`` the first entry is shortened to fit; otherwise the list is
+    left out (``""``) when not even one entry fits.
+    """
+    budget -= count_words(lead)
+    entries: List[Fragment] = []
+    for n, corr, stu in items:
+        if clip and not entries:
+            entry = _entry(n, corr, stu, budget)
+        else:
+            entry = _fragment(f"{n}→{corr} (you wrote {stu or '—'})")
+        if entry.words > budget:
+            break
+        entries.append(entry)
+        budget -= entry.words
+    if not entries:
+        return "", 0
+    return lead + ", ".join(e.text for e in entries) + ".", count_words(lead) + sum(e.words for e in entries)
+
+
+@lru_cache(maxsize=8192)
+def _render(
+    template: FeedbackTemplate,
+    level: str,
+    correct: int,
+    total: int,
+    wrong: Tuple[Tuple[int, str, str], ...],
+    near: Tuple[Tuple[int, str, str], ...] = (),
+) -> str:
+    values = {"level": level, "correct": correct, "total": total}
+    opening = _fragment(" ".join(template.opening.format(**values).split()))
+    parts: List[str] = [opening.text]
+    words = opening.words
+
+    if wrong:
+        text, used = _item_list(template.items_lead, wrong, template.max_words - words, clip=True)
+        parts.append(text)
+        words += used
+    elif template.perfect:
+        perfect = _fragment(" ".join(template.perfect.format(**values).split()))
+        parts.append(perfect.text)
+        words += perfect.words
+
+    if near:
+        text, used = _item_list(template.near_lead, near, template.max_words - words, clip=False)
+        if text:
+            parts.append(text)
+            words += used
+
+    tips = template.tip_fragments
+    for tip in tips + tips:
+        if words >= template.min_words:
+            break
+        if words + tip.words > template.max_words:
+            continue
+        parts.append(tip.text)
+        words += tip.words
+    return " ".join(parts)
+
+
+def render_feedback(
+    correct: int,
+    total: int,
+    wrong: Sequence[Tuple[int, str, str]],
+    level: str = "",
+    fmt: str = "objective",
+    near: Sequence[Tuple[int, str, str]] = (),
+) -> str:
+    """Return 40–60 words of feedback for a marking.
+
+    ``wrong`` and ``near`` (near misses accepted by tolerant marking) hold
+    ``(question, reference, student answer)`` triples. Results are cached,
+    so identical wrong-item sets at the same level and score are rendered
+    once.
+    """
+    template = select_template(level, fmt)
+    level = (str(level or "").split() or [""])[0].upper()
+
+    def shown(items: Sequence[Tuple[int, str, str]]) -> Tuple[Tuple[int, str, str], ...]:
+        return tuple((int(n), str(corr), str(stu or "")) for n, corr, stu in list(items)[: template.max_items])
+
+    return _render(template, level, int(correct), int(total), shown(wrong), shown(near))
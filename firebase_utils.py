@@ -2,6 +2,10 @@
 
 from __future__ import annotations
 
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, List
+
+import pandas as pd
 import firebase_admin
 from firebase_admin import credentials, firestore
 import streamlit as st
@@ -186,3 +190,71 @@ def load_student_draft(level: str, student_code: str) -> dict | None:
         return {}
     return None
 
+
+def count_documents(query) -> int:
+    """Return the number of documents matching ``query``.
+
+    Runs a server-side ``count()`` aggregation, so no documents are
+    downloaded.
+    """
+
+    result = query.count(alias="n").get()
+    return int(result[0][0].value)
+
+
+def submission_counts(
+    db,
+    levels: Iterable[str],
+    statuses: Iterable[str] = (),
+    status_field: str = "status",
+    collection: str = "submissions",
+) -> pd.DataFrame:
+    """Count submissions per level and status with aggregation queries.
+
+    Parameters
+    ----------
+    db:
+        Firestore client.
+    levels:
+        Values of the ``level`` field to report.
+    statuses:
+        Values of ``status_field`` to break each level down by; documents
+        with any other status are counted under ``other``.
+    collection:
+        Collection holding the flat submission documents.
+
+    Returns
+    -------
+    pandas.DataFrame
+        One row per level plus an ``All`` row, with a ``total`` column, one
+        column per status and ``other``. Every column of the ``All`` row is
+        the sum over the listed levels, so documents of other levels are
+        not counted anywhere.
+    """
+
+    levels = list(dict.fromkeys(str(lvl).strip() for lvl in levels if str(lvl).strip()))
+    statuses = list(dict.fromkeys(statuses))
+    base = db.collection(collection)
+
+    queries: List = []
+    for level in levels:
+        by_level = base.where("level", "==", level)
+        queries.append(by_level)
+        queries.extend(by_level.where(status_field, "==", status) for status in statuses)
+
+    # Each aggregation is a separate round trip; run them side by side.
+    with ThreadPoolExecutor(max_workers=max(1, min(8, len(queries)))) as pool:
+        counts = iter(list(pool.map(count_documents, queries)))
+
+    rows = []
+    for level in levels:
+        row: dict = {"level": level, "total": next(counts)}
+        row.update({status: next(counts) for status in statuses})
+        row["other"] = row["total"] - sum(row[status] for status in statuses)
+        rows.append(row)
+
+    columns = ["level", "total", *statuses, "other"]
+    frame = pd.DataFrame(rows, columns=columns)
+    summary: dict = {"level": "All"}
+    summary.update({col: int(frame[col].sum()) for col in columns[1:]})
+    return pd.concat([frame, pd.DataFrame([summary], columns=columns)], ignore_index=True)
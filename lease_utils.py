@@ -0,0 +1,187 @@
+"""Leases that keep concurrent markers off each other's submissions.
+
+A marker claims a submission before opening it; the claim succeeds only if
+nobody else holds an unexpired lease on it, and the check-and-set runs in a
+single transaction. Leases expire after ``ttl`` seconds unless renewed, so a
+closed browser tab frees its submission again.
+
+A lease owner (:func:`lease_owner`) is the marker's name plus a token kept
+by their browser: a reload keeps the marker's own leases, while two markers
+who typed the same name still hold separate ones.
+
+Two backends share the same interface:
+
+:class:`FirestoreLeaseStore`
+    Firestore transactions; coordinates markers across machines.
+:class:`LocalLeaseStore`
+    SQLite with ``BEGIN IMMEDIATE``; coordinates the sessions and processes
+    of one server, and stands in when Firestore is not configured.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from firebase_admin import firestore
+
+DEFAULT_TTL = 15 * 60
+
+Holder = Tuple[str, float]  # (owner, expires_at)
+
+_OWNER_SEP = "#"
+
+
+def lease_owner(name: str, token: str) -> str:
+    """Return the owner id of marker ``name`` in the browser holding ``token``."""
+    return f"{str(name or '').strip() or 'marker'}{_OWNER_SEP}{token}"
+
+
+def owner_name(owner: str) -> str:
+    """Return the marker name part of an owner id (for display)."""
+    return owner.rsplit(_OWNER_SEP, 1)[0]
+
+
+class LeaseStore(ABC):
+    """Interface of the lease backends."""
+
+    @abstractmethod
+    def _update(self, item: str, owner: str, ttl: float, renew_only: bool) -> bool:
+        """Set ``owner``'s lease on ``item`` in one transaction; ``False`` if refused."""
+
+    @abstractmethod
+    def release(self, item: str, owner: str) -> None:
+        """Drop ``owner``'s lease on ``item`` (no-op if someone else holds it)."""
+
+    @abstractmethod
+    def holders(self, items: Iterable[str]) -> Dict[str, Holder]:
+        """Return the unexpired leases among ``items``."""
+
+    def claim(self, item: str, owner: str, ttl: float = DEFAULT_TTL) -> bool:
+        """Lease ``item`` to ``owner`` unless another owner holds it."""
+        return self._update(item, owner, ttl, renew_only=False)
+
+    def renew(self, item: str, owner: str, ttl: float = DEFAULT_TTL) -> bool:
+        """Extend ``owner``'s lease on ``item``; ``False`` if it was lost."""
+        return self._update(item, owner, ttl, renew_only=True)
+
+    def claim_next(self, items: Iterable[str], owner: str, ttl: float = DEFAULT_TTL) -> Optional[str]:
+        """Claim the first free item of ``items`` and return it."""
+        for item in items:
+            if self.claim(item, owner, ttl):
+                return item
+        return None
+
+
+class LocalLeaseStore(LeaseStore):
+    """SQLite-backed leases for markers sharing one server."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=10)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS leases (
+                    item TEXT PRIMARY KEY,
+                    owner TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+                """
+            )
+
+    def _update(self, item: str, owner: str, ttl: float, renew_only: bool) -> bool:
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute("SELECT owner, expires_at FROM leases WHERE item = ?", (item,)).fetchone()
+                held_by_other = row is not None and row[0] != owner and row[1] > now
+                if held_by_other or (renew_only and (row is None or row[0] != owner)):
+                    self._conn.execute("ROLLBACK")
+                    return False
+                self._conn.execute("INSERT OR REPLACE INTO leases VALUES (?, ?, ?)", (item, owner, now + ttl))
+                self._conn.execute("COMMIT")
+                return True
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def release(self, item: str, owner: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM leases WHERE item = ? AND owner = ?", (item, owner))
+
+    def holders(self, items: Iterable[str]) -> Dict[str, Holder]:
+        wanted = list(dict.fromkeys(items))
+        found: Dict[str, Holder] = {}
+        now = time.time()
+        with self._lock:
+            for start in range(0, len(wanted), 500):
+                chunk = wanted[start:start + 500]
+                marks = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT item, owner, expires_at FROM leases WHERE expires_at > ? AND item IN ({marks})",
+                    [now, *chunk],
+                ).fetchall()
+                found.update({item: (owner, expires) for item, owner, expires in rows})
+        return found
+
+
+class FirestoreLeaseStore(LeaseStore):
+    """Leases stored in a Firestore collection, updated in transactions.
+
+    Document ids are hashes of the submission path, as paths contain
+    slashes.
+    """
+
+    def __init__(self, db, collection: str = "marking_leases") -> None:
+        self.db = db
+        self.collection = collection
+
+    def _ref(self, item: str):
+        doc_id = hashlib.sha1(item.encode("utf-8")).hexdigest()
+        return self.db.collection(self.collection).document(doc_id)
+
+    def _update(self, item: str, owner: str, ttl: float, renew_only: bool) -> bool:
+        return _set_lease(self.db.transaction(), self._ref(item), item, owner, ttl, renew_only)
+
+    def release(self, item: str, owner: str) -> None:
+        _drop_lease(self.db.transaction(), self._ref(item), owner)
+
+    def holders(self, items: Iterable[str]) -> Dict[str, Holder]:
+        items = list(dict.fromkeys(items))
+        if not items:
+            return {}
+        now = time.time()
+        found: Dict[str, Holder] = {}
+        refs: List = [self._ref(item) for item in items]
+        for snap in self.db.get_all(refs):
+            data = (snap.to_dict() or {}) if snap.exists else {}
+            if data and float(data.get("expires_at", 0)) > now:
+                found[data.get("item", "")] = (data.get("owner", ""), float(data["expires_at"]))
+        return found
+
+
+@firestore.transactional
+def _set_lease(transaction, ref, item: str, owner: str, ttl: float, renew_only: bool) -> bool:
+    now = time.time()
+    snap = ref.get(transaction=transaction)
+    data = (snap.to_dict() or {}) if snap.exists else {}
+    held_by_other = bool(data) and data.get("owner") != owner and float(data.get("expires_at", 0)) > now
+    if held_by_other or (renew_only and data.get("owner") != owner):
+        return False
+    transaction.set(ref, {"item": item, "owner": owner, "expires_at": now + ttl})
+    return True
+
+
+@firestore.transactional
+def _drop_lease(transaction, ref, owner: str) -> None:
+    snap = ref.get(transaction=transaction)
+    if snap.exists and (snap.to_dict() or {}).get("owner") == owner:
+        transaction.delete(ref)
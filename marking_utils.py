@@ -0,0 +1,492 @@
+"""Objective answer parsing and marking helpers.
+
+These functions are shared by the dashboard and batch jobs; none of them
+touch Streamlit, so they can be imported outside ``streamlit run``.
+"""
+
+from __future__ import annotations
+
+import re
+import threading
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from feedback_utils import render_feedback
+from rules_utils import AnswerRule, answer_key, compile_rule, rule_source_from_json
+from text_utils import natural_key
+
+
+def build_reference_text_from_json(
+    row_obj: Dict[str, Any]
+) -> Tuple[str, str, str, Dict[int, str]]:
+    """Return reference text, link, format and raw answers from JSON row."""
+    answers: Dict[str, Any] = row_obj.get("answers") or {
+        k: v for k, v in row_obj.items() if k.lower().startswith("answer")
+    }
+
+    def n_from(k: str) -> int:
+        m = re.search(r"(\d+)", k)
+        return int(m.group(1)) if m else 0
+
+    chunks: List[str] = []
+    answers_map: Dict[int, str] = {}
+
+    if isinstance(answers, dict):
+        part_keys = [k for k in answers if k.lower().startswith("teil")]
+        if part_keys:
+            idx = 1
+            for part_key in sorted(part_keys, key=natural_key):
+                part = answers.get(part_key) or {}
+                if part:
+                    chunks.append(part_key.replace("teil", "Teil "))
+                    ordered = sorted(part.items(), key=lambda kv: n_from(kv[0]))
+                    for k, v in ordered:
+                        v = rule_source_from_json(v)
+                        if v and v.lower() not in ("nan", "none"):
+                            chunks.append(f"{idx}. {v}")
+                            answers_map[idx] = v
+                            idx += 1
+        else:
+            ordered = sorted(answers.items(), key=lambda kv: n_from(kv[0]))
+            for k, v in ordered:
+                v = rule_source_from_json(v)
+                if v and v.lower() not in ("nan", "none"):
+                    idx = n_from(k)
+                    chunks.append(f"{idx}. {v}")
+                    answers_map[idx] = v
+
+    fmt = str(row_obj.get("format", "essay")).strip().lower() or "essay"
+    return (
+        "\n".join(chunks) if chunks else "No reference answers found.",
+        str(row_obj.get("answer_url", "")).strip(),
+        fmt,
+        answers_map,
+    )
+
+
+# ---------- PRE-NORMALIZER: turn "Teil 3/4" local numbers into global 1..N ----------
+
+def globalize_objective_numbers(student_text: str) -> str:
+    """
+    Reads a student's mixed submission (may contain 'Teil 3', 'Teil 4', essays, etc.),
+    extracts objective answers, and rewrites them to GLOBAL numbering (1..N).
+    Output is one-per-line: '1. B', '2. A', ...
+    """
+    if not student_text:
+        return ""
+
+    def parse_pairs_freeform_with_teil_offsets(text: str) -> Dict[int, str]:
+        res: Dict[int, str] = {}
+        offset = 0
+
+        for raw_line in text.splitlines():
+            line = raw_line.strip()
+
+            if re.search(r"^\s*teil\s*\d+\s*$", line, flags=re.I):
+                offset = max(res.keys() or [0])
+                continue
+
+            m = re.match(r"\s*(?:q\s*)?(\d+)\s*[\\.\):=\-]?\s*(.+?)\s*$", line, flags=re.I)
+            if m:
+                local_n = int(m.group(1))
+                token = m.group(2).strip().strip("()[]{}.:=,;")
+                gnum = local_n + offset if offset else local_n
+                res.setdefault(gnum, token)
+                continue
+
+            anchors = list(re.finditer(r"(?i)(?:q\s*)?(\d+)\s*[\\.\):=\-]*\s*", line))
+            for i, am in enumerate(anchors):
+                local_n = int(am.group(1))
+                start = am.end()
+                end = anchors[i + 1].start() if i + 1 < len(anchors) else len(line)
+                chunk = line[start:end].strip()
+                if not chunk:
+                    continue
+                token = re.split(r"[,\|\n;/\t ]+", chunk, maxsplit=1)[0].strip("()[]{}.:=")
+                if token:
+                    gnum = local_n + offset if offset else local_n
+                    res.setdefault(gnum, token)
+
+        return res
+
+    pairs = parse_pairs_freeform_with_teil_offsets(student_text)
+    if not pairs:
+        return ""
+
+    lines = [f"{k}. {v}" for k, v in sorted(pairs.items())]
+    return "\n".join(lines)
+
+
+# ===================== AI MARKING (OBJECTIVES ONLY, WITH GLOBALIZATION) =====================
+
+def _parse_ref_map(ref_text: str) -> Dict[int, str]:
+    m: Dict[int, str] = {}
+    for line in (ref_text or "").splitlines():
+        hit = re.match(r"\s*(\d+)\s*[\.\)-]?\s*(.+)$", line)
+        if hit:
+            n = int(hit.group(1))
+            tok = hit.group(2).strip()
+            m[n] = tok
+    return m
+
+
+def _parse_student_global_map(student_text: str) -> Dict[int, str]:
+    g = globalize_objective_numbers(student_text or "")
+    out: Dict[int, str] = {}
+    for line in g.splitlines():
+        hit = re.match(r"\s*(\d+)\s*[\.\)-]?\s*(.+)$", line)
+        if hit:
+            out[int(hit.group(1))] = hit.group(2).strip()
+    return out
+
+
+def _compute_objective_diffs(student_text: str, ref_text: str) -> Tuple[int, int, List[Tuple[int, str, str]]]:
+    ref_map = _parse_ref_map(ref_text)
+    stu_map = _parse_student_global_map(student_text)
+    total = len(ref_map) or 1
+    wrong: List[Tuple[int, str, str]] = []
+    correct = 0
+    for n in sorted(ref_map.keys()):
+        ref_tok = ref_map[n]
+        stu_tok_raw = stu_map.get(n, "")
+        if compile_rule(ref_tok).matches(answer_key(stu_tok_raw)):
+            correct += 1
+        else:
+            wrong.append((n, ref_tok, stu_tok_raw))
+    return correct, total, wrong
+
+
+# ===================== LOCAL MARKING (OBJECTIVES ONLY) =====================
+
+def _parse_marking_pairs(text: str) -> Dict[int, str]:
+    """Parse "Qn -> answer" pairs as :func:`objective_mark` reads them.
+
+    ``Teil`` headings shift the local numbering of the following section,
+    and only the first answer of an unparseable line is kept.
+    """
+    res: Dict[int, str] = {}
+    offset = 0
+    lines = text.splitlines()
+
+    for line in lines:
+        if re.search(r"^\s*teil\s*\d+\s*$", line, flags=re.I):
+            offset = max(res.keys() or [0])
+            continue
+
+        m = re.match(r"\s*(?:q\s*)?(\d+)\s*[\\.\):=\-]?\s*(.+?)\s*$", line, flags=re.I)
+        if m:
+            local_n = int(m.group(1))
+            token = m.group(2).strip().strip("()[]{}.:=,;")
+            gnum = local_n + offset if offset else local_n
+            res.setdefault(gnum, token)
+            continue
+
+        for m in re.finditer(r"(?i)(?:q\s*)?(\d+)\s*[\\.\):=\-]*\s*", line):
+            local_n = int(m.group(1))
+            tail = line[m.end():].strip()
+            token = re.split(r"[,\|\n;/\t ]+", tail, maxsplit=1)[0].strip("()[]{}.:=")
+            if token:
+                gnum = local_n + offset if offset else local_n
+                res.setdefault(gnum, token)
+                break
+    return res
+
+
+def objective_mark(student_answer: str, ref_answers: Dict[int, str]) -> Tuple[int, str]:
+    """
+    Robust objective marking without AI.
+    - Parses messy "Qn -> answer" formats with Teil section offsets.
+    - Normalizes umlauts/ß to ASCII equivalents for comparison.
+    - Accepts synonyms for True/False and Ja/Nein.
+    """
+
+    ref_rules: Dict[int, AnswerRule] = {int(idx): compile_rule(str(ans)) for idx, ans in (ref_answers or {}).items()}
+
+    stu_raw = _parse_marking_pairs(student_answer or "")
+    stu_keys: Dict[int, str] = {qn: answer_key(tok) for qn, tok in stu_raw.items()}
+
+    total = len(ref_rules) or 1
+    correct = 0
+    wrong_bits: List[str] = []
+
+    for idx in sorted(ref_rules.keys()):
+        ok = ref_rules[idx].matches(stu_keys.get(idx, ""))
+        if ok:
+            correct += 1
+        else:
+            stu_disp = stu_raw.get(idx, "") or "—"
+            wrong_bits.append(f"{idx}→{ref_answers.get(idx, '')} (you wrote {stu_disp})")
+
+    score = int(round(100 * correct / total))
+    return score, _objective_feedback(wrong_bits)
+
+
+def _objective_feedback(wrong_bits: List[str], near_bits: Optional[List[str]] = None) -> str:
+    spelling = (
+        " Mind the spelling of: " + ", ".join(near_bits) + "."
+        if near_bits
+        else ""
+    )
+    if not wrong_bits:
+        return ("Great job — all correct!" if not near_bits else "Great job — nearly perfect!") + spelling
+    return (
+        "Keep going. Check these: "
+        + ", ".join(wrong_bits)
+        + ". Tip: match section numbering (Teil), read each stem carefully, and watch umlauts (ä/ö/ü)."
+        + spelling
+    )
+
+
+# ===================== CLASS-WIDE MARKING (VECTORIZED) =====================
+
+# Bump whenever a parsing or matching change can alter a grade, so results
+# cached under the previous version are no longer reused.
+MARKING_VERSION = 4
+
+
+class CompiledKey:
+    """Answer key compiled for matrix grading.
+
+    Student answers are encoded as integer codes over a shared vocabulary
+    of :func:`rules_utils.answer_key` values. Whether a code satisfies a
+    question's :class:`rules_utils.AnswerRule` is evaluated once per
+    (question, code) pair and kept in a boolean table, so grading a class is
+    a table lookup over the answer matrix. Near misses (see
+    :meth:`rules_utils.AnswerRule.near`) are tabulated the same way. Use
+    :func:`compile_key` to get the shared instance for a key version.
+
+    The instance is shared and long-lived, so :meth:`trim` drops the
+    vocabulary and tables once they hold more than ``max_tokens`` answers.
+    """
+
+    max_tokens = 20000
+
+    def __init__(self, ref_answers: Dict[int, str]) -> None:
+        items = sorted((int(n), str(ans)) for n, ans in (ref_answers or {}).items())
+        self.questions = np.array([n for n, _ in items], dtype=np.int32)
+        self.reference = [ans for _, ans in items]
+        self.rules = [compile_rule(ans) for ans in self.reference]
+        self.lock = threading.Lock()
+        self._reset()
+
+    def _reset(self) -> None:
+        n = len(self.reference)
+        self.vocab: Dict[str, int] = {}
+        self.tokens: List[str] = []
+        self._accept = np.zeros((n, 64), dtype=bool)
+        self._known = np.zeros((n, 64), dtype=bool)
+        self._near = np.zeros((n, 64), dtype=bool)
+        self._near_known = np.zeros((n, 64), dtype=bool)
+        self.codes = np.array([self.encode(answer_key(ans)) for ans in self.reference], dtype=np.int32)
+
+    def trim(self) -> None:
+        """Start a fresh vocabulary if the current one outgrew ``max_tokens``.
+
+        Codes from before the trim become invalid, so call it (holding
+        :attr:`lock`) only before encoding a new batch of answers.
+        """
+        if len(self.tokens) > self.max_tokens:
+            self._reset()
+
+    def encode(self, token: str) -> int:
+        """Return the code of an answer-key ``token`` (``-1`` for blanks)."""
+        if not token:
+            return -1
+        code = self.vocab.get(token)
+        if code is None:
+            code = self.vocab[token] = len(self.tokens)
+            self.tokens.append(token)
+        return code
+
+    def _lookup(self, answers: np.ndarray, values: str, known: str, evaluate) -> np.ndarray:
+        width = getattr(self, values).shape[1]
+        if len(self.tokens) > width:
+            width = max(len(self.tokens), width * 2)
+            for name in ("_accept", "_known", "_near", "_near_known"):
+                table = getattr(self, name)
+                setattr(self, name, np.pad(table, ((0, 0), (0, width - table.shape[1]))))
+        table, seen = getattr(self, values), getattr(self, known)
+
+        filled = answers >= 0
+        q_idx = np.broadcast_to(np.arange(answers.shape[1]), answers.shape)[filled]
+        codes = answers[filled]
+        unknown = ~seen[q_idx, codes]
+        for q, c in set(zip(q_idx[unknown].tolist(), codes[unknown].tolist())):
+            table[q, c] = evaluate(self.rules[q], self.tokens[c])
+            seen[q, c] = True
+
+        out = np.zeros(answers.shape, dtype=bool)
+        out[filled] = table[q_idx, codes]
+        return out
+
+    def correct_matrix(self, answers: np.ndarray) -> np.ndarray:
+        """Return which cells of a (students × questions) code matrix are correct."""
+        return self._lookup(answers, "_accept", "_known", AnswerRule.matches)
+
+    def near_matrix(self, answers: np.ndarray) -> np.ndarray:
+        """Return which cells are near misses of the accepted text.
+
+        Only meaningful for cells that are not correct; combine with
+        :meth:`correct_matrix`.
+        """
+        return self._lookup(answers, "_near", "_near_known", AnswerRule.near)
+
+
+@lru_cache(maxsize=256)
+def _compile_key(items: Tuple[Tuple[int, str], ...]) -> CompiledKey:
+    return CompiledKey(dict(items))
+
+
+def compile_key(ref_answers: Dict[int, str]) -> CompiledKey:
+    """Return the compiled key for ``ref_answers`` (compiled once per version)."""
+    return _compile_key(tuple(sorted((int(n), str(a)) for n, a in (ref_answers or {}).items())))
+
+
+class ClassGrade:
+    """Results of marking many submissions against one :class:`CompiledKey`.
+
+    With ``tolerant`` an answer that is not accepted but lies within the typo
+    budget of an accepted text (:meth:`rules_utils.AnswerRule.near`) earns
+    the point and is reported as a near miss instead of as wrong.
+    """
+
+    def __init__(
+        self,
+        key: CompiledKey,
+        answers: np.ndarray,
+        raw: List[Dict[int, str]],
+        correct: Optional[np.ndarray] = None,
+        tolerant: bool = False,
+    ) -> None:
+        self.key = key
+        self.answers = answers  # students × questions, -1 = blank
+        self.tokens = key.tokens  # the vocabulary the codes refer to, kept across a trim
+        self.raw = raw
+        self.tolerant = tolerant
+        self.exact = key.correct_matrix(answers) if correct is None else correct
+        if tolerant:
+            self.near = key.near_matrix(answers) & ~self.exact
+        else:
+            self.near = np.zeros(answers.shape, dtype=bool)
+        self.correct = self.exact | self.near
+        total = len(key.questions) or 1
+        self.scores = np.rint(100 * self.correct.sum(axis=1) / total).astype(int)
+
+    def wrong_items(self, i: int) -> List[int]:
+        """Return the question numbers student ``i`` got wrong."""
+        return self.key.questions[~self.correct[i]].tolist()
+
+    def near_items(self, i: int) -> List[int]:
+        """Return the question numbers student ``i`` answered with a near miss."""
+        return self.key.questions[self.near[i]].tolist()
+
+    def wrong_answers(self, i: int) -> List[Tuple[int, str, str]]:
+        """Return ``(question, reference, student answer)`` for each item not matched exactly.
+
+        Near misses are included, so the list is enough to rebuild the grade
+        with :func:`grade_from_wrong_answers`.
+        """
+        ref = dict(zip(self.key.questions.tolist(), self.key.reference))
+        return [(n, ref[n], self.raw[i].get(n, "")) for n in self.key.questions[~self.exact[i]].tolist()]
+
+    def feedback(self, i: int) -> str:
+        """Return the same feedback text :func:`objective_mark` would give.
+
+        Near misses, if any, are listed after the wrong items.
+        """
+        ref = dict(zip(self.key.questions.tolist(), self.key.reference))
+        bits = [f"{n}→{ref[n]} (you wrote {self.raw[i].get(n, '') or '—'})" for n in self.wrong_items(i)]
+        near = [f"{n}→{ref[n]} (you wrote {self.raw[i].get(n, '')})" for n in self.near_items(i)]
+        return _objective_feedback(bits, near)
+
+    def summary_feedback(self, i: int, level: str = "", fmt: str = "objective") -> str:
+        """Return 40–60 words of templated feedback (see :func:`feedback_utils.render_feedback`)."""
+        ref = dict(zip(self.key.questions.tolist(), self.key.reference))
+        wrong = [(n, ref[n], self.raw[i].get(n, "")) for n in self.wrong_items(i)]
+        near = [(n, ref[n], self.raw[i].get(n, "")) for n in self.near_items(i)]
+        return render_feedback(
+            int(self.correct[i].sum()), len(self.key.questions), wrong, level=level, fmt=fmt, near=near
+        )
+
+    def question_stats(self) -> pd.DataFrame:
+        """Return percent correct, blanks and the most common wrong answer per question."""
+        n_students, n_questions = self.answers.shape
+        vocab_size = max(len(self.tokens), 1)
+        wrong = ~self.correct & (self.answers >= 0)
+        q_idx = np.nonzero(wrong)[1]
+        counts = np.bincount(
+            q_idx * vocab_size + self.answers[wrong], minlength=n_questions * vocab_size
+        ).reshape(n_questions, vocab_size)
+        top = counts.argmax(axis=1)
+        tokens = np.array([t.lstrip("@") for t in self.tokens] or [""], dtype=object)
+        denom = max(n_students, 1)
+        return pd.DataFrame(
+            {
+                "question": self.key.questions,
+                "pct_correct": (100 * self.correct.sum(axis=0) / denom).round(1),
+                "pct_blank": (100 * (self.answers < 0).sum(axis=0) / denom).round(1),
+                "pct_near": (100 * self.near.sum(axis=0) / denom).round(1),
+                "top_wrong": np.where(counts.max(axis=1) > 0, tokens[top], ""),
+                "top_wrong_count": counts.max(axis=1),
+            }
+        )
+
+
+def grade_class(texts: List[str], ref_answers: Dict[int, str], tolerant: bool = False) -> ClassGrade:
+    """Mark every submission in ``texts`` against ``ref_answers`` at once.
+
+    Parsing stays per submission, but the comparison, scores, wrong items and
+    per-question statistics come from whole-matrix NumPy operations. Without
+    ``tolerant`` scores match :func:`objective_mark`.
+    """
+    return grade_answers([_parse_marking_pairs(text or "") for text in texts], ref_answers, tolerant)
+
+
+def grade_answers(raw: List[Dict[int, str]], ref_answers: Dict[int, str], tolerant: bool = False) -> ClassGrade:
+    """Mark already parsed ``{question: answer}`` maps against ``ref_answers``.
+
+    Used to re-mark stored answers under a corrected key without the
+    original submissions.
+    """
+    key = compile_key(ref_answers)
+    column = {int(n): j for j, n in enumerate(key.questions.tolist())}
+    with key.lock:
+        key.trim()
+        answers = np.full((len(raw), len(column)), -1, dtype=np.int32)
+        for i, pairs in enumerate(raw):
+            for n, tok in pairs.items():
+                j = column.get(int(n))
+                if j is not None:
+                    answers[i, j] = key.encode(answer_key(tok))
+        return ClassGrade(key, answers, raw, tolerant=tolerant)
+
+
+def grade_from_wrong_answers(
+    ref_answers: Dict[int, str], wrong_lists: List[List[Tuple[int, str, str]]], tolerant: bool = False
+) -> ClassGrade:
+    """Rebuild a :class:`ClassGrade` from stored wrong-answer lists.
+
+    Every question not listed as wrong is taken as answered correctly, which
+    is enough to recompute scores, feedback and per-question statistics from
+    cached results without the original submissions.
+    """
+    key = compile_key(ref_answers)
+    column = {int(n): j for j, n in enumerate(key.questions.tolist())}
+    with key.lock:
+        key.trim()
+        answers = np.tile(key.codes, (len(wrong_lists), 1))
+        correct = np.ones(answers.shape, dtype=bool)
+        raw: List[Dict[int, str]] = []
+        for i, wrong in enumerate(wrong_lists):
+            pairs: Dict[int, str] = {}
+            for n, _, stu in wrong:
+                j = column.get(int(n))
+                if j is not None:
+                    pairs[int(n)] = stu
+                    answers[i, j] = key.encode(answer_key(stu))
+                    correct[i, j] = False
+            raw.append(pairs)
+        return ClassGrade(key, answers, raw, correct=correct, tolerant=tolerant)
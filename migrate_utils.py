@@ -0,0 +1,261 @@
+"""Migrate submissions into the single flat camelCase layout.
+
+Submissions live in four layouts:
+
+* ``submissions/{level}/{studentCode}/{id}`` (old nested layout),
+* ``submissions/{level}/posts/{id}`` (old posts layout),
+* ``submissions/{id}`` with snake_case fields (``student_code`` …),
+* ``submissions/{id}`` with camelCase fields (the current layout).
+
+Every document is rewritten into the last one with canonical
+``studentCode``/``studentName``/``level``/``chapter``/``assignment`` fields,
+a ``preview`` of the text for listings and an integer ``_ts_ms`` timestamp, so one indexed query
+(``studentCode``, ``level``, ``_ts_ms``) finds a student's submissions.
+Nested and posts documents are copied to ``submissions/{id}`` under an id
+derived from their old path, so re-running the migration overwrites instead
+of duplicating; ``--delete-source`` removes the originals. Student drafts
+(``draftv2``) are left alone.
+
+Writes go out in batches, one per page of source documents, and the last
+migrated document id of every source collection is stored in the
+checkpoint file after each batch, so an interrupted run resumes where it
+stopped. ``--dry-run`` reads everything and reports what would change.
+
+Usage::
+
+    python migrate_utils.py --dry-run
+    python migrate_utils.py --checkpoint migration_checkpoint.json --delete-source
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import re
+from collections import Counter
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import pandas as pd
+
+from submission_utils import PREVIEW_FIELD, TEXT_FIELDS, Submission, make_preview
+
+# snake_case aliases replaced by the canonical camelCase fields.
+SNAKE_ALIASES = frozenset(
+    {"student_code", "studentcode", "student_name", "student_level", "level_key", "chapter_name", "assignment_name"}
+)
+# Firestore allows 500 writes per batch; moved documents take two (set + delete).
+MAX_BATCH_DOCS = 250
+SKIPPED_COLLECTIONS = frozenset({"draftv2"})
+
+_LEVEL_ID = re.compile(r"^[abc][12]$", re.IGNORECASE)
+
+
+def target_id(source_path: str) -> str:
+    """Return the flat document id for a nested or posts document."""
+    return hashlib.sha1(source_path.encode("utf-8")).hexdigest()[:20]
+
+
+def canonical_submission(doc: Dict[str, Any], doc_id: str, level: str = "", student_code: str = "") -> Dict[str, Any]:
+    """Return ``doc`` in the flat camelCase layout.
+
+    ``level`` and ``student_code`` fill in what nested layouts keep in the
+    path. Unknown fields are kept; snake_case aliases are dropped. A
+    ``preview`` of the text is added for listings that leave out the body.
+    """
+    sub = Submission(doc, doc_id, fallback_level=level)
+    out = {k: v for k, v in doc.items() if k not in SNAKE_ALIASES}
+    out["studentCode"] = str(sub.student_code or student_code).strip()
+    out["level"] = str(sub.level).strip()
+    for field, value in (("studentName", sub.student_name), ("chapter", sub.chapter), ("assignment", sub.assignment)):
+        if value not in (None, ""):
+            out[field] = value
+    out["_ts_ms"] = sub.ts_ms
+    if not out.get(PREVIEW_FIELD) and any(doc.get(k) for k in TEXT_FIELDS):
+        out[PREVIEW_FIELD] = make_preview(sub.text)
+    return out
+
+
+class MigrationReport:
+    """Counts of documents per source kind and outcome."""
+
+    def __init__(self) -> None:
+        self.counts: Counter = Counter()
+        self.examples: Dict[Tuple[str, str], Tuple[str, str]] = {}
+
+    def add(self, kind: str, outcome: str, source: str = "", target: str = "") -> None:
+        self.counts[(kind, outcome)] += 1
+        self.examples.setdefault((kind, outcome), (source, target))
+
+    def to_frame(self) -> pd.DataFrame:
+        rows = [
+            {"kind": kind, "outcome": outcome, "documents": n, "example": " -> ".join(filter(None, self.examples[(kind, outcome)]))}
+            for (kind, outcome), n in sorted(self.counts.items())
+        ]
+        return pd.DataFrame(rows, columns=["kind", "outcome", "documents", "example"])
+
+
+class Checkpoint:
+    """Per-collection progress stored as JSON (written atomically)."""
+
+    def __init__(self, path: Optional[str]) -> None:
+        self.path = path
+        self.cursors: Dict[str, str] = {}
+        self.done: List[str] = []
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            self.cursors = dict(state.get("cursors", {}))
+            self.done = list(state.get("done", []))
+
+    def save(self) -> None:
+        if not self.path:
+            return
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"cursors": self.cursors, "done": self.done}, f, indent=1)
+        os.replace(tmp, self.path)
+
+    def advance(self, collection: str, last_id: str) -> None:
+        self.cursors[collection] = last_id
+        self.save()
+
+    def finish(self, collection: str) -> None:
+        self.cursors.pop(collection, None)
+        if collection not in self.done:
+            self.done.append(collection)
+        self.save()
+
+
+def _pages(coll, start_after: str, page_size: int) -> Iterator[List[Any]]:
+    """Yield the documents of ``coll`` in id order, ``page_size`` at a time."""
+    last = start_after
+    while True:
+        query = coll.order_by("__name__").limit(page_size)
+        if last:
+            query = query.start_after({"__name__": last})
+        page = list(query.stream())
+        if not page:
+            return
+        yield page
+        last = page[-1].id
+
+
+def iter_sources(db, collection: str = "submissions", levels: Optional[Iterable[str]] = None) -> Iterator[Tuple[str, str, Any]]:
+    """Yield ``(kind, level, collection_ref)`` for every layout to migrate.
+
+    The flat collection comes first, then the per-level ``posts`` and
+    student collections. ``levels`` defaults to the level-like document ids
+    (``A1`` … ``C2``) under ``collection``.
+    """
+    root = db.collection(collection)
+    yield "flat", "", root
+    if levels is None:
+        level_refs = [ref for ref in root.list_documents() if _LEVEL_ID.match(ref.id)]
+    else:
+        level_refs = [root.document(level) for level in levels]
+    for level_ref in level_refs:
+        for sub in level_ref.collections():
+            if sub.id in SKIPPED_COLLECTIONS:
+                continue
+            yield ("posts" if sub.id == "posts" else "nested"), level_ref.id, sub
+
+
+def migrate(
+    db,
+    collection: str = "submissions",
+    levels: Optional[Iterable[str]] = None,
+    batch_size: int = 200,
+    checkpoint_path: Optional[str] = None,
+    dry_run: bool = False,
+    delete_source: bool = False,
+    log: Callable[[str], None] = print,
+) -> MigrationReport:
+    """Rewrite every submission into the flat camelCase layout.
+
+    Each page of ``batch_size`` source documents is written in one batch and
+    then recorded in the checkpoint. A dry run writes nothing, ignores the
+    checkpoint and only fills the report.
+    """
+    batch_size = max(1, min(batch_size, MAX_BATCH_DOCS))
+    checkpoint = Checkpoint(None if dry_run else checkpoint_path)
+    report = MigrationReport()
+    root = db.collection(collection)
+
+    for kind, level, coll in iter_sources(db, collection, levels):
+        coll_path = f"{collection}/{level}/{coll.id}" if level else collection
+        if coll_path in checkpoint.done:
+            continue
+        student_code = coll.id if kind == "nested" else ""
+        for page in _pages(coll, checkpoint.cursors.get(coll_path, ""), batch_size):
+            batch = db.batch()
+            writes = 0
+            for snap in page:
+                if kind == "flat" and _LEVEL_ID.match(snap.id):
+                    continue  # a level document holding nested collections
+                doc = snap.to_dict() or {}
+                source = snap.reference.path
+                canonical = canonical_submission(doc, snap.id, level, student_code)
+                if not canonical["studentCode"]:
+                    report.add(kind, "missing student code", source)
+                if not canonical["_ts_ms"]:
+                    report.add(kind, "missing timestamp", source)
+                if kind == "flat":
+                    if canonical == doc:
+                        report.add(kind, "unchanged", source)
+                        continue
+                    batch.set(snap.reference, canonical)
+                    writes += 1
+                    report.add(kind, "rewritten", source, source)
+                    continue
+                target = root.document(target_id(source))
+                canonical["_path"] = target.path
+                canonical["migratedFrom"] = source
+                batch.set(target, canonical)
+                writes += 1
+                report.add(kind, "moved", source, target.path)
+                if delete_source:
+                    batch.delete(snap.reference)
+                    writes += 1
+            if writes and not dry_run:
+                batch.commit()
+            checkpoint.advance(coll_path, page[-1].id)
+        checkpoint.finish(coll_path)
+        log(f"{coll_path}: done")
+    return report
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--collection", default="submissions", help="root submissions collection")
+    parser.add_argument("--levels", nargs="*", help="level documents to walk (default: A1 … C2 found)")
+    parser.add_argument("--batch-size", type=int, default=200, help=f"documents per write batch (max {MAX_BATCH_DOCS})")
+    parser.add_argument("--checkpoint", default="migration_checkpoint.json", help="progress file for resuming")
+    parser.add_argument("--delete-source", action="store_true", help="delete nested/posts originals after copying")
+    parser.add_argument("--dry-run", action="store_true", help="report what would change without writing")
+    args = parser.parse_args(argv)
+
+    from firebase_utils import get_firestore_client
+
+    db = get_firestore_client()
+    if db is None:
+        print("Firestore is not configured (add the firebase key to .streamlit/secrets.toml).")
+        return 1
+    report = migrate(
+        db,
+        collection=args.collection,
+        levels=args.levels,
+        batch_size=args.batch_size,
+        checkpoint_path=args.checkpoint,
+        dry_run=args.dry_run,
+        delete_source=args.delete_source,
+    )
+    print(report.to_frame().to_string(index=False))
+    if args.dry_run:
+        print("Dry run: nothing was written.")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
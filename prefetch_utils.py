@@ -0,0 +1,104 @@
+"""Load data ahead of time on background threads.
+
+The dashboard asks :class:`Prefetcher` for the current student's
+submissions and, in the same run, hands it the next few students of the
+roster. Those are fetched on a small thread pool while the marker works, so
+switching students usually finds the data already loaded. A request for a
+key that is still loading waits for that load instead of starting another.
+
+:func:`start_loads` fans independent page loads (roster, recent
+submissions, worklist, Scores sync) out to a pool at the top of a run; each section
+waits only for its own result, so a page costs the slowest load rather than
+their sum.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Generic, Hashable, Iterable, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class Prefetcher(Generic[T]):
+    """TTL cache in front of ``fetch`` with background prefetching.
+
+    Parameters
+    ----------
+    fetch:
+        Loader called with the key's items as positional arguments. It runs
+        on worker threads, so it must not touch Streamlit.
+    ttl:
+        Seconds a loaded value is served before it is fetched again.
+    workers:
+        Size of the background thread pool.
+    max_entries:
+        Loaded values kept; the oldest are dropped first.
+    """
+
+    def __init__(
+        self, fetch: Callable[..., T], ttl: float = 120, workers: int = 2, max_entries: int = 256
+    ) -> None:
+        self.fetch = fetch
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._values: Dict[Hashable, Tuple[float, T]] = {}
+        self._loading: Dict[Hashable, Future] = {}
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prefetch")
+        self._lock = threading.Lock()
+
+    def _fresh(self, key: Hashable) -> bool:
+        entry = self._values.get(key)
+        return entry is not None and time.time() - entry[0] < self.ttl
+
+    def _load(self, key: Tuple) -> T:
+        try:
+            value = self.fetch(*key)
+            with self._lock:
+                self._values[key] = (time.time(), value)
+                if len(self._values) > self.max_entries:
+                    oldest = min(self._values, key=lambda k: self._values[k][0])
+                    self._values.pop(oldest, None)
+            return value
+        finally:
+            with self._lock:
+                self._loading.pop(key, None)
+
+    def get(self, *key) -> T:
+        """Return the value for ``key``, waiting for an in-flight prefetch."""
+        with self._lock:
+            if self._fresh(key):
+                return self._values[key][1]
+            pending = self._loading.get(key)
+        if pending is not None:
+            return pending.result()
+        return self._load(key)
+
+    def prefetch(self, keys: Iterable[Tuple]) -> None:
+        """Start background loads for ``keys`` that are neither fresh nor loading."""
+        with self._lock:
+            for key in keys:
+                key = tuple(key)
+                if key in self._loading or self._fresh(key):
+                    continue
+                self._loading[key] = self._pool.submit(self._load, key)
+
+    def invalidate(self, *key) -> None:
+        """Forget ``key`` (or everything when no key is given)."""
+        with self._lock:
+            if key:
+                self._values.pop(key, None)
+            else:
+                self._values.clear()
+
+
+def start_loads(pool: ThreadPoolExecutor, loads: Dict[str, Callable[[], Any]]) -> Dict[str, Future]:
+    """Submit every loader in ``loads`` to ``pool`` and return their futures.
+
+    Loaders run without a Streamlit script context, so they must not call
+    Streamlit (cached functions included); resolve what they need first and
+    bind it into the loader.
+    """
+    return {name: pool.submit(fn) for name, fn in loads.items()}
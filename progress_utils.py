@@ -0,0 +1,164 @@
+"""Student × assignment progress matrices, one per level.
+
+Each level keeps a dense ``int16`` score array that grows by doubling, with
+dictionaries mapping student codes and assignments to row/column positions.
+Saving a score touches one cell; rendering a page slices a block of rows and
+reorders the columns by :func:`natural_key`. Scores rows name assignments by
+their raw labels (``"Lesen und Horen 5"``), so the board resolves them to
+answers-dictionary keys with the same resolver as the Scores mirror; each
+assignment then has one column however it was labelled.
+"""
+
+from __future__ import annotations
+
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from scores_utils import assignment_key, student_key
+from text_utils import natural_key
+
+MISSING = -1
+
+
+def _score_value(score: Any) -> int:
+    try:
+        return max(0, min(100, int(float(str(score).strip()))))
+    except (TypeError, ValueError):
+        return MISSING
+
+
+class ProgressMatrix:
+    """Latest score per student and assignment for a single level."""
+
+    def __init__(self, assignments: Iterable[str] = ()) -> None:
+        self.scores = np.full((16, 16), MISSING, dtype=np.int16)
+        self.students: List[Tuple[str, str]] = []  # (code, name) per row
+        self.assignments: List[str] = []  # display label per column
+        self._rows: Dict[str, int] = {}
+        self._cols: Dict[str, int] = {}
+        self._order: Optional[List[int]] = None
+        for name in assignments:
+            self.column(name)
+
+    def _grow(self, rows: int, cols: int) -> None:
+        cur_rows, cur_cols = self.scores.shape
+        if rows <= cur_rows and cols <= cur_cols:
+            return
+        new_rows = cur_rows if rows <= cur_rows else max(rows, cur_rows * 2)
+        new_cols = cur_cols if cols <= cur_cols else max(cols, cur_cols * 2)
+        new = np.full((new_rows, new_cols), MISSING, dtype=np.int16)
+        new[:cur_rows, :cur_cols] = self.scores
+        self.scores = new
+
+    def row(self, code: Any, name: str = "") -> int:
+        """Return the row of ``code``, adding the student when needed."""
+        key = student_key(code)
+        pos = self._rows.get(key)
+        if pos is None:
+            pos = len(self.students)
+            self._grow(pos + 1, len(self.assignments))
+            self._rows[key] = pos
+            self.students.append((str(code).strip(), name))
+        elif name and not self.students[pos][1]:
+            self.students[pos] = (self.students[pos][0], name)
+        return pos
+
+    def column(self, assignment: str) -> int:
+        """Return the column of ``assignment``, adding it when needed."""
+        key = assignment_key(assignment)
+        pos = self._cols.get(key)
+        if pos is None:
+            pos = len(self.assignments)
+            self._grow(len(self.students), pos + 1)
+            self._cols[key] = pos
+            self.assignments.append(str(assignment).strip())
+            self._order = None
+        return pos
+
+    def update(self, code: Any, name: str, assignment: str, score: Any) -> None:
+        """Set the latest score of ``code`` for ``assignment``."""
+        value = _score_value(score)
+        if not student_key(code) or not assignment_key(assignment) or value == MISSING:
+            return
+        r, c = self.row(code, name), self.column(assignment)  # may grow the array
+        self.scores[r, c] = value
+
+    def column_order(self) -> List[int]:
+        """Return column positions sorted by :func:`natural_key` of their labels."""
+        if self._order is None:
+            self._order = sorted(range(len(self.assignments)), key=lambda i: natural_key(self.assignments[i]))
+        return self._order
+
+    def page(self, page: int, page_size: int) -> pd.DataFrame:
+        """Return one page of students as a DataFrame (missing scores are blank)."""
+        start = max(page, 0) * page_size
+        stop = min(start + page_size, len(self.students))
+        order = self.column_order()
+        block = self.scores[start:stop][:, order].astype(float)
+        block[block == MISSING] = np.nan
+        df = pd.DataFrame(block, columns=[self.assignments[i] for i in order])
+        df.insert(0, "name", [name for _, name in self.students[start:stop]])
+        df.insert(0, "studentcode", [code for code, _ in self.students[start:stop]])
+        return df
+
+    def completion(self) -> float:
+        """Return the share of filled cells (0–1)."""
+        cells = len(self.students) * len(self.assignments)
+        if not cells:
+            return 0.0
+        used = self.scores[: len(self.students), : len(self.assignments)]
+        return float((used != MISSING).sum()) / cells
+
+
+class ProgressBoard:
+    """Collection of :class:`ProgressMatrix` objects keyed by level.
+
+    Parameters
+    ----------
+    assignments:
+        Known assignment names (e.g. the answers dictionary keys). Names that
+        start with a level such as ``"A1 "`` pre-populate that level's columns.
+    resolve:
+        ``resolve(assignment, level) -> key`` mapping a Scores label to its
+        answers-dictionary key (empty when unknown; the label is kept then).
+    """
+
+    def __init__(self, assignments: Iterable[str] = (), resolve: Optional[Callable[[str, str], str]] = None) -> None:
+        self.levels: Dict[str, ProgressMatrix] = {}
+        self.resolve = resolve
+        self._known: Dict[str, List[str]] = {}
+        for name in assignments:
+            level = str(name).split(" ", 1)[0].upper()
+            self._known.setdefault(level, []).append(name)
+        self._lock = threading.RLock()
+
+    def matrix(self, level: str) -> ProgressMatrix:
+        """Return the matrix of ``level``, creating it on first use."""
+        level = str(level or "").strip().upper()
+        with self._lock:
+            if level not in self.levels:
+                self.levels[level] = ProgressMatrix(self._known.get(level, []))
+            return self.levels[level]
+
+    def update(self, row: Dict[str, Any]) -> None:
+        """Apply a saved Scores row (the same shape as passed to ``save_row``).
+
+        Rows without a level are skipped.
+        """
+        level = str(row.get("level") or "").strip()
+        if not level:
+            return
+        assignment = str(row.get("assignment") or "").strip()
+        if self.resolve is not None and assignment:
+            assignment = self.resolve(assignment, level) or assignment
+        with self._lock:
+            self.matrix(level).update(row.get("studentcode", ""), row.get("name", ""), assignment, row.get("score"))
+
+    def update_many(self, rows: Iterable[Dict[str, Any]]) -> None:
+        """Apply rows in order, so later rows win."""
+        with self._lock:
+            for row in rows:
+                self.update(row)
@@ -0,0 +1,120 @@
+"""Worklist of submissions that have no saved score yet.
+
+Submissions are hash-joined against the Scores mirror on (student code,
+resolved assignment): both sides go through
+:meth:`~scores_utils.ScoresMirror.attempt_key`, so a submission resolved to
+``"A1 German Cases 5"`` finds the Scores row saved as ``"Lesen und Horen
+5"``, and each submission costs one lookup in the mirror's attempt index. Pending items are kept in submission order and indexed by
+their join key, so saving a score removes the matching items in O(1) and
+"next" never rescans the stream.
+"""
+
+from __future__ import annotations
+
+import bisect
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from scores_utils import ScoresMirror, student_key
+
+JoinKey = Tuple[str, str]
+
+
+class WorkQueue:
+    """Ungraded submissions, oldest first.
+
+    Parameters
+    ----------
+    mirror:
+        Scores mirror whose saved attempts count as graded.
+    resolve:
+        Returns the answers-dictionary key of a normalized submission, or an
+        empty string when it cannot be matched (the raw ``assignment`` label
+        is used then).
+    """
+
+    def __init__(self, mirror: ScoresMirror, resolve: Callable[[Dict[str, Any]], str]) -> None:
+        self.mirror = mirror
+        self.resolve = resolve
+        self.refreshed_at = 0.0
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._keys: Dict[str, JoinKey] = {}
+        self._by_key: Dict[JoinKey, Set[str]] = {}
+        self._order: List[Tuple[int, str]] = []  # (timestamp, path), sorted
+        self._seen: Set[str] = set()
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def join_key(self, item: Dict[str, Any]) -> JoinKey:
+        """Return the (student, assignment) key of a submission."""
+        assignment = self.resolve(item) or item.get("assignment", "")
+        return student_key(item.get("student_code")), self.mirror.attempt_key(assignment, item.get("level", ""))
+
+    def add(self, items: List[Dict[str, Any]], full: bool = False) -> int:
+        """Add submissions not seen before; return how many are ungraded.
+
+        With ``full`` the items are the whole window the queue follows (the
+        latest submissions), so only their paths are remembered as seen and
+        paths that left the window are forgotten.
+        """
+        added = 0
+        with self._lock:
+            if full:
+                self._seen = {str(item.get("_path") or item.get("id") or "") for item in items} & self._seen
+            for item in items:
+                path = str(item.get("_path") or item.get("id") or "")
+                if not path or path in self._seen or path in self._pending:
+                    continue
+                self._seen.add(path)
+                key = self.join_key(item)
+                if not key[0] or self.mirror.has_attempt(*key):
+                    continue
+                self._pending[path] = item
+                self._keys[path] = key
+                self._by_key.setdefault(key, set()).add(path)
+                bisect.insort(self._order, (int(item.get("_ts_ms") or 0), path))
+                added += 1
+            self.refreshed_at = time.time()
+        return added
+
+    def prune(self) -> int:
+        """Drop pending items whose score arrived from elsewhere (e.g. a sync)."""
+        with self._lock:
+            graded = [key for key in self._by_key if self.mirror.has_attempt(*key)]
+            return sum(self.mark_graded(*key) for key in graded)
+
+    def mark_graded(self, studentcode: Any, assignment: Any, level: Any = "") -> int:
+        """Drop the submissions matching a saved score; return how many."""
+        key = (student_key(studentcode), self.mirror.attempt_key(assignment, level))
+        with self._lock:
+            paths = self._by_key.pop(key, set())
+            for path in paths:
+                item = self._pending.pop(path)
+                self._keys.pop(path, None)
+                entry = (int(item.get("_ts_ms") or 0), path)
+                pos = bisect.bisect_left(self._order, entry)
+                if pos < len(self._order) and self._order[pos] == entry:
+                    del self._order[pos]
+        return len(paths)
+
+    def items(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Return pending submissions, oldest first."""
+        with self._lock:
+            paths = [p for _, p in self._order[:limit]]
+            return [self._pending[p] for p in paths]
+
+    def next(self, after: str = "", count: int = 1) -> List[Dict[str, Any]]:
+        """Return up to ``count`` pending items following the one at ``after``.
+
+        When ``after`` is not pending (it was just graded, or is empty) the
+        oldest items are returned.
+        """
+        with self._lock:
+            start = 0
+            if after in self._pending:
+                key = (int(self._pending[after].get("_ts_ms") or 0), after)
+                start = bisect.bisect_right(self._order, key)
+            return [self._pending[p] for _, p in self._order[start:start + count]]
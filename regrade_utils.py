@@ -0,0 +1,201 @@
+"""Re-grade saved objective markings after an answer-key correction.
+
+The old and new answer dictionaries are diffed question by question. Every
+stored marking of an affected assignment (see
+:class:`analysis_utils.ItemAnalysisStore`) keeps the student's answer to each
+question, so it is marked again from those answers under both the old and
+the new key, with the tolerant setting it was saved with. Only markings
+whose computed result differs are reported, and the difference is applied
+to the score that was saved, so a score the marker adjusted by hand keeps
+its adjustment (such rows are flagged for review). Submissions are never
+re-parsed, so the cost follows the number of markings of the corrected
+assignments. Records without stored answers cannot be re-graded and are
+skipped.
+
+Usage::
+
+    python regrade_utils.py old_answers.json answers_dictionary.json \\
+        --items item_analysis.jsonl --scores scores_mirror.csv --out regraded.csv
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set
+
+import pandas as pd
+
+from analysis_utils import ItemAnalysisStore
+from marking_utils import ClassGrade, build_reference_text_from_json, grade_answers
+from rules_utils import compile_rule
+from scores_utils import SCORE_COLUMNS, ScoresMirror
+
+
+@dataclass
+class KeyChange:
+    """Questions of one assignment whose accepted answer changed."""
+
+    assignment: str
+    old_answers: Dict[int, str]
+    new_answers: Dict[int, str]
+    questions: Set[int]
+
+
+def diff_answer_keys(old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, KeyChange]:
+    """Return the assignments whose answers differ between ``old`` and ``new``.
+
+    Answers are compared by what their compiled rules accept, so edits that
+    cannot change a grade (case, spacing, punctuation) are not reported. Questions added to
+    or removed from a key count as changed.
+    """
+    changes: Dict[str, KeyChange] = {}
+    for assignment in sorted(set(old) & set(new)):
+        if old[assignment] == new[assignment]:
+            continue
+        old_map = build_reference_text_from_json(old[assignment] or {})[3]
+        new_map = build_reference_text_from_json(new[assignment] or {})[3]
+        questions = {
+            n
+            for n in set(old_map) | set(new_map)
+            if n not in old_map
+            or n not in new_map
+            or compile_rule(old_map[n]).signature != compile_rule(new_map[n]).signature
+        }
+        if questions:
+            changes[assignment] = KeyChange(assignment, old_map, new_map, questions)
+    return changes
+
+
+@dataclass
+class Regraded:
+    """One stored marking whose result changes under the corrected key."""
+
+    record: Dict[str, Any]
+    saved: int  # score on record, possibly adjusted by the marker
+    computed_old: int  # score the stored answers earn under the old key
+    computed_new: int  # … and under the new key
+    graded: ClassGrade  # new-key grade holding this marking at ``row``
+    row: int
+
+    @property
+    def score(self) -> int:
+        """Saved score moved by the change in the computed score."""
+        return max(0, min(100, self.saved + self.computed_new - self.computed_old))
+
+    @property
+    def adjusted(self) -> bool:
+        """Whether the saved score differed from the computed one (a manual override)."""
+        return self.saved != self.computed_old
+
+
+def _touches(rec: Dict[str, Any], change: KeyChange) -> bool:
+    if set(change.old_answers) != set(change.new_answers):
+        return True  # a question was added or removed: every score's base changes
+    answers = rec["answers"]
+    return any(str(answers.get(str(n), answers.get(n, ""))).strip() for n in change.questions)
+
+
+def regrade_assignment(store: ItemAnalysisStore, change: KeyChange) -> List[Regraded]:
+    """Re-evaluate the stored markings of one assignment under the old and new key.
+
+    Only markings that answered a changed question are graded, and only
+    those whose computed score differs between the keys are returned.
+    """
+    recs = [r for r in store.records(change.assignment) if "answers" in r and _touches(r, change)]
+    changed: List[Regraded] = []
+    for tolerant in (False, True):
+        group = [r for r in recs if bool(r.get("tolerant")) == tolerant]
+        if not group:
+            continue
+        raw = [{int(n): stu for n, stu in r["answers"].items()} for r in group]
+        before = grade_answers(raw, change.old_answers, tolerant)
+        after = grade_answers(raw, change.new_answers, tolerant)
+        for i, rec in enumerate(group):
+            old, new = int(before.scores[i]), int(after.scores[i])
+            if old != new:
+                changed.append(Regraded(rec, int(rec["score"]), old, new, after, i))
+    return changed
+
+
+def regrade(
+    old: Dict[str, Any],
+    new: Dict[str, Any],
+    store: ItemAnalysisStore,
+    mirror: Optional[ScoresMirror] = None,
+    update_store: bool = True,
+) -> pd.DataFrame:
+    """Re-grade every affected marking and return Scores rows to save.
+
+    ``mirror`` supplies the student names of the previous saves. Rows whose
+    saved score was set by hand have ``review`` set. With ``update_store``
+    the item records are rewritten so later analytics use the corrected
+    results.
+    """
+    today = datetime.now().strftime("%Y-%m-%d")
+    rows: List[Dict[str, Any]] = []
+    for change in diff_answer_keys(old, new).values():
+        link = str(new[change.assignment].get("answer_url", "")).strip()
+        for r in regrade_assignment(store, change):
+            rec = r.record
+            previous = mirror.history(rec.get("student", ""), change.assignment) if mirror else []
+            note = f"Re-graded after answer key correction ({r.saved} → {r.score})."
+            if r.adjusted:
+                note += f" The saved score was adjusted by hand; please review (computed {r.computed_old} → {r.computed_new})."
+            rows.append(
+                {
+                    "studentcode": rec.get("student", ""),
+                    "name": previous[-1]["name"] if previous else "",
+                    "assignment": change.assignment,
+                    "score": r.score,
+                    "comments": f"{note} {r.graded.feedback(r.row)}",
+                    "date": today,
+                    "level": rec["level"],
+                    "link": link if r.score >= 60 else "",
+                    "submission": rec["submission"],
+                    "review": r.adjusted,
+                }
+            )
+            if update_store:
+                store.record(
+                    rec["submission"],
+                    change.assignment,
+                    rec["level"],
+                    r.graded,
+                    r.row,
+                    studentcode=rec.get("student", ""),
+                    score=r.score,
+                )
+    return pd.DataFrame(rows, columns=SCORE_COLUMNS + ["submission", "review"])
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("old", help="answers dictionary before the correction")
+    parser.add_argument("new", help="answers dictionary after the correction")
+    parser.add_argument("--items", default="item_analysis.jsonl", help="item analysis store")
+    parser.add_argument("--scores", default="scores_mirror.csv", help="Scores mirror for names")
+    parser.add_argument("--out", default="regraded.csv", help="CSV of changed rows to save")
+    parser.add_argument("--dry-run", action="store_true", help="do not rewrite item records")
+    args = parser.parse_args(argv)
+
+    with open(args.old, "r", encoding="utf-8") as f:
+        old = json.load(f)
+    with open(args.new, "r", encoding="utf-8") as f:
+        new = json.load(f)
+
+    changes = diff_answer_keys(old, new)
+    for change in changes.values():
+        print(f"{change.assignment}: questions {sorted(change.questions)}")
+    rows = regrade(
+        old, new, ItemAnalysisStore(args.items), ScoresMirror(args.scores), update_store=not args.dry_run
+    )
+    rows.to_csv(args.out, index=False)
+    print(f"{len(rows)} changed rows written to {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
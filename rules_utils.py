@@ -0,0 +1,259 @@
+"""Compile answer-key entries into fast matchers.
+
+An answer-key entry is a string in one of these forms:
+
+``"C) Guten Morgen"`` / ``"B. Sparkasse"`` / ``"a) Barzahlung"`` / ``"B 4"``
+    Multiple-choice option: the letter alone, the text alone or the whole
+    entry are accepted. A trailing note in brackets may be left out
+    (``"B) Falsch (Das Büro …)"`` accepts ``"Falsch"``).
+``"a. Head – Kopf"`` / ``"16 – sechzehn"`` / ``"Der Balkon – the balcony"``
+    Prompt and answer: only the answer side of the en dash is accepted,
+    which is the right-hand side unless that is an English gloss
+    (``"the …"``). A lower-case item label (``"a."``) is not an option letter
+    and is dropped.
+``"Frage 1: Anzeige A"``
+    The letter of the advert and ``"Anzeige A"`` are accepted, as is the
+    whole entry.
+``"Links abbiegen: 'Biegen Sie links ab'"``
+    The quoted answer after a short prompt is accepted, as is the whole
+    entry.
+``"Kaffee | Kaffe"``
+    Explicit alternatives; each one is compiled with the rules above. In
+    ``answers_dictionary.json`` a list of strings means the same.
+``"re:k(ae|a)ffee"``
+    A regular expression matched against the normalised answer (see
+    :func:`text_utils.canonical_token`). In the JSON file ``{"regex": …}``
+    means the same.
+
+Everything is reduced to a set of canonical strings plus option letters, so
+matching stays a set lookup; only regex rules run a pattern.
+
+For spelling-tolerant marking :meth:`AnswerRule.near` reports answers within
+a small edit distance of an accepted text form ("Waser" for "Wasser"). The
+accepted forms are bucketed by length and their letter sets are built when
+the rule is compiled. Every edit adds or removes at most one distinct
+letter, so a form whose letter set differs from the answer's by more than
+the budget is skipped without computing a distance. The distance itself
+skips the shared prefix and suffix and stops as soon as the budget is
+exceeded.
+"""
+
+from __future__ import annotations
+
+import re
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, List, Pattern, Tuple
+
+from text_utils import canonical_token
+
+REGEX_PREFIX = "re:"
+ALTERNATIVE_SEP = " | "
+
+_OPTION_PREFIX = re.compile(r"^\s*([A-Z])\s*[\).]\s*(.+)$|^\s*([a-d])\s*\)\s*(.+)$|^\s*([A-D])\s+(.+)$")
+_ITEM_LABEL = re.compile(r"^\s*[a-z]\.\s+(.+)$")
+_QUOTED_ANSWER = re.compile(r"^[^:'\"]{1,40}:\s*['\"‚„“](.+?)['\"‘“”]\s*$")
+_ANZEIGE = re.compile(r"(?:^|:\s*)anzeige\s*:?\s*([A-Za-z])$", re.I)
+_TRAILING_NOTE = re.compile(r"\s*\([^)]*\)\s*$")
+_DASH_SEP = re.compile(r"\s+[–—]\s+")
+_ENGLISH_GLOSS = re.compile(r"^(?:the|a|an|to)\s", re.I)
+_SLASH_SEP = re.compile(r"\s+/\s+")
+_TOKEN_PUNCT = "()[]{}.:=,;"
+
+
+def typo_budget(length: int) -> int:
+    """Return how many edits a normalised answer of ``length`` may contain."""
+    if length < 4:
+        return 0
+    return 1 if length < 8 else 2
+
+
+def bounded_distance(a: str, b: str, limit: int) -> int:
+    """Return the edit distance of ``a`` and ``b`` capped at ``limit + 1``.
+
+    Insertions, deletions, substitutions and swaps of neighbouring letters
+    cost one edit. Only a diagonal band of width ``2 * limit + 1`` is
+    computed and the scan stops once a whole row exceeds ``limit``. A shared
+    prefix and suffix need no edits and are stripped first, so a typo in a
+    long word only costs a table over the letters around it.
+    """
+    if a == b:
+        return 0
+    la, lb = len(a), len(b)
+    over = limit + 1
+    if abs(la - lb) > limit:
+        return over
+    start, shortest = 0, min(la, lb)
+    while start < shortest and a[start] == b[start]:
+        start += 1
+    end = 0
+    while end < shortest - start and a[la - 1 - end] == b[lb - 1 - end]:
+        end += 1
+    if start or end:
+        a, b = a[start:la - end], b[start:lb - end]
+        la, lb = len(a), len(b)
+    prev2: List[int] = []
+    prev = [j if j <= limit else over for j in range(lb + 1)]
+    for i in range(1, la + 1):
+        cur = [over] * (lb + 1)
+        cur[0] = i if i <= limit else over
+        row_min = cur[0]
+        ai = a[i - 1]
+        for j in range(max(1, i - limit), min(lb, i + limit) + 1):
+            bj = b[j - 1]
+            v = prev[j - 1] + (ai != bj)
+            if prev[j] + 1 < v:
+                v = prev[j] + 1
+            if cur[j - 1] + 1 < v:
+                v = cur[j - 1] + 1
+            if prev2 and j > 1 and ai == b[j - 2] and a[i - 2] == bj and prev2[j - 2] + 1 < v:
+                v = prev2[j - 2] + 1
+            cur[j] = v if v < over else over
+            if v < row_min:
+                row_min = v
+        if row_min > limit:
+            return over
+        prev2, prev = prev, cur
+    return prev[lb]
+
+
+def answer_key(raw: str) -> str:
+    """Return the lookup form of a student's answer.
+
+    A lone letter is kept as ``"@X"`` because ``"f"`` can mean option F or
+    "false" depending on the question; everything else is its
+    :func:`canonical_token`.
+    """
+    s = (raw or "").strip().strip(_TOKEN_PUNCT).strip()
+    if len(s) == 1 and s.isascii() and s.isalpha():
+        return "@" + s.upper()
+    return canonical_token(s)
+
+
+class AnswerRule:
+    """Compiled matcher for a single answer-key entry."""
+
+    __slots__ = ("source", "accepted", "letters", "patterns", "_by_length")
+
+    def __init__(self, source: str, accepted: FrozenSet[str], letters: FrozenSet[str], patterns: Tuple[Pattern, ...]):
+        self.source = source
+        self.accepted = accepted
+        self.letters = letters
+        self.patterns = patterns
+        self._by_length: Dict[int, Tuple[Tuple[str, FrozenSet[str]], ...]] = {}  # length -> (form, letters)
+        for form in sorted(accepted):
+            if typo_budget(len(form)) and form not in ("true", "false"):
+                self._by_length[len(form)] = self._by_length.get(len(form), ()) + ((form, frozenset(form)),)
+
+    @property
+    def signature(self) -> Tuple[FrozenSet[str], FrozenSet[str], Tuple[str, ...]]:
+        """Return what the rule accepts; equal signatures grade identically."""
+        return self.accepted, self.letters, tuple(p.pattern for p in self.patterns)
+
+    def matches(self, key: str) -> bool:
+        """Return ``True`` if an :func:`answer_key` value satisfies the rule."""
+        if not key:
+            return False
+        if key in self.accepted:
+            return True
+        if key[0] == "@":
+            letter = key[1:]
+            if letter in self.letters or canonical_token(letter) in self.accepted:
+                return True
+            key = canonical_token(letter)
+        return any(p.fullmatch(key) for p in self.patterns)
+
+    def near(self, key: str) -> bool:
+        """Return ``True`` if ``key`` is a likely misspelling of an accepted text.
+
+        Letters, True/False words and answers shorter than four characters
+        are never near misses. Exact matches are not near misses either;
+        check :meth:`matches` first.
+        """
+        budget = typo_budget(len(key))
+        if not budget or key[0] == "@" or key in ("true", "false"):
+            return False
+        chars = None
+        for length in range(len(key) - budget, len(key) + budget + 1):
+            for form, form_chars in self._by_length.get(length, ()):
+                limit = min(budget, typo_budget(length))
+                if not limit:
+                    continue
+                if chars is None:
+                    chars = frozenset(key)
+                if len(chars - form_chars) > limit or len(form_chars - chars) > limit:
+                    continue
+                if bounded_distance(key, form, limit) <= limit:
+                    return True
+        return False
+
+
+def _text_forms(text: str) -> Iterable[str]:
+    without_note = _TRAILING_NOTE.sub("", text) or text
+    sides = _DASH_SEP.split(without_note)
+    if len(sides) == 1:
+        yield text
+        yield without_note
+        answer = without_note
+    else:
+        answer = sides[0] if _ENGLISH_GLOSS.match(sides[-1]) else sides[-1]
+        yield answer
+    yield from _SLASH_SEP.split(answer)
+
+
+def _compile_alternative(text: str, accepted: set, letters: set, patterns: List[Pattern]) -> None:
+    text = text.strip()
+    if not text:
+        return
+    if text[: len(REGEX_PREFIX)].lower() == REGEX_PREFIX:
+        patterns.append(re.compile(text[len(REGEX_PREFIX):].strip(), re.I))
+        return
+
+    forms = [text]
+    label = _ITEM_LABEL.match(text)
+    option = _OPTION_PREFIX.match(text)
+    quoted = _QUOTED_ANSWER.match(text)
+    if label:
+        forms = [label.group(1)]
+    elif option:
+        letters.add(next(g for g in option.groups()[::2] if g).upper())
+        forms.append(next(g for g in option.groups()[1::2] if g))
+    elif quoted:
+        forms.append(quoted.group(1))
+    anzeige = _ANZEIGE.search(text)
+    if anzeige:
+        letters.add(anzeige.group(1).upper())
+        forms.append(text[anzeige.start():].lstrip(": "))
+    elif len(text) == 1 and text.isalpha():
+        letters.add(text.upper())
+
+    for form in forms:
+        if form is not text and form.strip().upper() in ("A", "B", "C", "D"):
+            # "A) B" names option A; it does not accept option B or the word
+            # the letter canonicalises to.
+            continue
+        for variant in _text_forms(form):
+            canon = canonical_token(variant)
+            if canon:
+                accepted.add(canon)
+
+
+@lru_cache(maxsize=4096)
+def compile_rule(source: str) -> AnswerRule:
+    """Compile an answer-key entry (cached, so each entry compiles once)."""
+    accepted: set = set()
+    letters: set = set()
+    patterns: List[Pattern] = []
+    source = str(source or "")
+    alternatives = [source] if source.lower().startswith(REGEX_PREFIX) else source.split(ALTERNATIVE_SEP)
+    for alt in alternatives:
+        _compile_alternative(alt, accepted, letters, patterns)
+    return AnswerRule(source, frozenset(accepted), frozenset(letters), tuple(patterns))
+
+
+def rule_source_from_json(value) -> str:
+    """Turn a JSON answer value (string, list or ``{"regex": …}``) into rule text."""
+    if isinstance(value, dict) and "regex" in value:
+        return REGEX_PREFIX + str(value["regex"])
+    if isinstance(value, (list, tuple)):
+        return ALTERNATIVE_SEP.join(str(v).strip() for v in value if str(v).strip())
+    return str(value).strip()
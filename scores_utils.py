@@ -0,0 +1,280 @@
+"""Local, indexed mirror of the Scores sheet.
+
+The mirror keeps every Scores row on disk (CSV) and in memory, sorted by
+date. A sync only asks Google for rows dated on or after the newest local
+date and replaces that tail of the mirror with the fresh rows, so repeated
+syncs download a day's worth of rows instead of the whole sheet. When the
+sheet rejects the date filter (a text-typed date column) every sync is a
+full reload, so those are spaced out to :attr:`ScoresMirror.full_sync_interval`.
+"""
+
+from __future__ import annotations
+
+import bisect
+import csv
+import os
+import tempfile
+import threading
+import time
+from datetime import date
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from sheets_utils import (
+    compile_gviz_query,
+    fetch_gviz_csv,
+    fetch_sheet_header,
+    normalize_header,
+    read_csv_normalized,
+)
+
+SCORE_COLUMNS = ["studentcode", "name", "assignment", "score", "comments", "date", "level", "link"]
+
+
+def student_key(code: Any) -> str:
+    """Return the lookup form of a student code."""
+    return str(code or "").strip().lower()
+
+
+def assignment_key(name: Any) -> str:
+    """Return the lookup form of an assignment name."""
+    return " ".join(str(name or "").lower().split())
+
+
+def normalize_score_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Return ``df`` with the canonical Scores columns and ISO dates.
+
+    Header variants such as ``StudentCode``/``student_code`` are mapped onto
+    :data:`SCORE_COLUMNS`; dates are parsed once, vectorised, into
+    ``YYYY-MM-DD`` strings (empty when unparseable). Rows are sorted by date.
+    """
+    by_norm = {normalize_header(c): c for c in df.columns}
+    out = pd.DataFrame(index=df.index)
+    for col in SCORE_COLUMNS:
+        raw = by_norm.get(normalize_header(col))
+        out[col] = df[raw].fillna("").astype(str).str.strip() if raw is not None else ""
+    parsed = pd.to_datetime(out["date"], errors="coerce", format="mixed")
+    out["date"] = parsed.dt.strftime("%Y-%m-%d").fillna("")
+    return out.sort_values("date", kind="stable").reset_index(drop=True)
+
+
+class ScoresMirror:
+    """In-memory copy of the Scores sheet, persisted to a local CSV.
+
+    Parameters
+    ----------
+    path:
+        CSV file holding the mirror between runs.
+    seed_path:
+        Snapshot used the first time, before any sync (e.g.
+        ``scores_backup.csv``).
+    resolve:
+        Maps an (assignment, level) pair to its answers-dictionary key, or an
+        empty string when it cannot be matched. Attempts are indexed and
+        looked up under that key, so legacy Scores labels such as ``"Lesen
+        und Horen 5"`` and the dictionary key ``"A1 German Cases 5"`` find
+        the same rows. Without it the raw label is used.
+    """
+
+    full_sync_interval = 600.0  # seconds between syncs that must reload the whole tab
+
+    def __init__(
+        self,
+        path: str,
+        seed_path: Optional[str] = None,
+        resolve: Optional[Callable[[str, str], str]] = None,
+    ) -> None:
+        self.path = path
+        self.seed_path = seed_path
+        self.resolve = resolve
+        self.rows: List[Dict[str, str]] = []
+        self.synced_at = 0.0
+        self.full_sync = False  # the last sync had to reload the whole tab
+        self._file_lock = threading.Lock()
+        self._by_student: Dict[str, List[int]] = {}
+        self._by_attempt: Dict[Tuple[str, str], List[int]] = {}
+        self._lock = threading.RLock()
+        self.load()
+
+    # ---------------- storage ----------------
+    def load(self) -> None:
+        """Load the mirror from ``path`` or, failing that, from ``seed_path``."""
+        for source in (self.path, self.seed_path):
+            if source and os.path.exists(source):
+                try:
+                    df = normalize_score_frame(read_csv_normalized(source))
+                except Exception:
+                    continue
+                with self._lock:
+                    self.rows = df.to_dict("records")
+                    self._reindex(0)
+                return
+
+    def save(self) -> None:
+        """Write the mirror to ``path``.
+
+        Each call writes its own temporary file next to ``path`` and moves it
+        into place, so concurrent saves never share a half-written file.
+        """
+        with self._lock:
+            frame = pd.DataFrame(self.rows, columns=SCORE_COLUMNS)
+        folder = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp = tempfile.mkstemp(prefix=".scores-", suffix=".tmp", dir=folder)
+        try:
+            with os.fdopen(fd, "w", newline="", encoding="utf-8") as f:
+                frame.to_csv(f, index=False)
+            with self._file_lock:
+                os.replace(tmp, self.path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    def append(self, row: Dict[str, str]) -> None:
+        """Append one row (as returned by :meth:`record`) to ``path``.
+
+        :meth:`load` sorts by date, so the file need not stay in order.
+        """
+        with self._file_lock:
+            new = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+            with open(self.path, "a", newline="", encoding="utf-8") as f:
+                writer = csv.writer(f)
+                if new:
+                    writer.writerow(SCORE_COLUMNS)
+                writer.writerow([row.get(col, "") for col in SCORE_COLUMNS])
+
+    # ---------------- indexing ----------------
+    def _reindex(self, start: int) -> None:
+        """Drop index entries for rows ``>= start`` and re-add them."""
+        for index in (self._by_student, self._by_attempt):
+            for key in list(index):
+                positions = index[key]
+                while positions and positions[-1] >= start:
+                    positions.pop()
+                if not positions:
+                    del index[key]
+        for pos in range(start, len(self.rows)):
+            self._index_row(pos)
+
+    def attempt_key(self, assignment: Any, level: Any = "") -> str:
+        """Return the lookup form of ``assignment``, resolved when possible."""
+        if self.resolve is not None:
+            resolved = self.resolve(str(assignment or ""), str(level or ""))
+            if resolved:
+                return assignment_key(resolved)
+        return assignment_key(assignment)
+
+    def _index_row(self, pos: int) -> None:
+        row = self.rows[pos]
+        code = student_key(row.get("studentcode"))
+        self._by_student.setdefault(code, []).append(pos)
+        attempt = (code, self.attempt_key(row.get("assignment"), row.get("level")))
+        self._by_attempt.setdefault(attempt, []).append(pos)
+
+    @property
+    def last_date(self) -> str:
+        """Newest ISO date in the mirror (empty when no dated rows exist)."""
+        with self._lock:
+            return self.rows[-1]["date"] if self.rows else ""
+
+    def history(self, studentcode: Any, assignment: Any = None, level: Any = "") -> List[Dict[str, str]]:
+        """Return the saved rows for ``studentcode``, oldest first.
+
+        When ``assignment`` is given only attempts at that assignment are
+        returned, matched through :meth:`attempt_key`. Both lookups are a
+        single dictionary access.
+        """
+        code = student_key(studentcode)
+        with self._lock:
+            if assignment is None:
+                positions = self._by_student.get(code, [])
+            else:
+                positions = self._by_attempt.get((code, self.attempt_key(assignment, level)), [])
+            return [self.rows[i] for i in positions]
+
+    def has_attempt(self, studentcode: Any, assignment: Any, level: Any = "") -> bool:
+        """Return ``True`` if a score for (``studentcode``, ``assignment``) is saved."""
+        key = (student_key(studentcode), self.attempt_key(assignment, level))
+        with self._lock:
+            return key in self._by_attempt
+
+    def record(self, row: Dict[str, Any]) -> Dict[str, str]:
+        """Add a freshly saved row so lookups see it before the next sync.
+
+        The next sync replaces it with the sheet's copy, since rows dated on
+        or after the newest mirrored date are always re-pulled. Returns the
+        normalised row, ready for :meth:`append`.
+        """
+        fresh = normalize_score_frame(pd.DataFrame([row])).to_dict("records")[0]
+        with self._lock:
+            if not self.rows or self.rows[-1]["date"] <= fresh["date"]:
+                self.rows.append(fresh)
+                self._index_row(len(self.rows) - 1)
+            else:
+                pos = bisect.bisect_right([r["date"] for r in self.rows], fresh["date"])
+                self.rows.insert(pos, fresh)
+                self._reindex(pos)
+        return fresh
+
+    # ---------------- sync ----------------
+    def merge(self, fresh: pd.DataFrame, since: str = "") -> int:
+        """Replace rows dated ``>= since`` with ``fresh`` and return its size.
+
+        An empty ``since`` means ``fresh`` is the complete sheet.
+        """
+        df = normalize_score_frame(fresh)
+        with self._lock:
+            if since:
+                cut = len(self.rows)
+                while cut and self.rows[cut - 1]["date"] >= since:
+                    cut -= 1
+                df = df[df["date"] >= since]
+            else:
+                cut = 0
+            self.rows[cut:] = df.to_dict("records")
+            self._reindex(cut)
+        return len(df)
+
+    def sync(self, fetch: Callable[[str], pd.DataFrame], header: List[str]) -> int:
+        """Pull rows newer than the mirror through ``fetch`` and merge them.
+
+        ``fetch`` runs a compiled gviz query and returns a DataFrame. When the
+        delta query fails (for instance a text-typed date column rejecting a
+        date literal) the whole tab is reloaded instead.
+        """
+        since = self.last_date
+        if since:
+            try:
+                tq = compile_gviz_query(
+                    header, filters=[("date", ">=", date.fromisoformat(since))], limit=None
+                )
+                fresh = fetch(tq)
+                if "date" not in {normalize_header(c) for c in fresh.columns}:
+                    raise ValueError("unexpected delta response")
+                count = self.merge(fresh, since=since)
+                self.synced_at = time.time()
+                self.full_sync = False
+                return count
+            except Exception:
+                pass
+        count = self.merge(fetch(compile_gviz_query(header, limit=None)))
+        self.synced_at = time.time()
+        self.full_sync = True
+        return count
+
+    def sync_sheet(self, sheet_id: str, tab: str, max_age: float = 0) -> int:
+        """Sync from a Google Sheet tab unless synced within ``max_age`` seconds.
+
+        Returns the number of rows pulled (``0`` when skipped). After a full
+        reload the next sync waits at least :attr:`full_sync_interval`. The
+        mirror is saved to disk after every successful pull.
+        """
+        if self.full_sync and max_age:
+            max_age = max(max_age, self.full_sync_interval)
+        if max_age and time.time() - self.synced_at < max_age:
+            return 0
+        header = fetch_sheet_header(sheet_id, tab)
+        count = self.sync(lambda tq: fetch_gviz_csv(sheet_id, tab, tq), header)
+        self.save()
+        return count
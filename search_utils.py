@@ -0,0 +1,291 @@
+"""Full-text search over submission texts.
+
+:class:`TextIndex` is an in-memory inverted index with one posting map per
+level: ``token -> {document number: positions}``, the positions packed
+into ``bytes`` so the posting maps hold no objects the garbage collector has
+to walk. Tokens are lower-cased
+with umlauts and ß spelled out (``für`` and ``fuer`` both index as
+``fuer``), so a search matches however the student typed them. Queries
+are conjunctions of terms and ``"quoted phrases"``; candidates come from
+intersecting the shortest posting lists first and phrases are checked on
+positions, so a query touches only the documents that contain its rarest
+token.
+
+Documents are keyed by their Firestore path (ids repeat across the nested
+layouts) and are added and replaced one at a time, so the index follows new
+submissions without rebuilds. :class:`SearchStore` keeps the indexed texts
+in SQLite so the index is rebuilt from disk on start instead of from
+Firestore. :func:`crawl_flat` walks the flat collection in
+``(_ts_ms, id)`` order from a cursor kept in the store, so texts stored
+because they were opened or archived never make older ones unreachable.
+"""
+
+from __future__ import annotations
+
+import re
+import sqlite3
+import threading
+import unicodedata
+from array import array
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from submission_utils import Submission
+
+_WORD = re.compile(r"[^\W_]+")
+_PHRASE = re.compile(r'"([^"]*)"')
+_FOLD = str.maketrans({"ä": "ae", "ö": "oe", "ü": "ue", "ß": "ss"})
+
+Postings = Dict[int, bytes]  # document number -> packed uint32 positions
+
+
+def fold_tokens(text: str) -> List[str]:
+    """Return the search tokens of ``text`` in order."""
+    return _WORD.findall(unicodedata.normalize("NFC", text or "").lower().translate(_FOLD))
+
+
+def parse_query(query: str) -> List[List[str]]:
+    """Split a query into phrases (token lists); bare words are one-token phrases."""
+    phrases = [fold_tokens(p) for p in _PHRASE.findall(query or "")]
+    phrases.extend([t] for t in fold_tokens(_PHRASE.sub(" ", query or "")))
+    return [p for p in phrases if p]
+
+
+def snippet(text: str, query: str, width: int = 80) -> str:
+    """Return the part of ``text`` around the first word matching ``query``."""
+    wanted = {t for p in parse_query(query) for t in p}
+    text = unicodedata.normalize("NFC", text or "")
+    for m in _WORD.finditer(text):
+        if m.group().lower().translate(_FOLD) in wanted:
+            start = max(0, m.start() - width // 2)
+            end = min(len(text), start + width)
+            return ("…" if start else "") + " ".join(text[start:end].split()) + ("…" if end < len(text) else "")
+    return " ".join(text[:width].split())
+
+
+@dataclass(frozen=True)
+class SearchHit:
+    """One matching document of :meth:`TextIndex.search`."""
+
+    path: str
+    level: str
+    matches: int  # occurrences of the query's phrases
+
+
+class TextIndex:
+    """Incremental inverted index of submission texts, partitioned by level."""
+
+    def __init__(self) -> None:
+        self._levels: Dict[str, Dict[str, Postings]] = {}
+        self._paths: List[Optional[str]] = []  # document number -> path (None once removed)
+        self._numbers: Dict[str, int] = {}
+        self._doc_level: Dict[int, str] = {}
+        self._doc_tokens: Dict[int, Tuple[str, ...]] = {}
+        self._lock = threading.RLock()
+        self.loaded_rowid = 0  # last SearchStore row added by SearchStore.load
+
+    def __len__(self) -> int:
+        return len(self._numbers)
+
+    def __contains__(self, path: str) -> bool:
+        return path in self._numbers
+
+    @property
+    def levels(self) -> List[str]:
+        return sorted(level for level, postings in self._levels.items() if postings)
+
+    def add(self, path: str, text: str, level: str = "") -> None:
+        """Index ``text`` under the document ``path``, replacing any earlier version."""
+        tokens = fold_tokens(text)
+        positions: Dict[str, List[int]] = {}
+        for pos, token in enumerate(tokens):
+            positions.setdefault(token, []).append(pos)
+        level = str(level or "").strip().upper()
+        with self._lock:
+            self.remove(path)
+            number = len(self._paths)
+            self._paths.append(path)
+            self._numbers[path] = number
+            self._doc_level[number] = level
+            self._doc_tokens[number] = tuple(positions)
+            postings = self._levels.setdefault(level, {})
+            for token, pos in positions.items():
+                docs = postings.get(token)
+                if docs is None:
+                    docs = postings[token] = {}
+                docs[number] = array("I", pos).tobytes()
+
+    def remove(self, path: str) -> None:
+        """Drop ``path`` from the index (no-op if absent)."""
+        with self._lock:
+            number = self._numbers.pop(path, None)
+            if number is None:
+                return
+            self._paths[number] = None
+            postings = self._levels[self._doc_level.pop(number)]
+            for token in self._doc_tokens.pop(number):
+                docs = postings[token]
+                docs.pop(number, None)
+                if not docs:
+                    del postings[token]
+
+    def search(self, query: str, level: str = "", limit: int = 50) -> List[SearchHit]:
+        """Return documents containing every term and phrase of ``query``.
+
+        ``level`` restricts the search to one level's postings. Hits are
+        ordered by the number of matches, then most recently indexed first.
+        """
+        phrases = parse_query(query)
+        if not phrases:
+            return []
+        level = str(level or "").strip().upper()
+        hits: List[SearchHit] = []
+        with self._lock:
+            for lvl in ([level] if level else list(self._levels)):
+                postings = self._levels.get(lvl, {})
+                hits.extend(SearchHit(self._paths[n], lvl, m) for n, m in self._match(postings, phrases).items())
+        hits.sort(key=lambda h: (-h.matches, -self._numbers.get(h.path, 0)))
+        return hits[:limit]
+
+    @staticmethod
+    def _match(postings: Dict[str, Postings], phrases: List[List[str]]) -> Dict[int, int]:
+        lists = []
+        for token in {t for p in phrases for t in p}:
+            docs = postings.get(token)
+            if not docs:
+                return {}
+            lists.append(docs)
+        lists.sort(key=len)
+        candidates = set(lists[0])
+        for docs in lists[1:]:
+            candidates.intersection_update(docs.keys())
+            if not candidates:
+                return {}
+
+        counts: Dict[int, int] = dict.fromkeys(candidates, 0)
+        for phrase in phrases:
+            head = postings[phrase[0]]
+            rest = [(offset, postings[t]) for offset, t in enumerate(phrase[1:], 1)]
+            for n in list(counts):
+                starts = memoryview(head[n]).cast("I")
+                if rest:
+                    following = [(offset, set(memoryview(docs[n]).cast("I"))) for offset, docs in rest]
+                    starts = [p for p in starts if all(p + offset in pos for offset, pos in following)]
+                if len(starts):
+                    counts[n] += len(starts)
+                else:
+                    del counts[n]
+        return counts
+
+
+class SearchStore:
+    """SQLite copy of indexed submissions, used to rebuild a :class:`TextIndex`."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            keys = [row[1] for row in self._conn.execute("PRAGMA table_info(indexed)") if row[5]]
+            if keys == ["doc_id"]:  # stores written before rows were keyed by path
+                self._conn.execute("ALTER TABLE indexed RENAME TO indexed_by_id")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS indexed (
+                    path TEXT PRIMARY KEY,
+                    doc_id TEXT NOT NULL,
+                    student_code TEXT NOT NULL,
+                    student_name TEXT NOT NULL,
+                    level TEXT NOT NULL,
+                    assignment TEXT NOT NULL,
+                    ts_ms INTEGER NOT NULL,
+                    text TEXT NOT NULL
+                )
+                """
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS crawl (name TEXT PRIMARY KEY, ts_ms INTEGER NOT NULL, doc_id TEXT NOT NULL)"
+            )
+            if keys == ["doc_id"]:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO indexed SELECT path, doc_id, student_code, student_name, level, "
+                    "assignment, ts_ms, text FROM indexed_by_id ORDER BY rowid"
+                )
+                self._conn.execute("DROP TABLE indexed_by_id")
+
+    def put(self, subs: Iterable[Submission]) -> int:
+        """Store complete submissions whose text is new or changed; return how many."""
+        rows = [
+            (
+                s.path, s.id, str(s.student_code), str(s.student_name), str(s.level).strip().upper(),
+                str(s.assignment), s.ts_ms, s.text, s.path, s.text,
+            )
+            for s in subs
+            if s.complete
+        ]
+        with self._lock, self._conn:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO indexed SELECT ?, ?, ?, ?, ?, ?, ?, ? "
+                "WHERE NOT EXISTS (SELECT 1 FROM indexed WHERE path = ? AND text = ?)",
+                rows,
+            )
+            return self._conn.total_changes - before
+
+    def load(self, index: TextIndex) -> int:
+        """Add the rows stored since ``index`` last loaded; return how many.
+
+        Replaced rows get a new rowid, so edited submissions are re-indexed
+        too.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT rowid, path, text, level FROM indexed WHERE rowid > ? ORDER BY rowid", (index.loaded_rowid,)
+            ).fetchall()
+            for rowid, path, text, level in rows:
+                index.add(path, text, level)
+                index.loaded_rowid = rowid
+        return len(rows)
+
+    def crawl_cursor(self, name: str = "flat") -> Tuple[int, str]:
+        """Return the ``(_ts_ms, doc id)`` the crawler ``name`` stopped at (``(0, "")`` if new)."""
+        with self._lock:
+            row = self._conn.execute("SELECT ts_ms, doc_id FROM crawl WHERE name = ?", (name,)).fetchone()
+        return (int(row[0]), row[1]) if row else (0, "")
+
+    def advance_crawl(self, ts_ms: int, doc_id: str, name: str = "flat") -> None:
+        """Record the last document the crawler ``name`` has stored."""
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO crawl VALUES (?, ?, ?)", (name, int(ts_ms), doc_id))
+
+    def records(self, paths: List[str]) -> Dict[str, Dict[str, object]]:
+        """Return the stored metadata and text of the documents at ``paths``."""
+        found: Dict[str, Dict[str, object]] = {}
+        columns = ["path", "doc_id", "student_code", "student_name", "level", "assignment", "ts_ms", "text"]
+        with self._lock:
+            for start in range(0, len(paths), 500):
+                chunk = paths[start:start + 500]
+                marks = ",".join("?" * len(chunk))
+                for row in self._conn.execute(f"SELECT * FROM indexed WHERE path IN ({marks})", chunk):
+                    found[row[0]] = dict(zip(columns, row))
+        return found
+
+
+def crawl_flat(coll, store: SearchStore, limit: int = 500) -> int:
+    """Store the next ``limit`` documents of the flat collection ``coll``; return how many were read.
+
+    Documents are read in ``(_ts_ms, id)`` order after the store's crawl
+    cursor, which only this function advances; equal timestamps are told
+    apart by id, so none are skipped at a page boundary.
+    """
+    ts_ms, doc_id = store.crawl_cursor()
+    query = coll.order_by("_ts_ms").order_by("__name__").limit(limit)
+    if doc_id:
+        query = query.start_after({"_ts_ms": ts_ms, "__name__": doc_id})
+    page = list(query.stream())
+    if not page:
+        return 0
+    store.put(Submission(snap.to_dict() or {}, snap.id, path=snap.reference.path) for snap in page)
+    store.advance_crawl((page[-1].to_dict() or {}).get("_ts_ms", 0), page[-1].id)
+    return len(page)
@@ -0,0 +1,217 @@
+"""Helpers for reading Google Sheets through the public gviz endpoint.
+
+The gviz query language only understands column *letters* (``A``, ``B`` …),
+so column projections and filters expressed with header names are compiled
+against the sheet's header row before being sent to Google.
+"""
+
+from __future__ import annotations
+
+import io
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import pandas as pd
+import requests
+
+GVIZ_URL = "https://docs.google.com/spreadsheets/d/{sheet_id}/gviz/tq"
+DEFAULT_LIMIT = 100000
+
+# A filter is either ``{"level": "A1"}`` (equality, lists mean "any of") or a
+# sequence of ``(column, operator, value)`` triples.
+Condition = Tuple[str, str, Any]
+Filters = Union[Dict[str, Any], Sequence[Condition], None]
+
+_OPERATORS = {"=", "!=", "<>", "<", "<=", ">", ">=", "contains", "starts with"}
+
+
+class UnquotableValue(ValueError):
+    """A string filter value that no gviz literal can express."""
+
+
+def normalize_header(name: Any) -> str:
+    """Return the comparison form of a header used by :func:`resolve_column`."""
+    return str(name).lower().strip().replace(" ", "").replace("_", "")
+
+
+def column_letter(index: int) -> str:
+    """Return the spreadsheet column letter for a zero-based ``index``."""
+    letters = ""
+    index += 1
+    while index > 0:
+        index, rem = divmod(index - 1, 26)
+        letters = chr(ord("A") + rem) + letters
+    return letters
+
+
+def resolve_column(header: Sequence[str], name: str) -> Optional[str]:
+    """Return the column letter of ``name`` in ``header`` (``None`` if missing)."""
+    want = normalize_header(name)
+    for i, col in enumerate(header):
+        if normalize_header(col) == want:
+            return column_letter(i)
+    return None
+
+
+def quote_literal(value: Any) -> str:
+    """Render ``value`` as a gviz query literal.
+
+    Raises
+    ------
+    UnquotableValue
+        If a string contains both quote characters: gviz has no escape
+        sequences, so such a value cannot be matched by a query.
+    """
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (int, float)):
+        return repr(value)
+    if isinstance(value, datetime):
+        return f"datetime '{value.strftime('%Y-%m-%d %H:%M:%S')}'"
+    if isinstance(value, date):
+        return f"date '{value.isoformat()}'"
+    text = str(value)
+    # gviz has no escape sequences; pick the quote that is not in the value.
+    if "'" not in text:
+        return f"'{text}'"
+    if '"' not in text:
+        return f'"{text}"'
+    raise UnquotableValue(f"Cannot quote a value containing both quote characters: {text!r}")
+
+
+def _iter_conditions(filters: Filters) -> Iterable[Condition]:
+    if not filters:
+        return []
+    if isinstance(filters, dict):
+        return [(col, "=", val) for col, val in filters.items()]
+    return list(filters)
+
+
+def compile_gviz_query(
+    header: Sequence[str],
+    columns: Optional[Sequence[str]] = None,
+    filters: Filters = None,
+    limit: Optional[int] = DEFAULT_LIMIT,
+    offset: int = 0,
+) -> str:
+    """Compile a projection and row filters into a gviz ``tq`` string.
+
+    Parameters
+    ----------
+    header:
+        Column labels of the sheet, in sheet order.
+    columns:
+        Names of the columns to return. Names missing from the sheet are
+        skipped; ``None`` selects every column.
+    filters:
+        Equality mapping or ``(column, operator, value)`` triples. A list or
+        tuple value in the mapping (or with ``"in"``) matches any of its items.
+    limit / offset:
+        Row window applied by Google after filtering.
+
+    Raises
+    ------
+    KeyError
+        If a filter refers to a column that is not in ``header``.
+    ValueError
+        If a filter uses an unsupported operator.
+    UnquotableValue
+        If a filter value cannot be quoted (see :func:`quote_literal`).
+    """
+
+    select = "*"
+    if columns is not None:
+        letters: List[str] = []
+        for name in columns:
+            letter = resolve_column(header, name)
+            if letter and letter not in letters:
+                letters.append(letter)
+        select = ", ".join(letters) if letters else "*"
+
+    clauses: List[str] = []
+    for col, op, value in _iter_conditions(filters):
+        letter = resolve_column(header, col)
+        if not letter:
+            raise KeyError(f"Unknown filter column: {col}")
+        op = op.lower().strip()
+        if isinstance(value, (list, tuple, set, frozenset)) and op in {"=", "in"}:
+            options = [f"{letter} = {quote_literal(v)}" for v in value]
+            clauses.append("(" + " or ".join(options) + ")" if options else "false")
+            continue
+        if op not in _OPERATORS:
+            raise ValueError(f"Unsupported filter operator: {op}")
+        clauses.append(f"{letter} {op} {quote_literal(value)}")
+
+    tq = f"select {select}"
+    if clauses:
+        tq += " where " + " and ".join(clauses)
+    if limit is not None:
+        tq += f" limit {int(limit)}"
+    if offset:
+        tq += f" offset {int(offset)}"
+    return tq
+
+
+def build_gviz_url(sheet_id: str, tab: str, tq: str) -> str:
+    """Return the CSV export URL for ``tq`` against ``sheet_id``/``tab``."""
+    return (
+        GVIZ_URL.format(sheet_id=sheet_id)
+        + f"?tqx=out:csv&sheet={requests.utils.quote(tab)}"
+        + f"&tq={requests.utils.quote(tq)}"
+    )
+
+
+def read_csv_normalized(source: Any) -> pd.DataFrame:
+    """Read a CSV as strings with lower-cased, stripped column names."""
+    df = pd.read_csv(source, dtype=str)
+    df.columns = df.columns.str.strip().str.lower()
+    return df
+
+
+def fetch_gviz_csv(sheet_id: str, tab: str, tq: str, timeout: float = 10) -> pd.DataFrame:
+    """Run ``tq`` against the sheet and return the result as a DataFrame.
+
+    Network and HTTP errors propagate to the caller so it can decide on a
+    fallback.
+    """
+    response = requests.get(build_gviz_url(sheet_id, tab, tq), timeout=timeout)
+    response.raise_for_status()
+    if not response.text.strip():
+        return pd.DataFrame()
+    return read_csv_normalized(io.StringIO(response.text))
+
+
+def fetch_sheet_header(sheet_id: str, tab: str, timeout: float = 10) -> List[str]:
+    """Return the header row of a sheet without downloading any data rows."""
+    return list(fetch_gviz_csv(sheet_id, tab, "select * limit 0", timeout=timeout).columns)
+
+
+def apply_query_locally(
+    df: pd.DataFrame,
+    columns: Optional[Sequence[str]] = None,
+    filters: Filters = None,
+) -> pd.DataFrame:
+    """Apply the equality filters and projection of a query to a local frame.
+
+    Used when the sheet is unreachable and a fallback CSV is read instead, so
+    callers see the same shape of data either way. Only ``=``/``in``
+    conditions are evaluated (other operators are ignored); like gviz's
+    ``=`` they compare exactly, case and spaces included.
+    """
+    header = list(df.columns)
+    by_norm = {normalize_header(c): c for c in header}
+    for col, op, value in _iter_conditions(filters):
+        raw = by_norm.get(normalize_header(col))
+        if raw is None or op.lower().strip() not in {"=", "in"}:
+            continue
+        values = value if isinstance(value, (list, tuple, set, frozenset)) else [value]
+        df = df[df[raw].astype(str).isin({str(v) for v in values})]
+    if columns is not None:
+        keep: List[str] = []
+        for name in columns:
+            raw = by_norm.get(normalize_header(name))
+            if raw is not None and raw not in keep:
+                keep.append(raw)
+        if keep:
+            df = df[keep]
+    return df.reset_index(drop=True)
@@ -0,0 +1,253 @@
+"""Submission records built from Firestore documents.
+
+:class:`Submission` wraps the raw document instead of copying it. The
+metadata the dashboard lists (student, level, assignment, path) is picked
+once on construction; the text, preview, timestamp and selectbox label are
+derived on first access and kept (until :meth:`Submission.fill`), so listing thousands of submissions costs
+neither a dict copy per document nor repeated text extraction.
+
+Listings fetch only :data:`LISTING_FIELDS` (a Firestore ``select``
+projection), which leaves out the essay body. Such records are incomplete:
+their preview comes from the document's short ``preview`` field (written by
+the migration, see :func:`make_preview`), and :meth:`Submission.fill` adds
+the full document once a submission is actually opened or graded. Records
+of documents without the field report :attr:`Submission.needs_body`, so
+callers can load their bodies before showing a preview.
+
+Records still answer ``item.get("assignment")`` and ``item["_path"]`` like
+the dicts they replace, so helpers written against plain dicts keep working.
+"""
+
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+TEXT_FIELDS = ("content", "text", "answer", "body", "draft", "message", "submissionText")
+TIMESTAMP_FIELDS = ("timestamp", "createdAt", "created_at", "submittedAt", "updatedAt")
+PREVIEW_CHARS = 160
+LABEL_PREVIEW_CHARS = 80
+
+# Record attribute -> document keys tried in order (snake_case and camelCase layouts).
+_PICK: Dict[str, Tuple[str, ...]] = {
+    "student_name": ("student_name", "name", "student", "studentName"),
+    "student_code": ("student_code", "studentCode", "code", "studentcode"),
+    "chapter": ("chapter", "chapter_name", "unit"),
+    "assignment": ("assignment", "assignmentTitle", "assignment_name", "task", "topic"),
+    "level": ("level", "student_level", "level_key"),
+}
+_PART_KEYS = ("text", "content", "value")
+
+# Short preview written next to the body by newer clients.
+PREVIEW_FIELD = "preview"
+
+# Fields requested by listing queries: everything the record picks plus the preview.
+LISTING_FIELDS = sorted(
+    {k for keys in _PICK.values() for k in keys} | set(TIMESTAMP_FIELDS) | {"_path", "path", "_ts_ms", PREVIEW_FIELD}
+)
+
+
+def make_preview(text: str) -> str:
+    """Return the :data:`PREVIEW_FIELD` value of a submission text."""
+    text = " ".join(str(text or "").split())
+    return text[:PREVIEW_CHARS] + "…" if len(text) > PREVIEW_CHARS else text
+
+
+def _pick(doc: Dict[str, Any], keys: Tuple[str, ...], default: Any = "") -> Any:
+    for k in keys:
+        v = doc.get(k)
+        if v not in (None, ""):
+            return v
+    return default
+
+
+def extract_text_from_doc(doc: Dict[str, Any]) -> str:
+    """Return the submission text of a raw document.
+
+    The first non-empty text field wins; lists of strings or ``{"text": …}``
+    parts are joined. Without any, all string values are joined.
+    """
+    for k in TEXT_FIELDS:
+        v = doc.get(k)
+        if isinstance(v, str) and v.strip():
+            return v.strip()
+        if isinstance(v, list):
+            parts = []
+            for item in v:
+                if isinstance(item, str):
+                    parts.append(item)
+                elif isinstance(item, dict):
+                    parts.extend(item[kk] for kk in _PART_KEYS if isinstance(item.get(kk), str))
+            if parts:
+                return "\n".join(parts).strip()
+        if isinstance(v, dict):
+            for kk in _PART_KEYS:
+                vv = v.get(kk)
+                if isinstance(vv, str) and vv.strip():
+                    return vv.strip()
+
+    strings = [v.strip() for v in doc.values() if isinstance(v, str) and v.strip()]
+    return "\n".join(strings).strip()
+
+
+def _parse_iso(value: str) -> int:
+    try:
+        return int(datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp() * 1000)
+    except ValueError:
+        return 0
+
+
+def timestamp_ms(doc: Dict[str, Any]) -> int:
+    """Best-effort submission time of a raw document in epoch milliseconds (0 if unknown).
+
+    Migrated documents carry it ready-made in ``_ts_ms``.
+    """
+    canonical = doc.get("_ts_ms")
+    if isinstance(canonical, int) and not isinstance(canonical, bool) and canonical > 0:
+        return canonical
+    ts = next((doc[k] for k in TIMESTAMP_FIELDS if doc.get(k)), None)
+    if ts is None or isinstance(ts, bool):
+        return 0
+    if isinstance(ts, (int, float)):
+        return int(ts if ts > 10_000_000_000 else ts * 1000)
+    if isinstance(ts, str):
+        return _parse_iso(ts)
+    if isinstance(ts, dict):
+        if "_seconds" in ts:
+            return int(int(ts.get("_seconds", 0)) * 1000 + int(ts.get("_nanoseconds", 0)) / 1_000_000)
+        value = next((ts[k] for k in ("iso", "time", "date", "datetime") if isinstance(ts.get(k), str)), "")
+        return _parse_iso(value) if value else 0
+    try:
+        # datetime and Firestore's DatetimeWithNanoseconds; older Timestamp
+        # objects expose to_datetime() or seconds/nanoseconds instead.
+        if hasattr(ts, "timestamp"):
+            return int(ts.timestamp() * 1000)
+        if hasattr(ts, "to_datetime"):
+            return int(ts.to_datetime().timestamp() * 1000)
+        if hasattr(ts, "seconds") and hasattr(ts, "nanoseconds"):
+            return int(int(ts.seconds) * 1000 + int(ts.nanoseconds) / 1_000_000)
+    except (TypeError, ValueError, OverflowError, OSError):
+        pass
+    return 0
+
+
+class Submission:
+    """One submission: picked metadata plus lazily derived fields.
+
+    Parameters
+    ----------
+    doc:
+        The raw Firestore document; it is referenced, not copied.
+    doc_id:
+        Firestore document id.
+    fallback_level:
+        Level used when the document has none (e.g. nested layouts).
+    path:
+        Document path; defaults to the document's own ``_path``/``path``
+        field or ``submissions/{doc_id}``.
+    ref:
+        Firestore document reference, used to load the body of a listing.
+    complete:
+        ``False`` when ``doc`` is a :data:`LISTING_FIELDS` projection.
+    """
+
+    __slots__ = (
+        "doc", "id", "ref", "complete", "student_name", "student_code", "chapter", "assignment", "level",
+        "path", "_text", "_preview", "_ts_ms", "_label",
+    )
+
+    def __init__(
+        self,
+        doc: Dict[str, Any],
+        doc_id: str,
+        fallback_level: str = "",
+        path: str = "",
+        ref: Any = None,
+        complete: bool = True,
+    ) -> None:
+        self.doc = doc
+        self.id = doc_id
+        self.ref = ref
+        self.complete = complete
+        self.student_name = _pick(doc, _PICK["student_name"])
+        self.student_code = _pick(doc, _PICK["student_code"])
+        self.chapter = _pick(doc, _PICK["chapter"])
+        self.assignment = _pick(doc, _PICK["assignment"])
+        self.level = _pick(doc, _PICK["level"], fallback_level)
+        own_path = doc.get("_path") or doc.get("path")
+        if not path and isinstance(own_path, str) and own_path.strip():
+            path = own_path.strip()
+        self.path = path or f"submissions/{doc_id}"
+        self._text: Optional[str] = None
+        self._preview: Optional[str] = None
+        self._ts_ms: Optional[int] = None
+        self._label: Optional[str] = None
+
+    def fill(self, doc: Dict[str, Any]) -> None:
+        """Replace a listing projection with the full document."""
+        self.doc = doc
+        self.complete = True
+        self._text = self._preview = self._label = None
+
+    @property
+    def text(self) -> str:
+        """Submission text (see :func:`extract_text_from_doc`); empty until :meth:`fill`."""
+        if not self.complete:
+            return ""
+        if self._text is None:
+            self._text = extract_text_from_doc(self.doc)
+        return self._text
+
+    @property
+    def needs_body(self) -> bool:
+        """Whether a preview needs the full document (a listing without a ``preview`` field)."""
+        return not self.complete and not str(self.doc.get(PREVIEW_FIELD) or "").strip()
+
+    @property
+    def preview(self) -> str:
+        """First :data:`PREVIEW_CHARS` characters of the text (or the ``preview`` field)."""
+        if self._preview is None:
+            text = self.text if self.complete else str(self.doc.get(PREVIEW_FIELD) or "").strip()
+            self._preview = make_preview(text)
+        return self._preview
+
+    @property
+    def ts_ms(self) -> int:
+        """Submission time in epoch milliseconds (0 if unknown)."""
+        if self._ts_ms is None:
+            self._ts_ms = timestamp_ms(self.doc)
+        return self._ts_ms
+
+    @property
+    def label(self) -> str:
+        """One-line description for pickers: time, student, assignment and preview."""
+        if self._label is None:
+            text = self.preview
+            preview = text[:LABEL_PREVIEW_CHARS] + "…" if len(text) > LABEL_PREVIEW_CHARS else text
+            when = datetime.fromtimestamp(self.ts_ms / 1000).strftime("%Y-%m-%d %H:%M")
+            self._label = (
+                f"{when} • {self.student_name} • {self.student_code} • {self.level} "
+                f"• {self.chapter} • {self.assignment} • {preview}"
+            )
+        return self._label
+
+    # Dict-style access: record fields first, then the raw document.
+    _ALIASES = {"_path": "path", "_ts_ms": "ts_ms"}
+
+    def __getitem__(self, key: str) -> Any:
+        name = self._ALIASES.get(key, key)
+        if name in _PICK or name in ("id", "path", "ts_ms"):
+            return getattr(self, name)
+        return self.doc[key]
+
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._ALIASES or key in _PICK or key in ("id", "path", "ts_ms") or key in self.doc
+
+    def __repr__(self) -> str:
+        return f"Submission({self.path!r}, {self.student_code!r}, {self.assignment!r})"
@@ -0,0 +1,197 @@
+"""In-memory stand-in for the parts of the Firestore client the scripts use.
+
+Documents live in ``FakeDB.docs`` keyed by their full path. Queries support
+``where`` (``==``, ``<``, ``>``), ``order_by`` (fields and ``__name__``,
+chained), ``select``, ``limit``, ``start_after`` (a dict of the ordered
+fields) and ``count``; batches apply their writes on ``commit`` and can be made to fail
+with ``FakeDB.fail_commit``. Transactions follow the protocol
+``firestore.transactional`` drives (begin, commit, rollback) and abort the
+first ``FakeDB.abort_transactions`` commits, so retries can be tested.
+"""
+
+import operator
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+from google.api_core.exceptions import Aborted
+
+_OPS = {"==": operator.eq, "<": operator.lt, ">": operator.gt}
+
+
+class FakeSnapshot:
+    def __init__(self, ref: "FakeDocument", data: Optional[Dict[str, Any]]) -> None:
+        self.reference = ref
+        self.id = ref.id
+        self.exists = data is not None
+        self._data = data
+
+    def to_dict(self) -> Optional[Dict[str, Any]]:
+        return dict(self._data) if self._data is not None else None
+
+
+class FakeDocument:
+    def __init__(self, db: "FakeDB", path: str) -> None:
+        self.db = db
+        self.path = path
+        self.id = path.rsplit("/", 1)[-1]
+
+    def collection(self, name: str) -> "FakeCollection":
+        return FakeCollection(self.db, f"{self.path}/{name}")
+
+    def collections(self) -> List["FakeCollection"]:
+        return [FakeCollection(self.db, f"{self.path}/{name}") for name in self.db.children(self.path)]
+
+    def get(self, transaction: Optional["FakeTransaction"] = None) -> FakeSnapshot:
+        return FakeSnapshot(self, self.db.docs.get(self.path))
+
+
+class FakeAggregation:
+    def __init__(self, query: "FakeQuery") -> None:
+        self._query = query
+
+    def get(self) -> List[List[SimpleNamespace]]:
+        return [[SimpleNamespace(value=len(self._query.stream()))]]
+
+
+class FakeQuery:
+    def __init__(self, coll: "FakeCollection", filters=(), order=(), fields=None, limit=None, after=None):
+        self._coll = coll
+        self._filters = tuple(filters)
+        self._order = tuple(order)
+        self._fields = fields
+        self._limit = limit
+        self._after = after
+
+    def _with(self, **changes) -> "FakeQuery":
+        state = dict(filters=self._filters, order=self._order, fields=self._fields, limit=self._limit, after=self._after)
+        state.update(changes)
+        return FakeQuery(self._coll, **state)
+
+    def where(self, field: str, op: str, value: Any) -> "FakeQuery":
+        return self._with(filters=self._filters + ((field, _OPS[op], value),))
+
+    def order_by(self, field: str, **_: Any) -> "FakeQuery":
+        return self._with(order=self._order + (field,))
+
+    def select(self, fields: List[str]) -> "FakeQuery":
+        return self._with(fields=list(fields))
+
+    def limit(self, n: int) -> "FakeQuery":
+        return self._with(limit=n)
+
+    def start_after(self, values: Dict[str, Any]) -> "FakeQuery":
+        return self._with(after=tuple(values[field] for field in self._order))
+
+    def count(self, alias: Optional[str] = None) -> FakeAggregation:
+        return FakeAggregation(self)
+
+    def _key(self, snap: FakeSnapshot) -> tuple:
+        return tuple(snap.id if field == "__name__" else snap.to_dict()[field] for field in self._order or ("__name__",))
+
+    def stream(self) -> List[FakeSnapshot]:
+        db, prefix = self._coll.db, self._coll.path
+        snaps = [
+            FakeSnapshot(FakeDocument(db, path), data)
+            for path, data in db.docs.items()
+            if path.rsplit("/", 1)[0] == prefix
+        ]
+        snaps = [
+            s for s in snaps
+            if all(field in s.to_dict() and op(s.to_dict()[field], value) for field, op, value in self._filters)
+            and all(field == "__name__" or field in s.to_dict() for field in self._order)
+        ]
+        snaps.sort(key=self._key)
+        if self._after is not None:
+            snaps = [s for s in snaps if self._key(s) > self._after]
+        if self._fields is not None:
+            snaps = [
+                FakeSnapshot(s.reference, {k: v for k, v in s.to_dict().items() if k in self._fields}) for s in snaps
+            ]
+        return snaps[: self._limit] if self._limit else snaps
+
+
+class FakeCollection(FakeQuery):
+    def __init__(self, db: "FakeDB", path: str) -> None:
+        super().__init__(self)
+        self.db = db
+        self.path = path
+        self.id = path.rsplit("/", 1)[-1]
+
+    def document(self, doc_id: str) -> FakeDocument:
+        return FakeDocument(self.db, f"{self.path}/{doc_id}")
+
+    def list_documents(self) -> List[FakeDocument]:
+        return [FakeDocument(self.db, f"{self.path}/{name}") for name in self.db.children(self.path)]
+
+
+class FakeBatch:
+    def __init__(self, db: "FakeDB") -> None:
+        self.db = db
+        self.ops: List = []
+
+    def set(self, ref: FakeDocument, data: Dict[str, Any]) -> None:
+        self.ops.append((ref.path, dict(data)))
+
+    def delete(self, ref: FakeDocument) -> None:
+        self.ops.append((ref.path, None))
+
+    def commit(self) -> None:
+        self.db.commits += 1
+        if self.db.commits == self.db.fail_commit:
+            raise RuntimeError("commit failed")
+        for path, data in self.ops:
+            if data is None:
+                self.db.docs.pop(path, None)
+            else:
+                self.db.docs[path] = data
+
+
+class FakeTransaction(FakeBatch):
+    _max_attempts = 5
+    _read_only = False
+
+    def __init__(self, db: "FakeDB") -> None:
+        super().__init__(db)
+        self._id = None
+
+    def _clean_up(self) -> None:
+        self.ops = []
+        self._id = None
+
+    def _begin(self, retry_id: Optional[bytes] = None) -> None:
+        self._id = b"txn"
+
+    def _commit(self) -> None:
+        if self.db.abort_transactions:
+            self.db.abort_transactions -= 1
+            raise Aborted("contention")
+        self.commit()
+        self._clean_up()
+
+    def _rollback(self) -> None:
+        self._clean_up()
+
+
+class FakeDB:
+    def __init__(self, docs: Optional[Dict[str, Dict[str, Any]]] = None) -> None:
+        self.docs: Dict[str, Dict[str, Any]] = dict(docs or {})
+        self.commits = 0
+        self.fail_commit = 0  # number of the commit that raises (0: none)
+        self.abort_transactions = 0  # transaction commits still to abort
+
+    def collection(self, name: str) -> FakeCollection:
+        return FakeCollection(self, name)
+
+    def batch(self) -> FakeBatch:
+        return FakeBatch(self)
+
+    def transaction(self) -> FakeTransaction:
+        return FakeTransaction(self)
+
+    def get_all(self, refs: List[FakeDocument]) -> List[FakeSnapshot]:
+        return [ref.get() for ref in refs]
+
+    def children(self, path: str) -> List[str]:
+        """Return the names directly below ``path`` that hold documents."""
+        prefix = f"{path}/"
+        return sorted({p[len(prefix):].split("/", 1)[0] for p in self.docs if p.startswith(prefix)})
@@ -0,0 +1,73 @@
+import asyncio
+from types import SimpleNamespace
+
+import openai
+
+from ai_feedback_utils import generate_feedback_async, jobs_from_grade, serve_stub
+from cache_utils import FeedbackCache
+from marking_utils import grade_class
+
+KEY = {1: "Wasser", 2: "Kaffee"}
+TEXTS = ["1. Waser\n2. Kaffee", "1. Wasser\n2. Tee"]
+
+
+class FakeClient:
+    """Answers chat completions with the submission's first line, or fails."""
+
+    def __init__(self, fail_on=""):
+        self.calls = 0
+        self.fail_on = fail_on
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, model, messages, **kwargs):
+        self.calls += 1
+        user = messages[-1]["content"]
+        if self.fail_on and self.fail_on in user:
+            raise asyncio.TimeoutError()
+        line = user.split("Student submission:\n")[1].splitlines()[0]
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=f"About {line}"))])
+
+
+def run(jobs, client, cache=None):
+    return asyncio.run(generate_feedback_async(jobs, client, cache=cache, retries=0))
+
+
+def test_one_failure_does_not_abort_the_batch():
+    jobs = jobs_from_grade(grade_class(TEXTS, KEY), TEXTS, "A1 Drinks", ["A1", "A1"])
+    assert run(jobs, FakeClient(fail_on="Tee")) == ["About 1. Waser", None]
+
+
+def test_cache_follows_the_marking(tmp_path):
+    cache = FeedbackCache(str(tmp_path / "cache.sqlite3"))
+    strict = jobs_from_grade(grade_class(TEXTS, KEY), TEXTS, "A1 Drinks", ["A1", "A1"])
+    client = FakeClient()
+    run(strict, client, cache)
+    run(strict, client, cache)
+    assert client.calls == 2
+
+    tolerant = jobs_from_grade(grade_class(TEXTS, KEY, tolerant=True), TEXTS, "A1 Drinks", ["A1", "A1"])
+    run(tolerant, client, cache)
+    assert client.calls == 4
+
+    corrected = jobs_from_grade(grade_class(TEXTS, {1: "Wasser", 2: "Tee"}), TEXTS, "A1 Drinks", ["A1", "A1"])
+    run(corrected, client, cache)
+    assert client.calls == 6
+
+
+def test_real_client_retries_stub_rate_limits():
+    server = serve_stub(fail_every=2)
+    jobs = jobs_from_grade(grade_class(TEXTS, KEY), TEXTS, "A1 Drinks", ["A1", "A1"])
+
+    async def main(retries):
+        base_url = f"http://127.0.0.1:{server.server_port}/v1"
+        async with openai.AsyncOpenAI(api_key="stub", base_url=base_url, max_retries=0) as client:
+            return await generate_feedback_async(jobs, client, concurrency=1, retries=retries, backoff=0.01)
+
+    try:
+        # Every second request gets a 429: request 2 is retried as 3, request 4 is lost without retries.
+        assert asyncio.run(main(retries=1)) == ["Stub feedback (Score: 1 of 2 correct)."] * 2
+        assert server.RequestHandlerClass._count == 3
+        assert asyncio.run(main(retries=0)) == [None, "Stub feedback (Score: 1 of 2 correct)."]
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,34 @@
+from analysis_utils import ItemAnalysisStore
+from marking_utils import grade_class
+
+KEY = {3: "Kopf", 5: "Bauch", 7: "Katze"}
+
+
+def test_record_keeps_grade_per_question_number(tmp_path):
+    store = ItemAnalysisStore(str(tmp_path / "items.jsonl"))
+    graded = grade_class(["3. Kopf\n5. Bauhc\n7. Hund", "3. Kopf\n5. Bauch\n7. Katze"], KEY, tolerant=True)
+    store.record("submissions/a", "A1 Body", "a1", graded, 0, studentcode="kofi")
+    store.record("submissions/b", "A1 Body", "a1", graded, 1, studentcode="ama")
+
+    m = store.matrix("A1 Body")
+    assert m.questions.tolist() == [3, 5, 7]
+    assert m.correct.tolist() == [[True, True, False], [True, True, True]]
+    assert m.near.tolist() == [[False, True, False], [False, False, False]]
+    assert m.records[0]["wrong"] == {"7": "Hund"}
+
+    stats = store.question_stats("A1 Body").set_index("question")
+    assert stats.loc[5, "pct_correct"] == 100.0
+    assert stats.loc[5, "pct_near"] == 50.0
+    assert stats.loc[7, "top_wrong"] == "hund (1)"
+
+
+def test_records_survive_reload_and_key_changes(tmp_path):
+    path = str(tmp_path / "items.jsonl")
+    store = ItemAnalysisStore(path)
+    store.record("submissions/a", "A1 Body", "A1", grade_class(["3. Kopf\n5. Bauch"], KEY), 0)
+    store.record("submissions/b", "A1 Body", "A1", grade_class(["5. Bauch\n9. Maus"], {5: "Bauch", 9: "Maus"}), 0)
+
+    m = ItemAnalysisStore(path).matrix("A1 Body")
+    assert m.questions.tolist() == [3, 5, 7, 9]
+    assert m.asked.tolist() == [[True, True, True, False], [False, True, False, True]]
+    assert m.correct.tolist() == [[True, True, False, False], [False, True, False, True]]
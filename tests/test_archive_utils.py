@@ -0,0 +1,85 @@
+import os
+
+import pytest
+
+from archive_utils import SubmissionArchive, archive_old_submissions
+from fake_firestore import FakeDB
+
+DAY_MS = 86400 * 1000
+NOW = 1_720_000_000  # 2024-07-03
+OLD = (NOW - 400 * 86400) * 1000
+
+
+def sample_docs():
+    return {
+        "submissions/old1": {"studentCode": "s1", "level": "A1", "content": "Ich heiße Ama.", "_ts_ms": OLD},
+        "submissions/old2": {"studentCode": "s1", "level": "A1", "content": "Ich wohne in Accra.", "_ts_ms": OLD + DAY_MS},
+        "submissions/old3": {"studentCode": "s2", "level": "B1", "content": "Grüße", "_ts_ms": OLD + 2 * DAY_MS},
+        "submissions/new1": {"studentCode": "s1", "level": "A1", "content": "Neu", "_ts_ms": NOW * 1000},
+    }
+
+
+@pytest.fixture
+def archive(tmp_path):
+    return SubmissionArchive(str(tmp_path))
+
+
+def run(db, archive, **kwargs):
+    return archive_old_submissions(db, archive, older_than_days=365, batch_size=2, now=NOW, **kwargs)
+
+
+def test_requires_an_existing_directory(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        SubmissionArchive(str(tmp_path / "missing"))
+    with pytest.raises(FileNotFoundError):
+        SubmissionArchive("")
+
+
+def test_moves_old_submissions(archive):
+    db = FakeDB(sample_docs())
+    moved = run(db, archive)
+    assert moved == {"A1": 2, "B1": 1}
+    assert sorted(db.docs) == ["submissions/new1"]
+    assert len(archive) == 3
+    found = archive.find("s1", "A1")
+    assert [s.id for s in found] == ["old2", "old1"]
+    assert found[0].doc == sample_docs()["submissions/old2"]
+    assert archive.verify(found) == []
+
+
+def test_dry_run_deletes_nothing(archive):
+    db = FakeDB(sample_docs())
+    assert run(db, archive, dry_run=True) == {"A1": 2, "B1": 1}
+    assert db.docs == sample_docs()
+    assert len(archive) == 0
+
+
+def test_unverified_page_is_not_deleted(archive, monkeypatch):
+    write = archive.write
+
+    def lossy_write(subs):
+        n = write(subs)
+        shard_dir = os.path.join(archive.root, "A1")  # the first page holds old1 and old2
+        for name in os.listdir(shard_dir):
+            open(os.path.join(shard_dir, name), "wb").close()  # the shard write was lost
+        return n
+
+    monkeypatch.setattr(archive, "write", lossy_write)
+    db = FakeDB(sample_docs())
+    with pytest.raises(RuntimeError):
+        run(db, archive)
+    assert db.docs == sample_docs()
+    assert db.commits == 0
+
+
+def test_rerun_after_failed_delete(archive):
+    db = FakeDB(sample_docs())
+    db.fail_commit = 1
+    with pytest.raises(RuntimeError):
+        run(db, archive)
+    assert db.docs == sample_docs()
+
+    db.fail_commit = 0
+    assert run(db, archive) == {"A1": 2, "B1": 1}
+    assert sorted(db.docs) == ["submissions/new1"]
+    assert len(archive) == 3
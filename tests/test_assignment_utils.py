@@ -0,0 +1,48 @@
+import json
+import os
+
+import pytest
+
+from assignment_utils import AssignmentIndex
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope="module")
+def index():
+    with open(os.path.join(ROOT, "answers_dictionary.json"), encoding="utf-8") as f:
+        return AssignmentIndex(json.load(f).keys())
+
+
+@pytest.mark.parametrize(
+    "assignment, level, key",
+    [
+        ("Lesen und Horen 5", "A1", "A1 German Cases 5"),
+        ("Lesen und Hören 5", "A1", "A1 German Cases 5"),
+        ("lesen und hoeren 5", "a1", "A1 German Cases 5"),
+        ("1.1 small talk", "A2", "A2 1.1 Small Talk"),
+        ("1.1", "A1", "A1 Personal Pronouns 1.1"),
+        ("Chapter 7", "A1", "A1 12 Hour Clock 7"),
+        ("Möbel und Räume kennenlernen", "", "A2 3.6 Möbel und Räume kennenlernen"),
+        ("Moebel und Raeume kennenlernen", "A2", "A2 3.6 Möbel und Räume kennenlernen"),
+        ("Mobel und Raume kennenlernen", "A2", "A2 3.6 Möbel und Räume kennenlernen"),
+    ],
+)
+def test_resolves_to_dictionary_key(index, assignment, level, key):
+    assert index.resolve(assignment, "", level).key == key
+
+
+def test_exact_and_unmatched(index):
+    assert index.resolve("A2 1.1 Small Talk").method == "exact"
+    assert index.resolve("hour clock", chapter="7").key == "A1 12 Hour Clock 7"
+    assert index.resolve("xyz") is None
+    assert index.resolve("") is None
+
+
+def test_memo_is_bounded():
+    index = AssignmentIndex(["A1 Numbers 2", "A1 German Cases 5"], max_memo=2)
+    for label in ("Numbers", "German Cases", "Lesen und Horen 5"):
+        index.resolve(label, "", "A1")
+    assert list(index._memo) == [("German Cases", "", "A1"), ("Lesen und Horen 5", "", "A1")]
+    index.add("A1 Food 10")
+    assert not index._memo
@@ -0,0 +1,41 @@
+import sqlite3
+
+from cache_utils import GradingCache, grade_with_cache, key_version, text_hash
+from marking_utils import grade_class
+
+KEY = {1: "Kopf", 2: "Bauch", 3: "Hund"}
+TEXTS = ["1. Kopf\n2. Bauhc\n3. Hund", "1. Kopf\n2. Bauch\n3. Katze", "1. Kopf"]
+
+
+def test_hits_match_fresh_grading(tmp_path):
+    cache = GradingCache(str(tmp_path / "cache.sqlite3"))
+    first, hits = grade_with_cache(TEXTS[:2], KEY, "A1 Body", cache, tolerant=True)
+    assert hits == [False, False]
+
+    again, hits = grade_with_cache(TEXTS, KEY, "A1 Body", cache, tolerant=True)
+    assert hits == [True, True, False]
+    fresh = grade_class(TEXTS, KEY, tolerant=True)
+    assert again.scores.tolist() == fresh.scores.tolist() == [100, 67, 33]
+    assert [again.feedback(i) for i in range(3)] == [fresh.feedback(i) for i in range(3)]
+    assert again.near_items(0) == [2]
+
+
+def test_key_version_invalidates():
+    assert key_version(KEY) == key_version(dict(reversed(list(KEY.items()))))
+    assert key_version(KEY) != key_version({**KEY, 3: "Katze"})
+    assert key_version(KEY) != key_version(KEY, tolerant=True)
+
+    cache = GradingCache(":memory:")
+    grade_with_cache(TEXTS, KEY, "A1 Body", cache)
+    _, hits = grade_with_cache(TEXTS, KEY, "A1 Other", cache)
+    assert hits == [False] * 3
+    graded, hits = grade_with_cache(TEXTS, {**KEY, 3: "Katze"}, "A1 Body", cache)
+    assert hits == [False] * 3
+    assert graded.scores.tolist() == [33, 100, 33]
+
+
+def test_stores_only_wrong_answers(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    grade_with_cache(TEXTS[1:2], KEY, "A1 Body", GradingCache(path))
+    rows = sqlite3.connect(path).execute("SELECT text_hash, wrong FROM wrong_answers").fetchall()
+    assert rows == [(text_hash(TEXTS[1]), '[[3, "Hund", "Katze"]]')]
@@ -0,0 +1,13 @@
+from essay_utils import prescore_essays
+
+
+def test_real_words_are_not_umlaut_misses():
+    text = "Ich hatte schon Hunger, aber es wurde spät. Das ware gut."
+    row = prescore_essays([text], ["A1"]).iloc[0]
+    assert row["umlaut_misses"] == 0
+
+
+def test_spelled_out_umlauts_are_counted():
+    text = "Vielen Dank fuer die Einladung. Es war schoen, ich moechte wieder kommen."
+    row = prescore_essays([text], ["A1"], phrases=["Einladung"]).iloc[0]
+    assert row["umlaut_misses"] == 3
@@ -0,0 +1,35 @@
+import pytest
+
+from feedback_utils import TEMPLATES, count_words, render_feedback
+
+LONG = " ".join(["sehr"] * 80)
+CASES = {
+    "perfect": (10, []),
+    "one wrong": (9, [(3, "Kopf", "Kopp")]),
+    "blank": (9, [(3, "Kopf", "")]),
+    "many wrong": (2, [(n, f"Antwort {n}", f"falsch {n}") for n in range(1, 9)]),
+    "long answer": (9, [(3, "Kopf", LONG)]),
+    "long reference": (9, [(3, LONG, "Kopf")]),
+    "long answers later": (8, [(3, "Kopf", "Kopp"), (4, "Bauch", LONG)]),
+}
+
+
+@pytest.mark.parametrize("level, fmt", [(level or "A1", fmt) for level, fmt in TEMPLATES])
+@pytest.mark.parametrize("case", CASES)
+def test_stays_within_40_to_60_words(level, fmt, case):
+    correct, wrong = CASES[case]
+    text = render_feedback(correct, 10, wrong, level=level, fmt=fmt)
+    assert 40 <= count_words(text) <= 60, text
+
+
+def test_long_first_item_is_shortened_not_dropped():
+    text = render_feedback(9, 10, [(3, "Kopf", LONG)], level="A1")
+    assert "3→Kopf (you wrote sehr" in text and "…)" in text
+
+
+def test_near_misses_are_listed_separately():
+    text = render_feedback(10, 10, [], level="A1", near=[(5, "Bauch", "Bauhc")])
+    assert "Mind the spelling of: 5→Bauch (you wrote Bauhc)." in text
+    assert 40 <= count_words(text) <= 60
+    crowded = render_feedback(2, 10, CASES["many wrong"][1], level="A1", near=[(9, LONG, "x")])
+    assert "Mind the spelling" not in crowded and count_words(crowded) <= 60
@@ -0,0 +1,25 @@
+from fake_firestore import FakeDB
+from firebase_utils import submission_counts
+
+
+def sub(level, status=None):
+    doc = {"level": level, "content": "Text"}
+    if status is not None:
+        doc["status"] = status
+    return doc
+
+
+def test_counts_per_level_and_status():
+    docs = [sub("A1", "pending"), sub("A1", "pending"), sub("A1", "marked"), sub("A1", "draft"), sub("A1"),
+            sub("A2", "marked"), sub("B1", "pending")]
+    db = FakeDB({f"submissions/d{i}": doc for i, doc in enumerate(docs)})
+    table = submission_counts(db, ["A1", " A2 ", "A1", ""], ["pending", "marked"]).set_index("level")
+    assert list(table.index) == ["A1", "A2", "All"]
+    assert table.loc["A1"].tolist() == [5, 2, 1, 2]
+    assert table.loc["A2"].tolist() == [1, 0, 1, 0]
+    assert table.loc["All"].tolist() == [6, 2, 2, 2]  # B1 is not listed, so not counted
+
+
+def test_no_levels():
+    table = submission_counts(FakeDB({"submissions/d0": sub("A1")}), [], ["pending"])
+    assert table.to_dict("records") == [{"level": "All", "total": 0, "pending": 0, "other": 0}]
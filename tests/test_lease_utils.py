@@ -0,0 +1,72 @@
+import pytest
+
+import lease_utils
+from fake_firestore import FakeDB
+from lease_utils import FirestoreLeaseStore, LeaseStore, LocalLeaseStore, lease_owner, owner_name
+
+AMA = lease_owner("Ama", "tab1")
+AMA_ELSEWHERE = lease_owner("Ama", "tab2")
+KOFI = lease_owner("Kofi", "tab3")
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(lease_utils.time, "time", lambda: now[0])
+    return now
+
+
+@pytest.fixture(params=["local", "firestore"])
+def store(request, tmp_path, clock):
+    if request.param == "local":
+        return LocalLeaseStore(str(tmp_path / "leases.sqlite3"))
+    return FirestoreLeaseStore(FakeDB())
+
+
+def test_interface_is_abstract():
+    with pytest.raises(TypeError):
+        LeaseStore()
+
+
+def test_claim_and_conflict(store):
+    assert store.claim("submissions/1", AMA, ttl=60)
+    assert store.claim("submissions/1", AMA, ttl=60)  # re-claiming your own lease
+    assert not store.claim("submissions/1", KOFI, ttl=60)
+    assert not store.claim("submissions/1", AMA_ELSEWHERE, ttl=60)
+    assert store.holders(["submissions/1", "submissions/2"]) == {"submissions/1": (AMA, 1060.0)}
+    assert owner_name(store.holders(["submissions/1"])["submissions/1"][0]) == "Ama"
+
+
+def test_expiry_and_renew(store, clock):
+    assert store.claim("submissions/1", AMA, ttl=60)
+    clock[0] += 30
+    assert store.renew("submissions/1", AMA, ttl=60)
+    clock[0] += 59
+    assert not store.claim("submissions/1", KOFI, ttl=60)
+    clock[0] += 2
+    assert store.holders(["submissions/1"]) == {}
+    assert store.claim("submissions/1", KOFI, ttl=60)
+    assert not store.renew("submissions/1", AMA, ttl=60)
+
+
+def test_release_and_claim_next(store):
+    assert store.claim("submissions/1", AMA)
+    store.release("submissions/1", KOFI)  # not Kofi's lease
+    assert "submissions/1" in store.holders(["submissions/1"])
+    assert store.claim_next(["submissions/1", "submissions/2"], KOFI) == "submissions/2"
+    store.release("submissions/1", AMA)
+    assert store.claim("submissions/1", KOFI)
+    assert store.claim_next(["submissions/1", "submissions/2"], AMA) is None
+
+
+def test_firestore_transactions_retry_on_contention(clock):
+    db = FakeDB()
+    store = FirestoreLeaseStore(db)
+    db.abort_transactions = 2
+    assert store.claim("submissions/1", AMA, ttl=60)
+    assert db.abort_transactions == 0
+    assert store.holders(["submissions/1"]) == {"submissions/1": (AMA, 1060.0)}
+    db.abort_transactions = 1
+    assert not store.claim("submissions/1", KOFI, ttl=60)
+    store.release("submissions/1", AMA)
+    assert store.holders(["submissions/1"]) == {}
@@ -0,0 +1,36 @@
+import pytest
+
+from marking_utils import CompiledKey, compile_key, grade_class, grade_from_wrong_answers, objective_mark
+
+KEY = {1: "Kopf", 2: "Bauch", 3: "Richtig", 4: "B) Sparkasse", 5: "Grüße"}
+TEXTS = [
+    "1. Kopf\n2. Bauch\n3. true\n4. B\n5. Gruesse",
+    "1) kopf 2) Bach 3) Falsch",
+    "Teil 1\n1. Kopf\n2. Bauch\nTeil 2\n1. richtig\n2. Sparkasse\n3. Grüsse",
+    "",
+    "q1 = Kopf\nq5 = Grusse\nq4 - C",
+]
+
+
+@pytest.mark.parametrize("i", range(len(TEXTS)))
+def test_grade_class_matches_objective_mark(i):
+    graded = grade_class(TEXTS, KEY)
+    assert (int(graded.scores[i]), graded.feedback(i)) == objective_mark(TEXTS[i], KEY)
+
+
+def test_rebuilt_grade_matches():
+    graded = grade_class(TEXTS, KEY)
+    rebuilt = grade_from_wrong_answers(KEY, [graded.wrong_answers(i) for i in range(len(TEXTS))])
+    assert rebuilt.scores.tolist() == graded.scores.tolist()
+    assert [rebuilt.feedback(i) for i in range(len(TEXTS))] == [graded.feedback(i) for i in range(len(TEXTS))]
+
+
+def test_vocabulary_is_trimmed_between_batches(monkeypatch):
+    monkeypatch.setattr(CompiledKey, "max_tokens", 10)
+    key = {1: "Hund", 2: "Katze"}
+    first = grade_class([f"1. Hund\n2. Wort{i}" for i in range(12)], key)
+    assert len(compile_key(key).tokens) > 10
+    second = grade_class(["1. Hund\n2. Katze", "1. Maus\n2. Katze"], key)
+    assert len(compile_key(key).tokens) == 3
+    assert second.scores.tolist() == [100, 50]
+    assert first.question_stats()["top_wrong"].tolist() == ["", "wort0"]
@@ -0,0 +1,80 @@
+import json
+
+import pytest
+
+from fake_firestore import FakeDB
+from migrate_utils import migrate, target_id
+
+
+def sample_docs():
+    return {
+        "submissions/f1": {"student_code": "s1", "level": "A1", "assignment": "1.1", "timestamp": "2024-03-01T10:00:00Z"},
+        "submissions/f2": {
+            "studentCode": "s2", "level": "A2", "assignment": "2.1", "content": "Hallo", "preview": "Hallo",
+            "_ts_ms": 1709287200000,
+        },
+        "submissions/A1/s3/n1": {"assignment": "1.2", "content": "Ich bin", "timestamp": "2024-03-02T10:00:00Z"},
+        "submissions/A1/s3/n2": {"assignment": "1.3", "content": "Du bist", "timestamp": "2024-03-03T10:00:00Z"},
+        "submissions/A1/posts/p1": {"studentCode": "s4", "assignment": "1.4", "timestamp": "2024-03-04T10:00:00Z"},
+        "submissions/A1/draftv2/d1": {"studentCode": "s5", "content": "draft"},
+    }
+
+
+def migrated(**kwargs):
+    db = FakeDB(sample_docs())
+    migrate(db, batch_size=1, log=lambda _: None, **kwargs)
+    return db.docs
+
+
+def test_moves_and_rewrites():
+    docs = migrated(delete_source=True)
+    moved = docs[f"submissions/{target_id('submissions/A1/s3/n1')}"]
+    assert moved["studentCode"] == "s3" and moved["level"] == "A1"
+    assert moved["migratedFrom"] == "submissions/A1/s3/n1"
+    assert moved["preview"] == "Ich bin"
+    assert "preview" not in docs["submissions/f1"]  # no text field to preview
+    assert docs["submissions/f1"]["studentCode"] == "s1" and "student_code" not in docs["submissions/f1"]
+    assert "submissions/A1/s3/n1" not in docs and "submissions/A1/posts/p1" not in docs
+    assert "submissions/A1/draftv2/d1" in docs
+
+
+def test_dry_run_writes_nothing(tmp_path):
+    db = FakeDB(sample_docs())
+    checkpoint = tmp_path / "checkpoint.json"
+    report = migrate(db, batch_size=1, checkpoint_path=str(checkpoint), dry_run=True, log=lambda _: None)
+    assert db.docs == sample_docs()
+    assert db.commits == 0
+    assert not checkpoint.exists()
+    assert report.counts[("flat", "rewritten")] == 1
+    assert report.counts[("flat", "unchanged")] == 1
+    assert report.counts[("nested", "moved")] == 2
+    assert report.counts[("posts", "moved")] == 1
+
+
+def test_resumes_from_checkpoint(tmp_path):
+    checkpoint = tmp_path / "checkpoint.json"
+    db = FakeDB(sample_docs())
+    db.fail_commit = 4  # f1, p1, n1, then n2 fails
+    with pytest.raises(RuntimeError):
+        migrate(db, batch_size=1, checkpoint_path=str(checkpoint), delete_source=True, log=lambda _: None)
+    state = json.loads(checkpoint.read_text())
+    assert state["done"] == ["submissions", "submissions/A1/posts"]
+    assert state["cursors"] == {"submissions/A1/s3": "n1"}
+
+    db.fail_commit = 0
+    commits_before = db.commits
+    migrate(db, batch_size=1, checkpoint_path=str(checkpoint), delete_source=True, log=lambda _: None)
+    assert db.commits - commits_before == 1  # only n2 is written again
+    assert db.docs == migrated(delete_source=True)
+
+
+def test_second_run_changes_nothing():
+    db = FakeDB(sample_docs())
+    migrate(db, batch_size=1, delete_source=True, log=lambda _: None)
+    after_first = {path: dict(doc) for path, doc in db.docs.items()}
+    commits_before = db.commits
+
+    report = migrate(db, batch_size=1, delete_source=True, log=lambda _: None)
+    assert db.docs == after_first
+    assert db.commits == commits_before
+    assert set(outcome for _, outcome in report.counts) == {"unchanged"}
@@ -0,0 +1,87 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import prefetch_utils
+from prefetch_utils import Prefetcher, start_loads
+
+
+class Loader:
+    def __init__(self):
+        self.calls = []
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def __call__(self, level, code):
+        self.calls.append((level, code))
+        self.gate.wait(5)
+        if code == "bad":
+            raise RuntimeError("Firestore unavailable")
+        return [f"{level}/{code}/{len(self.calls)}"]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(prefetch_utils.time, "time", lambda: now[0])
+    return now
+
+
+def test_serves_fresh_values_until_ttl(clock):
+    fetch = Loader()
+    cache = Prefetcher(fetch, ttl=60)
+    assert cache.get("A1", "s1") == ["A1/s1/1"]
+    clock[0] += 59
+    assert cache.get("A1", "s1") == ["A1/s1/1"]
+    clock[0] += 2
+    assert cache.get("A1", "s1") == ["A1/s1/2"]
+
+
+def test_invalidate(clock):
+    fetch = Loader()
+    cache = Prefetcher(fetch, ttl=60)
+    cache.get("A1", "s1")
+    cache.get("A1", "s2")
+    cache.invalidate("A1", "s1")
+    assert cache.get("A1", "s1") == ["A1/s1/3"]
+    assert cache.get("A1", "s2") == ["A1/s2/2"]
+    cache.invalidate()
+    assert cache.get("A1", "s2") == ["A1/s2/4"]
+
+
+def test_get_waits_for_in_flight_prefetch():
+    fetch = Loader()
+    fetch.gate.clear()
+    cache = Prefetcher(fetch, ttl=60)
+    cache.prefetch([("A1", "s1"), ("A1", "s1")])
+    threading.Timer(0.1, fetch.gate.set).start()
+    assert cache.get("A1", "s1") == ["A1/s1/1"]  # blocks on the prefetch
+    assert fetch.calls == [("A1", "s1")]
+
+
+def test_prefetch_error_is_raised_by_get_and_not_cached():
+    fetch = Loader()
+    fetch.gate.clear()
+    cache = Prefetcher(fetch, ttl=60)
+    cache.prefetch([("A1", "bad")])
+    fetch.gate.set()
+    with pytest.raises(RuntimeError, match="Firestore unavailable"):
+        cache.get("A1", "bad")
+    with pytest.raises(RuntimeError):
+        cache.get("A1", "bad")  # fetched again, not served from a cached failure
+    assert len(fetch.calls) == 2
+
+
+def test_keeps_at_most_max_entries(clock):
+    cache = Prefetcher(Loader(), ttl=60, max_entries=2)
+    for code in ("s1", "s2", "s3"):
+        clock[0] += 1
+        cache.get("A1", code)
+    assert sorted(cache._values) == [("A1", "s2"), ("A1", "s3")]
+
+
+def test_start_loads_returns_a_future_per_load():
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        futures = start_loads(pool, {"one": lambda: 1, "two": lambda: 2})
+        assert {name: f.result() for name, f in futures.items()} == {"one": 1, "two": 2}
@@ -0,0 +1,68 @@
+import numpy as np
+
+from progress_utils import MISSING, ProgressBoard, ProgressMatrix
+
+KEYS = ["A1 Greetings 0.1", "A1 German Cases 5", "A1 Numbers 2", "A2 Small Talk 1.1"]
+LEGACY = {"lesen und horen 5": "A1 German Cases 5", "lesen und hören 5": "A1 German Cases 5"}
+
+
+def resolve(assignment, level):
+    return LEGACY.get(assignment.lower(), "")
+
+
+def row(code, assignment, score, level="A1", name=""):
+    return {"studentcode": code, "name": name, "assignment": assignment, "score": score, "level": level}
+
+
+def test_update_sets_latest_score():
+    matrix = ProgressMatrix(["A1 Numbers 2"])
+    matrix.update("s1", "Ama", "A1 Numbers 2", 60)
+    matrix.update("S1 ", "", "a1  numbers 2", "85")
+    matrix.update("s1", "", "A1 Numbers 2", "not a score")
+    assert matrix.students == [("s1", "Ama")]
+    assert matrix.page(0, 10)["A1 Numbers 2"].tolist() == [85]
+
+
+def test_grows_past_initial_shape():
+    matrix = ProgressMatrix()
+    for i in range(40):
+        matrix.update(f"s{i}", "", f"Task {i % 20}", i)
+    assert len(matrix.students) == 40 and len(matrix.assignments) == 20
+    assert matrix.scores.shape[0] >= 40 and matrix.scores.shape[1] >= 20
+    assert matrix.scores[39, matrix.column("Task 19")] == 39
+    assert matrix.scores[0, matrix.column("Task 19")] == MISSING
+
+
+def test_columns_in_natural_order_and_paging():
+    matrix = ProgressMatrix(["Task 10", "Task 2", "Task 1.2"])
+    for i in range(5):
+        matrix.update(f"s{i}", f"Student {i}", "Task 2", 50 + i)
+    page = matrix.page(1, 2)
+    assert list(page.columns) == ["studentcode", "name", "Task 1.2", "Task 2", "Task 10"]
+    assert page["studentcode"].tolist() == ["s2", "s3"]
+    assert page["Task 2"].tolist() == [52, 53]
+    assert np.isnan(page["Task 10"]).all()
+    assert len(matrix.page(2, 2)) == 1
+    assert matrix.completion() == 5 / 15
+
+
+def test_board_resolves_labels_to_dictionary_keys():
+    board = ProgressBoard(KEYS, resolve=resolve)
+    board.update_many([
+        row("s1", "Lesen und Horen 5", 70),
+        row("s2", "Lesen und Hören 5", 80),
+        row("s3", "A1 Numbers 2", 90),
+        row("s4", "Unknown task", 50),
+    ])
+    a1 = board.matrix("A1")
+    assert a1.assignments == ["A1 Greetings 0.1", "A1 German Cases 5", "A1 Numbers 2", "Unknown task"]
+    assert a1.page(0, 10)["A1 German Cases 5"].tolist()[:2] == [70, 80]
+    assert board.matrix("a2").assignments == ["A2 Small Talk 1.1"]
+
+
+def test_board_skips_rows_without_level():
+    board = ProgressBoard(KEYS, resolve=resolve)
+    board.update(row("s1", "A1 Numbers 2", 70, level=""))
+    board.update(row("s1", "A1 Numbers 2", 75, level=" a1 "))
+    assert list(board.levels) == ["A1"]
+    assert board.matrix("A1").page(0, 10)["A1 Numbers 2"].tolist() == [75]
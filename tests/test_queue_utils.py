@@ -0,0 +1,46 @@
+from queue_utils import WorkQueue
+from test_scores_utils import LEGACY_ROWS, dictionary_resolver, make_mirror
+
+
+def submission(path, code, assignment, ts, level="A1"):
+    return {"_path": path, "student_code": code, "assignment": assignment, "level": level, "_ts_ms": ts}
+
+
+def make_queue(tmp_path):
+    mirror = make_mirror(tmp_path, LEGACY_ROWS, dictionary_resolver())
+    resolve = dictionary_resolver()
+    return WorkQueue(mirror, lambda item: resolve(item.get("assignment", ""), item.get("level", "")))
+
+
+def test_graded_legacy_attempt_is_not_queued(tmp_path):
+    queue = make_queue(tmp_path)
+    added = queue.add([
+        submission("submissions/1", "ednaa1", "Lesen und Horen 5", 1),
+        submission("submissions/2", "ednaa1", "A1 German Cases 5", 2),
+        submission("submissions/3", "ednaa1", "Lesen und Horen 6", 3),
+    ])
+    assert added == 1
+    assert [item["_path"] for item in queue.items()] == ["submissions/3"]
+
+
+def test_saving_a_score_removes_pending_items(tmp_path):
+    queue = make_queue(tmp_path)
+    queue.add([
+        submission("submissions/3", "ednaa1", "Lesen und Horen 6", 3),
+        submission("submissions/4", "kofia1", "Lesen und Horen 6", 4),
+    ])
+    queue.mirror.record({"studentcode": "ednaa1", "assignment": "A1 German Cases 6", "score": 80,
+                         "date": "2025-06-26", "level": "A1"})
+    assert queue.prune() == 1
+    assert queue.mark_graded("kofia1", "Lesen und Horen 6", "A1") == 1
+    assert len(queue) == 0
+
+
+def test_full_refresh_forgets_paths_outside_the_window(tmp_path):
+    queue = make_queue(tmp_path)
+    window = [submission(f"submissions/{i}", "ednaa1", "Lesen und Horen 5", i) for i in range(3)]
+    assert queue.add(window, full=True) == 0
+    assert queue.add(window[1:] + [submission("submissions/9", "kofia1", "Lesen und Horen 6", 9)], full=True) == 1
+    assert queue._seen == {"submissions/1", "submissions/2", "submissions/9"}
+    assert queue.add([submission("submissions/9", "kofia1", "Lesen und Horen 6", 9)]) == 0
+    assert len(queue) == 1
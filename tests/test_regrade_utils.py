@@ -0,0 +1,64 @@
+from analysis_utils import ItemAnalysisStore
+from marking_utils import build_reference_text_from_json, grade_class
+from regrade_utils import diff_answer_keys, regrade
+
+OLD = {"A1 Animals": {"answers": {"1": "C) der Hund", "2": "Bauch", "3": "Katze"}}}
+
+
+def saved_store(tmp_path, texts, tolerant=False, scores=None):
+    store = ItemAnalysisStore(str(tmp_path / "items.jsonl"))
+    ref = build_reference_text_from_json(OLD["A1 Animals"])[3]
+    graded = grade_class(texts, ref, tolerant=tolerant)
+    for i in range(len(texts)):
+        store.record(f"submissions/{i}", "A1 Animals", "A1", graded, i, studentcode=f"s{i}",
+                     score=None if scores is None else scores[i])
+    return store
+
+
+def new_key(**answers):
+    merged = dict(OLD["A1 Animals"]["answers"], **answers)
+    return {"A1 Animals": {"answers": merged}}
+
+
+def test_editing_option_text_keeps_letter_answers(tmp_path):
+    store = saved_store(tmp_path, ["1. C\n2. Bauch\n3. Katze", "1. B\n2. Bauch\n3. Maus"])
+    new = new_key(**{"1": "C) der große Hund"})
+    assert set(diff_answer_keys(OLD, new)) == {"A1 Animals"}
+    assert regrade(OLD, new, store).empty
+
+
+def test_changed_answer_regrades_from_stored_answers(tmp_path):
+    store = saved_store(tmp_path, ["1. C\n2. Bauch\n3. Katze", "1. C\n2. Hund\n3. Katze"])
+    rows = regrade(OLD, new_key(**{"2": "Hund"}), store)
+    assert rows[["submission", "score"]].values.tolist() == [["submissions/0", 67], ["submissions/1", 100]]
+    assert rows["comments"].iloc[0].startswith("Re-graded after answer key correction (100 → 67).")
+    assert store.records("A1 Animals")[0]["score"] == 67
+
+
+def test_unaffected_manual_override_is_left_alone(tmp_path):
+    store = saved_store(tmp_path, ["1. C\n2. Bauch\n3. Maus"], scores=[80])
+    assert regrade(OLD, new_key(**{"3": "Katze | Kater"}), store).empty
+    assert store.records("A1 Animals")[0]["score"] == 80
+
+
+def test_manual_override_keeps_its_adjustment(tmp_path):
+    store = saved_store(tmp_path, ["1. C\n2. Hund\n3. Maus"], scores=[50])  # computed 33
+    rows = regrade(OLD, new_key(**{"2": "Hund"}), store)
+    assert rows["score"].tolist() == [84]  # 50 + (67 - 33)
+    assert rows["review"].tolist() == [True]
+    assert rows["comments"].iloc[0].startswith("Re-graded after answer key correction (50 → 84).")
+    assert store.records("A1 Animals")[0]["score"] == 84
+
+
+def test_update_store_false_keeps_records(tmp_path):
+    store = saved_store(tmp_path, ["1. C\n2. Bauch\n3. Maus"])
+    rows = regrade(OLD, new_key(**{"3": "Maus"}), store, update_store=False)
+    assert rows["score"].tolist() == [100] and rows["review"].tolist() == [False]
+    assert store.records("A1 Animals")[0]["score"] == 67
+
+
+def test_tolerant_markings_stay_tolerant(tmp_path):
+    store = saved_store(tmp_path, ["1. C\n2. Hunt\n3. Katze"], tolerant=True)
+    rows = regrade(OLD, new_key(**{"2": "Hund"}), store)
+    assert rows["score"].tolist() == [100]
+    assert store.records("A1 Animals")[0]["near"] == [2]
@@ -0,0 +1,62 @@
+from rules_utils import answer_key, bounded_distance, compile_rule
+
+
+def accepts(entry, answer):
+    return compile_rule(entry).matches(answer_key(answer))
+
+
+def test_item_label_and_prompt_are_not_answers():
+    assert accepts("a. Head – Kopf", "Kopf")
+    for wrong in ("a", "A", "Head", "Head – Kopf"):
+        assert not accepts("a. Head – Kopf", wrong)
+
+    assert accepts("j. Stomach / Belly – Bauch", "Bauch")
+    for wrong in ("j", "Stomach", "Belly"):
+        assert not accepts("j. Stomach / Belly – Bauch", wrong)
+
+
+def test_only_answer_side_of_dash():
+    assert accepts("16 – sechzehn", "sechzehn")
+    assert not accepts("16 – sechzehn", "16")
+
+    assert accepts("Das Wohnzimmer – the living room", "Das Wohnzimmer")
+    assert not accepts("Das Wohnzimmer – the living room", "the living room")
+
+
+def test_multiple_choice_options():
+    assert accepts("C) Guten Morgen", "C")
+    assert accepts("C) Guten Morgen", "guten morgen")
+    assert not accepts("C) Guten Morgen", "B")
+    assert accepts("a) Barzahlung (cash)", "A")
+    assert accepts("a) Barzahlung (cash)", "Barzahlung")
+    assert accepts("B. Sparkasse", "B")
+    assert accepts("C Anna", "C")
+    assert accepts("A) K", "K")
+    assert not accepts("A) B", "B")
+
+
+def test_label_prefix_is_not_accepted():
+    assert accepts("Frage 1: Anzeige A", "A")
+    assert accepts("Frage 1: Anzeige A", "Anzeige A")
+    assert not accepts("Frage 1: Anzeige A", "B")
+    assert accepts("Links abbiegen: 'Biegen Sie links ab'", "Biegen Sie links ab")
+    assert not accepts("Links abbiegen: 'Biegen Sie links ab'", "Links abbiegen")
+
+
+def test_near_misses():
+    rule = compile_rule("Wasser")
+    assert rule.near(answer_key("Waser"))
+    assert rule.near(answer_key("Wassre"))
+    assert not rule.near(answer_key("Kaffee"))
+    assert not rule.near(answer_key("Wasser"[:3]))
+    long_rule = compile_rule("Schokoladenkuchen")
+    assert long_rule.near(answer_key("Schokoladekuhcen"))
+    assert not long_rule.near(answer_key("Schokoladenkeks"))
+    assert not compile_rule("C) Guten Morgen").near(answer_key("C"))
+
+
+def test_bounded_distance_with_shared_ends():
+    assert bounded_distance("wasser", "waser", 1) == 1
+    assert bounded_distance("abcdef", "abdcef", 1) == 1
+    assert bounded_distance("aaaa", "aaaaaa", 1) == 2
+    assert bounded_distance("schule", "schuhe", 2) == 1
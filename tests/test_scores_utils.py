@@ -0,0 +1,91 @@
+import json
+import os
+
+import pandas as pd
+
+import scores_utils
+from assignment_utils import AssignmentIndex
+from scores_utils import ScoresMirror
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def dictionary_resolver():
+    with open(os.path.join(ROOT, "answers_dictionary.json"), encoding="utf-8") as f:
+        index = AssignmentIndex(json.load(f).keys())
+    return lambda assignment, level: getattr(index.resolve(assignment, "", level), "key", "")
+
+
+def make_mirror(tmp_path, rows, resolve=None):
+    seed = tmp_path / "seed.csv"
+    pd.DataFrame(rows).to_csv(seed, index=False)
+    return ScoresMirror(str(tmp_path / "mirror.csv"), seed_path=str(seed), resolve=resolve)
+
+
+LEGACY_ROWS = [
+    {"StudentCode": "ednaa1", "Name": "Edna", "Assignment": "Lesen und Horen 5", "Score": 96,
+     "Date": "2025-06-25", "Level": "A1"},
+    {"StudentCode": "ednaa1", "Name": "Edna", "Assignment": "Lesen und Horen 4", "Score": 86,
+     "Date": "2025-06-24", "Level": "A1"},
+]
+
+
+def test_legacy_label_matches_dictionary_key(tmp_path):
+    mirror = make_mirror(tmp_path, LEGACY_ROWS, dictionary_resolver())
+    assert mirror.has_attempt("ednaa1", "A1 German Cases 5")
+    assert [r["score"] for r in mirror.history("EDNAA1", "A1 German Cases 5")] == ["96"]
+    assert mirror.has_attempt("ednaa1", "Lesen und Horen 5", "A1")
+
+
+def test_raw_labels_without_resolver(tmp_path):
+    mirror = make_mirror(tmp_path, LEGACY_ROWS)
+    assert mirror.has_attempt("ednaa1", "lesen und  horen 5")
+    assert not mirror.has_attempt("ednaa1", "A1 German Cases 5")
+
+
+def test_recorded_row_is_resolved(tmp_path):
+    mirror = make_mirror(tmp_path, LEGACY_ROWS, dictionary_resolver())
+    mirror.record({"studentcode": "kofia1", "assignment": "A1 German Cases 5", "score": 70,
+                   "date": "2025-06-26", "level": "A1"})
+    assert mirror.has_attempt("kofia1", "Lesen und Horen 5", "A1")
+
+
+def test_appended_rows_survive_a_reload(tmp_path):
+    mirror = make_mirror(tmp_path, LEGACY_ROWS)
+    mirror.save()
+    fresh = mirror.record({"StudentCode": "kofia1", "Assignment": "A1 Numbers 2", "Score": 70,
+                           "Date": "2025-06-01", "Level": "A1"})
+    mirror.append(fresh)
+    reloaded = ScoresMirror(mirror.path)
+    assert reloaded.rows == mirror.rows
+    assert [r["date"] for r in reloaded.rows] == ["2025-06-01", "2025-06-24", "2025-06-25"]
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
+
+
+def test_append_starts_a_missing_file(tmp_path):
+    mirror = ScoresMirror(str(tmp_path / "mirror.csv"))
+    mirror.append(mirror.record({"studentcode": "s1", "assignment": "A1 Numbers 2", "score": 90}))
+    assert ScoresMirror(mirror.path).has_attempt("s1", "A1 Numbers 2")
+
+
+def test_text_dates_space_out_full_reloads(tmp_path, monkeypatch):
+    mirror = make_mirror(tmp_path, LEGACY_ROWS)
+    calls = []
+
+    def fetch(tq):
+        calls.append(tq)
+        if "date '" in tq:
+            raise ValueError("text column rejects a date literal")
+        return pd.DataFrame(LEGACY_ROWS)
+
+    monkeypatch.setattr(scores_utils, "fetch_sheet_header", lambda sheet_id, tab: list(LEGACY_ROWS[0]))
+    monkeypatch.setattr(scores_utils, "fetch_gviz_csv", lambda sheet_id, tab, tq: fetch(tq))
+    now = [1000.0]
+    monkeypatch.setattr(scores_utils.time, "time", lambda: now[0])
+
+    assert mirror.sync_sheet("sheet", "Scores", max_age=60) == 2
+    assert mirror.full_sync and len(calls) == 2
+    now[0] += 120
+    assert mirror.sync_sheet("sheet", "Scores", max_age=60) == 0
+    now[0] += mirror.full_sync_interval
+    assert mirror.sync_sheet("sheet", "Scores", max_age=60) == 2
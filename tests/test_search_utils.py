@@ -0,0 +1,77 @@
+import sqlite3
+
+from fake_firestore import FakeDB
+from search_utils import SearchStore, TextIndex, crawl_flat
+from submission_utils import Submission
+
+
+def nested(code, doc_id, text):
+    doc = {"studentCode": code, "level": "A1", "assignment": "1.1", "content": text, "_ts_ms": 1_700_000_000_000}
+    return Submission(doc, doc_id, path=f"submissions/A1/{code}/{doc_id}")
+
+
+def test_same_id_in_two_nested_collections():
+    ama, kofi = nested("s1", "essay1", "Ich wohne in Accra."), nested("s2", "essay1", "Ich wohne in Kumasi.")
+    store = SearchStore(":memory:")
+    assert store.put([ama, kofi]) == 2
+    index = TextIndex()
+    assert store.load(index) == 2
+    assert len(index) == 2
+
+    hits = index.search("ich wohne")
+    assert sorted(hit.path for hit in hits) == [ama.path, kofi.path]
+    assert [hit.path for hit in index.search("Kumasi")] == [kofi.path]
+    records = store.records([kofi.path])
+    assert records[kofi.path]["student_code"] == "s2" and records[kofi.path]["doc_id"] == "essay1"
+
+
+def test_put_skips_unchanged_and_reindexes_edits():
+    store = SearchStore(":memory:")
+    index = TextIndex()
+    sub = nested("s1", "essay1", "Ich heiße Ama.")
+    store.put([sub])
+    store.load(index)
+    assert store.put([sub]) == 0
+
+    store.put([nested("s1", "essay1", "Ich heiße Ama Mensah.")])
+    assert store.load(index) == 1
+    assert len(index) == 1
+    assert [hit.path for hit in index.search("mensah")] == [sub.path]
+    assert [hit.path for hit in index.search('"heisse ama mensah"')] == [sub.path]
+
+
+def test_opens_stores_keyed_by_id(tmp_path):
+    path = str(tmp_path / "search.sqlite3")
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE indexed (doc_id TEXT PRIMARY KEY, path TEXT NOT NULL, student_code TEXT NOT NULL, "
+        "student_name TEXT NOT NULL, level TEXT NOT NULL, assignment TEXT NOT NULL, ts_ms INTEGER NOT NULL, "
+        "text TEXT NOT NULL)"
+    )
+    conn.execute("INSERT INTO indexed VALUES ('essay1', 'submissions/A1/s1/essay1', 's1', '', 'A1', '1.1', 1, 'Hallo')")
+    conn.commit()
+    conn.close()
+
+    store = SearchStore(path)
+    assert store.put([nested("s2", "essay1", "Guten Tag")]) == 1
+    index = TextIndex()
+    assert store.load(index) == 2
+    assert [hit.path for hit in index.search("hallo")] == ["submissions/A1/s1/essay1"]
+
+
+def test_crawl_is_not_moved_by_opened_submissions():
+    docs = {
+        f"submissions/d{i}": {"studentCode": f"s{i}", "content": f"Text {i}", "_ts_ms": 1000 + i // 2} for i in range(6)
+    }
+    db = FakeDB(docs)
+    store = SearchStore(":memory:")
+    store.put([Submission({"content": "Neu", "_ts_ms": 9999}, "opened")])  # opened in the dashboard
+    assert crawl_flat(db.collection("submissions"), store, limit=3) == 3  # d2 and d3 share a timestamp
+    assert store.crawl_cursor() == (1001, "d2")
+    assert crawl_flat(db.collection("submissions"), store, limit=3) == 3
+    assert crawl_flat(db.collection("submissions"), store, limit=3) == 0
+
+    index = TextIndex()
+    store.load(index)
+    assert len(index) == 7
+    assert {hit.path for hit in index.search("text")} == {f"submissions/d{i}" for i in range(6)}
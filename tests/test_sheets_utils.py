@@ -0,0 +1,44 @@
+import pandas as pd
+import pytest
+
+from sheets_utils import UnquotableValue, apply_query_locally, compile_gviz_query, quote_literal
+
+HEADER = ["StudentCode", "Name", "Level", "Class Name"]
+ROSTER = pd.DataFrame(
+    {
+        "studentcode": ["s1", "s2", "s3", "s4"],
+        "name": ["Ama", "kofi", "Kofi", "Esi O'Neil"],
+        "level": ["A1", "a1", "A2", "B1"],
+        "classname": ["x", "y", "z", "w"],
+    }
+)
+
+
+def test_projection_and_filters():
+    tq = compile_gviz_query(HEADER, columns=["name", "studentcode", "missing"], filters={"level": "A1"})
+    assert tq == "select B, A where C = 'A1' limit 100000"
+    tq = compile_gviz_query(HEADER, filters=[("class_name", "in", ["x", "y"]), ("Level", "!=", "C1")], limit=None)
+    assert tq == "select * where (D = 'x' or D = 'y') and C != 'C1'"
+    assert compile_gviz_query(HEADER, filters={"level": []}, offset=5) == "select * where false limit 100000 offset 5"
+
+
+def test_filter_errors():
+    with pytest.raises(KeyError):
+        compile_gviz_query(HEADER, filters={"email": "x"})
+    with pytest.raises(ValueError):
+        compile_gviz_query(HEADER, filters=[("level", "like", "A%")])
+
+
+def test_quote_literal():
+    assert quote_literal("Esi O'Neil") == '"Esi O\'Neil"'
+    assert quote_literal('say "hi"') == "'say \"hi\"'"
+    assert quote_literal(3) == "3" and quote_literal(True) == "true"
+    with pytest.raises(UnquotableValue):
+        quote_literal("O'Neil \"Esi\"")
+
+
+def test_local_query_matches_gviz_semantics():
+    df = apply_query_locally(ROSTER, columns=["Name", "Student Code"], filters={"level": "A1"})
+    assert df.to_dict("records") == [{"name": "Ama", "studentcode": "s1"}]  # "a1" is not "A1"
+    df = apply_query_locally(ROSTER, filters=[("name", "in", ["Kofi", "Esi O'Neil"]), ("level", ">", "B")])
+    assert df["studentcode"].tolist() == ["s3", "s4"]  # only = / in are applied
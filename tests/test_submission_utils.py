@@ -0,0 +1,70 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from submission_utils import LISTING_FIELDS, PREVIEW_CHARS, Submission, make_preview, timestamp_ms
+
+ESSAY = "Ich heiße Ama. " * 20
+DOC = {"studentCode": "s1", "level": "A1", "assignment": "1.1", "content": ESSAY, "_ts_ms": 1_700_000_000_000}
+
+
+def listing(doc):
+    return Submission({k: v for k, v in doc.items() if k in LISTING_FIELDS}, "d1", complete=False)
+
+
+def test_listing_shows_stored_preview():
+    sub = listing(dict(DOC, preview=make_preview(ESSAY)))
+    assert not sub.needs_body and sub.text == ""
+    assert sub.preview == make_preview(ESSAY)
+    assert len(sub.preview) == PREVIEW_CHARS + 1 and sub.preview.endswith("…")
+    assert "Ich heiße Ama." in sub.label
+
+
+def test_listing_without_preview_needs_body():
+    sub = listing(DOC)
+    assert sub.needs_body and sub.preview == ""
+    sub.fill(dict(DOC))
+    assert not sub.needs_body
+    assert sub.text == ESSAY.strip()
+    assert sub.preview == make_preview(ESSAY)
+    assert "Ich heiße Ama." in sub.label  # the label follows the loaded body
+
+
+def test_picks_first_non_empty_alias():
+    doc = {"student_name": "", "name": "Ama", "studentCode": "s1", "code": "old", "assignmentTitle": "1.1",
+           "student_level": "A2", "_path": "submissions/A2/s1/d1", "draft": ["Ich ", {"text": "wohne"}]}
+    sub = Submission(doc, "d1", fallback_level="A1")
+    assert (sub.student_name, sub.student_code, sub.assignment, sub.level) == ("Ama", "s1", "1.1", "A2")
+    assert sub.path == "submissions/A2/s1/d1" and sub["_path"] == sub.path
+    assert sub.get("student_code") == "s1" and sub.get("missing", "-") == "-"
+    assert sub.text == "Ich \nwohne"
+    assert Submission({"studentCode": "s1"}, "d2", fallback_level="B1").level == "B1"
+    assert Submission({}, "d3").path == "submissions/d3"
+
+
+class Timestamp:
+    """Stands in for the older Firestore Timestamp (seconds/nanoseconds only)."""
+
+    seconds = 1_700_000_000
+    nanoseconds = 500_000_000
+
+
+@pytest.mark.parametrize(
+    "doc, expected",
+    [
+        ({"_ts_ms": 1_700_000_000_123, "timestamp": 5}, 1_700_000_000_123),
+        ({"timestamp": 1_700_000_000}, 1_700_000_000_000),
+        ({"createdAt": 1_700_000_000_000.0}, 1_700_000_000_000),
+        ({"submittedAt": "2023-11-14T22:13:20Z"}, 1_700_000_000_000),
+        ({"created_at": {"_seconds": 1_700_000_000, "_nanoseconds": 250_000_000}}, 1_700_000_000_250),
+        ({"updatedAt": {"iso": "2023-11-14T22:13:20+00:00"}}, 1_700_000_000_000),
+        ({"timestamp": datetime(2023, 11, 14, 22, 13, 20, tzinfo=timezone.utc)}, 1_700_000_000_000),
+        ({"timestamp": Timestamp()}, 1_700_000_000_500),
+        ({"timestamp": "not a date"}, 0),
+        ({"timestamp": True}, 0),
+        ({}, 0),
+    ],
+)
+def test_timestamp_ms(doc, expected):
+    assert timestamp_ms(doc) == expected
+    assert Submission(doc, "d1").ts_ms == expected
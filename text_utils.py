@@ -0,0 +1,54 @@
+"""Small text helpers shared by the dashboard and its helper modules."""
+
+from __future__ import annotations
+
+import re
+import unicodedata
+from functools import lru_cache
+
+
+def natural_key(s: str):
+    """Return a sortable key that safely mixes numeric and text fragments."""
+    parts = re.findall(r"\d+|\D+", str(s))
+    normalized = []
+    for part in parts:
+        if part.isdigit():
+            normalized.append((0, int(part)))
+        else:
+            normalized.append((1, part.lower()))
+    return tuple(normalized)
+
+
+# ä/ö/ü/ß spelled out, applied after lower-casing (so Ä/Ö/Ü are covered too).
+_UMLAUT_TABLE = str.maketrans({"ä": "ae", "ö": "oe", "ü": "ue", "ß": "ss"})
+_NON_WORD = re.compile(r"[^\w]+")
+_OPTION_LETTERS = frozenset("abcdABCD")
+_TRUE_WORDS = frozenset({"t", "true", "ja", "j", "y", "yes"})
+_FALSE_WORDS = frozenset({"f", "false", "nein", "n", "no"})
+
+
+@lru_cache(maxsize=8192)
+def canonical_token(s: str) -> str:
+    """Return the comparison form of an objective answer token.
+
+    Option letters ``a``–``d`` become upper case, True/False and Ja/Nein
+    synonyms collapse to ``"true"``/``"false"``, and anything else is
+    lower-cased with umlauts/ß spelled out and punctuation removed.
+    Decomposed umlauts (``u`` + combining diaeresis, as typed on some
+    phones) are composed first so they compare like ``ü``. Results are
+    cached because the same short tokens ("A", "ja", "falsch") repeat across
+    every submission.
+    """
+    s = (s or "").strip()
+    if not s:
+        return ""
+    if len(s) == 1 and s in _OPTION_LETTERS:
+        return s.upper()
+    if not s.isascii():
+        s = unicodedata.normalize("NFC", s)
+    s = s.lower().translate(_UMLAUT_TABLE)
+    if s in _TRUE_WORDS:
+        return "true"
+    if s in _FALSE_WORDS:
+        return "false"
+    return _NON_WORD.sub("", s)